@@ -0,0 +1,70 @@
+"""
+Стоимость нажатия на вещь: прежний путь (текст кнопки → SELECT id по имени →
+UPDATE по user_id и имени) против inline-кнопки с id в callback_data
+(разбор callback_data → UPDATE по первичному ключу).
+
+    python -m bench.callback_latency --users 1000 --items 50 --taps 5000
+
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from bench.common import import_bot, insert_items, summary
+
+bot = import_bot()
+
+
+async def name_path(user_id, item_no):
+    name = f"item{item_no}"
+    row = await bot.db.fetchone("SELECT id FROM clothes WHERE user_id = ? AND name = ?", (user_id, name))
+    if row:
+        await bot.db.execute(
+            "UPDATE clothes SET last_worn = ?, worn_count = worn_count + 1 WHERE user_id = ? AND name = ?",
+            (int(time.time()), user_id, name),
+        )
+
+
+async def callback_path(user_id, item_id):
+    data = bot.ItemAction.unpack(bot.ItemAction(action="wear", item_id=item_id).pack())
+    await bot.repo.mark_worn(user_id, data.item_id, int(time.time()))
+
+
+async def run(args):
+    await bot.db.connect()
+    await bot.repo.init_schema()
+    await bot.db.transaction(lambda conn: insert_items(
+        conn, [(u, f"item{i}", "x", None, None, 0) for u in range(args.users) for i in range(args.items)]
+    ))
+    rnd = random.Random(7)
+    taps = [(rnd.randrange(args.users), rnd.randrange(args.items)) for _ in range(args.taps)]
+
+    result = {}
+    for label, fn in (
+        ("name_lookup", lambda u, i: name_path(u, i)),
+        ("callback_id", lambda u, i: callback_path(u, u * args.items + i + 1)),
+    ):
+        lat = []
+        for u, i in taps:
+            t0 = time.perf_counter()
+            await fn(u, i)
+            lat.append(time.perf_counter() - t0)
+        result[label] = summary(lat)
+    await bot.db.close()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--items", type=int, default=50)
+    ap.add_argument("--taps", type=int, default=5000)
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
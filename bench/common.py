@@ -0,0 +1,98 @@
+"""
+Общие части бенчмарков: сводка латентностей, заполнение closet.db и
+запуск main.py на временной базе.
+
+Перцентили во всех отчётах считаются одинаково — nearest-rank по
+отсортированной выборке (p99 — наименьшее значение, не меньше которого
+99% замеров), так что p50/p99 разных бенчмарков сравнимы между собой.
+
+    from bench.common import summary
+    summary(latencies)            # {"count": ..., "p50_ms": ..., "p99_ms": ..., "max_ms": ..., "mean_ms": ...}
+    summary(lags, scale=1, unit="s", digits=2)
+"""
+import math
+import os
+import socket
+import sqlite3
+import tempfile
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import migrations
+
+# (user_id, notify_on, notify_time, tz, next_fire_utc)
+SettingsRow = Tuple[int, int, str, str, Optional[int]]
+# (user_id, name, category, last_worn, last_washed, worn_count)
+ItemRow = Tuple[int, str, str, Optional[Any], Optional[Any], int]
+
+_tmp: Optional[tempfile.TemporaryDirectory] = None
+
+
+# ----- латентности -----
+def percentile(values: Sequence[float], p: float) -> float:
+    """Nearest-rank перцентиль; values уже отсортированы и не пусты."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summary(values: Iterable[float], scale: float = 1000.0, unit: str = "ms", digits: int = 3) -> Dict[str, Any]:
+    """count, p50, p99, max и среднее выборки; значения умножаются на scale (секунды -> unit)."""
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        f"p50_{unit}": round(percentile(values, 50) * scale, digits),
+        f"p99_{unit}": round(percentile(values, 99) * scale, digits),
+        f"max_{unit}": round(values[-1] * scale, digits),
+        f"mean_{unit}": round(sum(values) / len(values) * scale, digits),
+    }
+
+
+# ----- данные -----
+def create_db(path: str, target: Optional[int] = None) -> sqlite3.Connection:
+    """closet.db со схемой версии target (по умолчанию — последней); соединение в autocommit."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrations.migrate(conn, len(migrations.MIGRATIONS) if target is None else target)
+    return conn
+
+
+def insert_settings(conn: sqlite3.Connection, rows: Iterable[SettingsRow]) -> None:
+    conn.executemany(
+        "INSERT INTO user_settings (user_id, notify_on, notify_time, tz, next_fire_utc) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def insert_items(conn: sqlite3.Connection, rows: Iterable[ItemRow]) -> None:
+    conn.executemany(
+        "INSERT INTO clothes (user_id, name, category, last_worn, last_washed, worn_count) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def seed(path: str, settings: Iterable[SettingsRow], items: Iterable[ItemRow]) -> None:
+    """Новая closet.db с пользователями и вещами одной транзакцией."""
+    conn = create_db(path)
+    conn.execute("BEGIN")
+    insert_settings(conn, settings)
+    insert_items(conn, items)
+    conn.execute("COMMIT")
+    conn.close()
+
+
+# ----- окружение -----
+def import_bot():
+    """Модуль main на временной closet.db (если DB_PATH не задан) — переменные окружения до импорта."""
+    global _tmp
+    os.environ.setdefault("BOT_TOKEN", "42:bench")
+    if "DB_PATH" not in os.environ:
+        _tmp = tempfile.TemporaryDirectory()
+        os.environ["DB_PATH"] = os.path.join(_tmp.name, "closet.db")
+    import main
+
+    return main
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
@@ -0,0 +1,156 @@
+"""
+Латентность хэндлеров при конкурентной записи: синхронный sqlite на event loop
+(как было раньше) против Database из storage.py.
+
+    python -m bench.db_latency --writers 20 --seconds 5
+
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from bench.common import insert_items, seed, summary
+from storage import ClosetRepository, Database, DBConfig
+
+USERS = 200
+ITEMS_PER_USER = 20
+
+
+def items():
+    return [(u, f"item{i}", "x", None, None, 0) for u in range(USERS) for i in range(ITEMS_PER_USER)]
+
+
+def seed_baseline(path):
+    # исходная схема без миграций: так было до слоя Database
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE clothes (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, name TEXT,
+            category TEXT, last_worn TEXT, last_washed TEXT, worn_count INTEGER);
+        CREATE TABLE user_settings (user_id INTEGER PRIMARY KEY, notify_on INTEGER DEFAULT 0,
+            notify_time TEXT DEFAULT '09:00', tz TEXT DEFAULT 'Europe/Moscow');
+        """
+    )
+    insert_items(conn, items())
+    conn.commit()
+    conn.close()
+
+
+async def arrival(interval=0.005):
+    """Имитирует приход апдейта: момент, когда он должен был начать обрабатываться.
+
+    Латентность считается от этого момента, так что в неё входит и ожидание
+    занятого event loop.
+    """
+    due = time.perf_counter() + interval
+    await asyncio.sleep(interval)
+    return due
+
+
+async def run_blocking(path, writers, seconds):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous = FULL")
+    cur = conn.cursor()
+    stop = time.perf_counter() + seconds
+    lat = []
+
+    async def writer(n):
+        i = 0
+        while time.perf_counter() < stop:
+            cur.execute(
+                "UPDATE clothes SET last_worn = ?, worn_count = worn_count + 1 WHERE user_id = ? AND name = ?",
+                (datetime.now().isoformat(timespec="minutes"), n % USERS, f"item{i % ITEMS_PER_USER}"),
+            )
+            conn.commit()
+            i += 1
+            await asyncio.sleep(0)
+
+    async def reader():
+        i = 0
+        while time.perf_counter() < stop:
+            t0 = await arrival()
+            cur.execute(
+                "SELECT name, last_worn, last_washed, worn_count FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE",
+                (i % USERS,),
+            )
+            cur.fetchall()
+            lat.append(time.perf_counter() - t0)
+            i += 1
+
+    await asyncio.gather(reader(), *(writer(n) for n in range(writers)))
+    conn.close()
+    return lat
+
+
+async def run_async(path, writers, seconds):
+    db = Database(path, DBConfig(synchronous="FULL"))
+    await db.connect()
+    repo = ClosetRepository(db)
+    stop = time.perf_counter() + seconds
+    lat = []
+
+    async def writer(n):
+        i = 0
+        while time.perf_counter() < stop:
+            await repo.mark_worn(
+                n % USERS, (n % USERS) * ITEMS_PER_USER + i % ITEMS_PER_USER + 1, int(time.time())
+            )
+            i += 1
+
+    async def reader():
+        i = 0
+        while time.perf_counter() < stop:
+            t0 = await arrival()
+            await repo.status_page(i % USERS, ITEMS_PER_USER)
+            lat.append(time.perf_counter() - t0)
+            i += 1
+
+    await asyncio.gather(reader(), *(writer(n) for n in range(writers)))
+    await db.close()
+    return lat
+
+
+async def loop_lag(coro_factory, seconds):
+    """Запускает сценарий и параллельно меряет задержку event loop."""
+    lags = []
+    stop = time.perf_counter() + seconds
+
+    async def probe():
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - t0 - 0.01)
+
+    lat, _ = await asyncio.gather(coro_factory(), probe())
+    return lat, lags
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writers", type=int, default=20)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    result = {"writers": args.writers, "seconds": args.seconds}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, runner, prepare in (
+            ("blocking", run_blocking, seed_baseline),
+            # репозиторий работает со схемой после всех миграций
+            ("async_layer", run_async, lambda path: seed(path, [], items())),
+        ):
+            path = os.path.join(tmp, f"{name}.db")
+            prepare(path)
+            lat, lags = asyncio.run(loop_lag(lambda: runner(path, args.writers, args.seconds), args.seconds))
+            result[name] = {"handler": summary(lat), "loop_lag": summary(lags)}
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
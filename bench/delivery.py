@@ -0,0 +1,83 @@
+"""
+Доставка пачки напоминаний через локальный фейковый Bot API: старый путь
+(последовательный send_message с подавлением ошибок) против DeliveryQueue.
+
+    python -m bench.delivery --messages 300 --rtt-ms 50 --error-rate 0.02
+
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import time
+from contextlib import suppress
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from bench.fake_telegram import FakeTelegram
+from delivery import DeliveryQueue
+
+TOKEN = "42:bench"
+
+
+def make_bot(url):
+    return Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+
+
+async def sequential(bot, messages):
+    for chat_id in range(messages):
+        with suppress(Exception):
+            await bot.send_message(chat_id, "Напоминание")
+
+
+async def queued(bot, messages, workers):
+    delivery = DeliveryQueue(bot, workers=workers, backoff_base=0.2)
+    await delivery.start()
+    for chat_id in range(messages):
+        await delivery.send(chat_id, "Напоминание")
+    # ждём, пока дойдут и отложенные повторы
+    while delivery.stats.sent + delivery.stats.dropped < messages:
+        await asyncio.sleep(0.05)
+    await delivery.stop()
+    return vars(delivery.stats)
+
+
+async def run(mode, args):
+    server = FakeTelegram(global_rate=30, error_rate=args.error_rate, latency=args.rtt_ms / 1000)
+    url = await server.start()
+    bot = make_bot(url)
+    t0 = time.perf_counter()
+    stats = None
+    if mode == "sequential":
+        await sequential(bot, args.messages)
+    else:
+        stats = await queued(bot, args.messages, args.workers)
+    elapsed = time.perf_counter() - t0
+    await bot.session.close()
+    await server.stop()
+    delivered = len({m["chat_id"] for m in server.sent})
+    return {
+        "seconds": round(elapsed, 2),
+        "delivered": delivered,
+        "lost": args.messages - delivered,
+        "server_429": server.rejected_429,
+        "server_5xx": server.rejected_5xx,
+        "client_stats": stats,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=300)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--rtt-ms", type=float, default=50.0)
+    ap.add_argument("--error-rate", type=float, default=0.02)
+    args = ap.parse_args()
+    result = {mode: asyncio.run(run(mode, args)) for mode in ("sequential", "delivery_queue")}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Журнал событий носки/стирки на 10M строк: стоимость записи события вместе
+с агрегатами и чтение статистики из агрегатов вещи против пересчёта по журналу.
+
+    python -m bench.events --users 2000 --items 50 --events 10000000
+
+Результат печатается в JSON; агрегаты сверяются с пересчётом по журналу.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from bench.common import import_bot, summary
+
+bot = import_bot()
+
+FROM_AGGREGATES = """
+    SELECT wear_total, worn_count,
+           (last_washed - first_washed) / 86400.0 / NULLIF(wash_total - 1, 0) AS wash_interval_days
+    FROM clothes WHERE id = ?
+"""
+
+FROM_EVENTS = """
+    SELECT SUM(kind = 'wear') AS wear_total,
+           SUM(kind = 'wear' AND ts > COALESCE(
+               (SELECT MAX(ts) FROM events w WHERE w.item_id = e.item_id AND w.kind = 'wash'), 0
+           )) AS worn_count,
+           (MAX(ts) FILTER (WHERE kind = 'wash') - MIN(ts) FILTER (WHERE kind = 'wash'))
+               / 86400.0 / NULLIF(SUM(kind = 'wash') - 1, 0) AS wash_interval_days
+    FROM events e WHERE item_id = ?
+"""
+
+
+def generate(users, items, events, seed):
+    """События по вещам в порядке времени и итоговые агрегаты каждой вещи."""
+    rnd = random.Random(seed)
+    per_item = max(1, events // (users * items))
+    start = int(time.time()) - per_item * 86400
+    item_id = 0
+    for u in range(1, users + 1):
+        for i in range(items):
+            item_id += 1
+            ts = start
+            wear_total = worn = wash_total = 0
+            first_washed = last_worn = last_washed = None
+            evs = []
+            for _ in range(per_item):
+                ts += rnd.randrange(3600, 86400)
+                if rnd.random() < 0.8:
+                    evs.append((item_id, u, "wear", ts))
+                    wear_total += 1
+                    worn += 1
+                    last_worn = ts
+                else:
+                    evs.append((item_id, u, "wash", ts))
+                    wash_total += 1
+                    worn = 0
+                    last_washed = ts
+                    first_washed = first_washed or ts
+            yield (item_id, u, f"item{i:03d}", last_worn, last_washed, worn, wear_total, wash_total, first_washed), evs
+
+
+async def populate(users, items, events, seed):
+    t0 = time.perf_counter()
+    clothes, evs = [], []
+
+    async def flush():
+        def _tx(conn):
+            conn.executemany(
+                "INSERT INTO clothes (id, user_id, name, category, last_worn, last_washed, worn_count, "
+                "wear_total, wash_total, first_washed) VALUES (?, ?, ?, 'x', ?, ?, ?, ?, ?, ?)",
+                clothes,
+            )
+            conn.executemany("INSERT INTO events (item_id, user_id, kind, ts) VALUES (?, ?, ?, ?)", evs)
+
+        await bot.db.transaction(_tx)
+        clothes.clear()
+        evs.clear()
+
+    for row, item_events in generate(users, items, events, seed):
+        clothes.append(row)
+        evs.extend(item_events)
+        if len(evs) >= 200_000:
+            await flush()
+    await flush()
+    await bot.db.run(lambda conn: conn.execute("ANALYZE"))
+    return round(time.perf_counter() - t0, 1)
+
+
+async def reads(sql, ids):
+    lat, out = [], []
+    for item_id in ids:
+        t0 = time.perf_counter()
+        row = await bot.db.fetchone(sql, (item_id,))
+        lat.append(time.perf_counter() - t0)
+        out.append(tuple(row))
+    return out, summary(lat)
+
+
+async def writes(users, items, n, concurrency, seed):
+    rnd = random.Random(seed)
+    taps = [(u, (u - 1) * items + rnd.randrange(items) + 1) for u in (rnd.randrange(1, users + 1) for _ in range(n))]
+    lat = []
+
+    async def worker(chunk):
+        for k, (user_id, item_id) in enumerate(chunk):
+            t0 = time.perf_counter()
+            if k % 5:
+                await bot.repo.mark_worn(user_id, item_id, int(time.time()))
+            else:
+                await bot.repo.mark_washed(user_id, item_id, int(time.time()))
+            lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(taps[i::concurrency]) for i in range(concurrency)))
+    return {**summary(lat), "events_per_s": round(n / (time.perf_counter() - t0))}
+
+
+async def run(args):
+    await bot.db.connect()
+    await bot.repo.init_schema()
+    populate_s = await populate(args.users, args.items, args.events, args.seed)
+    total = (await bot.db.fetchone("SELECT COUNT(*) AS n FROM events"))["n"]
+
+    rnd = random.Random(args.seed + 1)
+    ids = [rnd.randrange(1, args.users * args.items + 1) for _ in range(args.reads)]
+    agg, agg_lat = await reads(FROM_AGGREGATES, ids)
+    scan, scan_lat = await reads(FROM_EVENTS, ids)
+    same = all(
+        a[:2] == s[:2] and (a[2] is None) == (s[2] is None) and (a[2] is None or abs(a[2] - s[2]) < 1e-6)
+        for a, s in zip(agg, scan)
+    )
+
+    result = {
+        "events": total,
+        "events_per_item": total // (args.users * args.items),
+        "populate_s": populate_s,
+        "item_stats_from_aggregates": agg_lat,
+        "item_stats_from_events": scan_lat,
+        "aggregates_match_events": same,
+        "mark_event_sequential": await writes(args.users, args.items, args.writes, 1, args.seed + 2),
+        "mark_event_concurrent": await writes(args.users, args.items, args.writes, 100, args.seed + 3),
+    }
+    await bot.db.close()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--items", type=int, default=50)
+    ap.add_argument("--events", type=int, default=10_000_000)
+    ap.add_argument("--reads", type=int, default=2000)
+    ap.add_argument("--writes", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Локальная замена OTLP/HTTP-коллектора для проверки выгрузки span-ов.
+
+Принимает POST /v1/traces в JSON-кодировке OTLP, раскладывает span-ы в
+плоские словари (атрибуты closet.* без префикса) и при --out дописывает их
+в JSONL-файл. При остановке печатает сводку по хэндлерам.
+
+    python -m bench.fake_otlp --port 4318 --out spans.jsonl
+    TRACE_OTLP_ENDPOINT=http://127.0.0.1:4318 python main.py
+
+    collector = FakeOtlpCollector()
+    url = await collector.start()
+"""
+import argparse
+import asyncio
+import json
+import signal
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from bench.common import summary
+
+
+def _value(v: Dict[str, Any]) -> Any:
+    if "intValue" in v:
+        return int(v["intValue"])
+    for key in ("doubleValue", "boolValue", "stringValue"):
+        if key in v:
+            return v[key]
+    return None
+
+
+def flatten(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    out = []
+    for rs in body.get("resourceSpans", []):
+        for ss in rs.get("scopeSpans", []):
+            for span in ss.get("spans", []):
+                record = {"name": span["name"], "trace_id": span["traceId"], "span_id": span["spanId"]}
+                for attr in span.get("attributes", []):
+                    record[attr["key"].removeprefix("closet.")] = _value(attr["value"])
+                record["duration_ms"] = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+                out.append(record)
+    return out
+
+
+def summarize(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    by_handler: Dict[str, List[float]] = defaultdict(list)
+    for s in spans:
+        by_handler[s.get("handler") or s.get("update_type") or "?"].append(s["duration_ms"])
+    return {name: summary(lat, scale=1.0) for name, lat in sorted(by_handler.items())}
+
+
+class FakeOtlpCollector:
+    def __init__(self, out: Optional[str] = None):
+        self.out = out
+        self.spans: List[Dict[str, Any]] = []
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/traces", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        spans = flatten(await request.json())
+        self.requests += 1
+        self.spans += spans
+        if self.out:
+            with open(self.out, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(s, ensure_ascii=False) + "\n" for s in spans)
+        return web.json_response({"partialSuccess": {}})
+
+
+async def serve(args):
+    collector = FakeOtlpCollector(args.out)
+    url = await collector.start(port=args.port)
+    print(f"OTLP collector on {url}/v1/traces", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    await collector.stop()
+    print(json.dumps(summarize(collector.spans), indent=2))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=4318)
+    ap.add_argument("--out")
+    asyncio.run(serve(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Заглушка asyncpg-пула для локальной проверки PostgresStateStore без Postgres.
+
+Запросы в стиле asyncpg ($1, $2, ...) выполняются на файле SQLite — тот же
+общий SQL-диалект, что использует StateStore. Файл можно открыть из
+нескольких процессов, поэтому заглушка годится и для проверки аренд
+между репликами.
+
+    pool = FakePostgresPool("/tmp/state.db")
+    store = PostgresStateStore(pool=pool)
+    await store.init_schema()
+"""
+import asyncio
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Any, List
+
+_DOLLAR = re.compile(r"\$(\d+)")
+
+
+class FakeConnection:
+    """Соединение в режиме autocommit: вне transaction() каждый запрос фиксируется сам."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def _run(self, sql: str, args: Any) -> sqlite3.Cursor:
+        # $N -> ?N: в SQLite это тот же нумерованный параметр
+        return self._conn.execute(_DOLLAR.sub(r"?\1", sql), args)
+
+    def _fetch(self, sql: str, args: Any) -> List[sqlite3.Row]:
+        return self._run(sql, args).fetchall()
+
+    def _execute(self, sql: str, args: Any) -> str:
+        cur = self._run(sql, args)
+        verb = sql.split(None, 1)[0].upper()
+        # статус команды, как его возвращает asyncpg
+        return f"INSERT 0 {cur.rowcount}" if verb == "INSERT" else f"{verb} {max(cur.rowcount, 0)}"
+
+    async def fetch(self, sql: str, *args: Any) -> List[sqlite3.Row]:
+        return await asyncio.to_thread(self._fetch, sql, args)
+
+    async def fetchrow(self, sql: str, *args: Any):
+        rows = await self.fetch(sql, *args)
+        return rows[0] if rows else None
+
+    async def execute(self, sql: str, *args: Any) -> str:
+        return await asyncio.to_thread(self._execute, sql, args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        await asyncio.to_thread(self._conn.execute, "BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            await asyncio.to_thread(self._conn.execute, "ROLLBACK")
+            raise
+        await asyncio.to_thread(self._conn.execute, "COMMIT")
+
+
+class FakePostgresPool:
+    """Одно соединение на пул, запросы по очереди — для проверки логики, не скорости."""
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.row_factory = sqlite3.Row
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._lock:
+            yield FakeConnection(self._conn)
+
+    async def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,188 @@
+"""
+Локальная замена api.telegram.org для бенчмарков и ручных проверок.
+
+Отвечает на методы Bot API, которые использует бот, и умеет имитировать
+лимиты Telegram: 429 с retry_after при превышении общего темпа или чаще
+раза в секунду в один чат, плюс случайные 5xx. Слишком большие
+inline-клавиатуры отклоняются с 400, как настоящим Telegram.
+
+    server = FakeTelegram(global_rate=30)
+    url = await server.start()
+    bot = Bot(token, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+"""
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+
+class FakeTelegram:
+    def __init__(
+        self,
+        global_rate: Optional[float] = 30.0,
+        per_chat_interval: Optional[float] = 1.0,
+        retry_after: int = 1,
+        error_rate: float = 0.0,
+        latency: float = 0.0,
+        seed: int = 0,
+        max_keyboard_buttons: int = 100,
+    ):
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.latency = latency
+        self.max_keyboard_buttons = max_keyboard_buttons
+        self._rnd = random.Random(seed)
+        self._recent: Deque[float] = deque()
+        self._chat_last: Dict[int, float] = {}
+        self._message_id = 0
+        self._update_id = 0
+        self._callback_id = 0
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.sent: List[Dict[str, Any]] = []
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.rejected_429 = 0
+        self.rejected_5xx = 0
+        self.rejected_400 = 0
+        # вызывается для каждого принятого сообщения (sendMessage/edit*), как и запись в sent
+        self.on_sent: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    # ----- запуск -----
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ----- апдейты -----
+    def push_update(self, update: Dict[str, Any]) -> None:
+        self._update_id += 1
+        self.updates.put_nowait({"update_id": self._update_id, **update})
+
+    def make_message(self, user_id: int, text: str) -> Dict[str, Any]:
+        self._message_id += 1
+        user = {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+            "text": text,
+        }
+
+    def make_callback(self, user_id: int, data: str, message_id: int = 1) -> Dict[str, Any]:
+        self._callback_id += 1
+        user = {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+        return {
+            "id": str(self._callback_id),
+            "from": user,
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "…",
+            },
+        }
+
+    # ----- обработка -----
+    def _limited(self, chat_id: Optional[int]) -> bool:
+        now = time.monotonic()
+        if self.global_rate:
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.global_rate:
+                return True
+        if self.per_chat_interval and chat_id is not None:
+            last = self._chat_last.get(chat_id)
+            if last is not None and now - last < self.per_chat_interval:
+                return True
+        self._recent.append(now)
+        if chat_id is not None:
+            self._chat_last[chat_id] = now
+        return False
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == "getUpdates":
+            return await self._get_updates(data)
+
+        if method in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            chat_id = int(data["chat_id"]) if "chat_id" in data else None
+            if self.error_rate and self._rnd.random() < self.error_rate:
+                self.rejected_5xx += 1
+                return web.json_response(
+                    {"ok": False, "error_code": 502, "description": "Bad Gateway"}, status=502
+                )
+            markup = json.loads(data["reply_markup"]) if "reply_markup" in data else {}
+            buttons = sum(len(row) for row in markup.get("inline_keyboard", []))
+            if buttons > self.max_keyboard_buttons:
+                self.rejected_400 += 1
+                return web.json_response(
+                    {"ok": False, "error_code": 400, "description": "Bad Request: reply markup is too long"},
+                    status=400,
+                )
+            if self._limited(chat_id):
+                self.rejected_429 += 1
+                return web.json_response(
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after},
+                    },
+                    status=429,
+                )
+            record = {"method": method, **data, "at": time.monotonic()}
+            self.sent.append(record)
+            if self.on_sent is not None:
+                self.on_sent(record)
+            self._message_id += 1
+            return web.json_response({"ok": True, "result": {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id or 0, "type": "private"},
+                "text": data.get("text", ""),
+            }})
+
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "closet", "username": "closet_bot",
+            }})
+        # setMyCommands, deleteWebhook, setWebhook, answerCallbackQuery, ...
+        return web.json_response({"ok": True, "result": True})
+
+    async def _get_updates(self, data: Dict[str, Any]) -> web.Response:
+        timeout = float(data.get("timeout", 0) or 0)
+        result = []
+        try:
+            result.append(await asyncio.wait_for(self.updates.get(), timeout) if timeout else self.updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            pass
+        while not self.updates.empty() and len(result) < 100:
+            result.append(self.updates.get_nowait())
+        return web.Response(text=json.dumps({"ok": True, "result": result}), content_type="application/json")
@@ -0,0 +1,76 @@
+"""
+Накладные расходы FSM-хранилища на апдейт: MemoryStorage против PersistentStorage поверх SQLite
+(с LRU-кэшем и без него).
+
+Каждый «апдейт» — как в FSMContextMiddleware: get_state; каждый пятый ещё и
+переводит пользователя по шагам диалога (set_state + update_data).
+
+    python -m bench.fsm_storage --updates 20000 --users 2000
+
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bench.common import summary
+from fsm_storage import PersistentStorage
+from state_store import SQLiteStateStore
+from storage import ClosetRepository, Database
+
+STATES = [None, "AddClothes:waiting_for_name", "AddClothes:waiting_for_category"]
+
+
+async def drive(storage, updates, users, concurrency):
+    rnd = random.Random(1)
+    plan = [(rnd.randrange(users), rnd.random() < 0.2) for _ in range(updates)]
+    lat = []
+
+    async def one(user_id, transition):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+        t0 = time.perf_counter()
+        state = await storage.get_state(key)
+        if transition:
+            nxt = STATES[(STATES.index(state) + 1) % len(STATES)] if state in STATES else STATES[1]
+            await storage.set_state(key, nxt)
+            await storage.update_data(key, {"name": f"item{user_id}"} if nxt else {})
+        lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for i in range(0, len(plan), concurrency):
+        await asyncio.gather(*(one(u, tr) for u, tr in plan[i:i + concurrency]))
+    elapsed = time.perf_counter() - t0
+    return {"updates_per_sec": round(len(plan) / elapsed, 1), **summary(lat, scale=1e6, unit="us", digits=1)}
+
+
+async def run(args):
+    result = {"memory": await drive(MemoryStorage(), args.updates, args.users, args.concurrency)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, cache_size in (("sqlite_cached", 10_000), ("sqlite_uncached", 0)):
+            db = Database(os.path.join(tmp, f"{name}.db"))
+            await db.connect()
+            await ClosetRepository(db).init_schema()
+            storage = PersistentStorage(SQLiteStateStore(db), cache_size=cache_size, purge_interval=0)
+            result[name] = await drive(storage, args.updates, args.users, args.concurrency)
+            await db.close()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=20000)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=50)
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
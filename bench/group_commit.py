@@ -0,0 +1,79 @@
+"""
+Пропускная способность записей (отметок «носил») при 1/10/100 конкурентных
+писателях: коммит на каждую запись против group commit.
+
+    python -m bench.group_commit --seconds 3
+
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from bench.common import insert_items, summary
+from storage import ClosetRepository, Database, DBConfig
+
+USERS = 100
+ITEMS_PER_USER = 10
+
+CONFIGS = {
+    "commit_per_write": DBConfig(commit_max_ops=1),
+    "group_commit": DBConfig(),
+    "group_commit_5ms": DBConfig(commit_interval_ms=5),
+    "group_commit_normal_sync": DBConfig(synchronous="NORMAL"),
+}
+
+
+async def run(path, config, writers, seconds):
+    db = Database(path, config)
+    await db.connect()
+    repo = ClosetRepository(db)
+    await repo.init_schema()
+    await db.transaction(lambda conn: insert_items(
+        conn, [(u, f"item{i}", "x", None, None, 0) for u in range(USERS) for i in range(ITEMS_PER_USER)]
+    ))
+
+    done = 0
+    lat = []
+    stop = time.perf_counter() + seconds
+
+    async def writer(n):
+        nonlocal done
+        i = 0
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            await repo.mark_worn(
+                n % USERS, (n % USERS) * ITEMS_PER_USER + i % ITEMS_PER_USER + 1, int(time.time())
+            )
+            lat.append(time.perf_counter() - t0)
+            done += 1
+            i += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(writer(n) for n in range(writers)))
+    elapsed = time.perf_counter() - t0
+    await db.close()
+    return {"ops_per_sec": round(done / elapsed, 1), **summary(lat)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--writers", type=int, nargs="+", default=[1, 10, 100])
+    args = ap.parse_args()
+
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, config in CONFIGS.items():
+            result[name] = {}
+            for writers in args.writers:
+                path = os.path.join(tmp, f"{name}-{writers}.db")
+                result[name][str(writers)] = asyncio.run(run(path, config, writers, args.seconds))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
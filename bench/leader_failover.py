@@ -0,0 +1,227 @@
+"""
+Отказ и смена реплик во время рассылки напоминаний: кто подхватывает
+аренды и насколько опаздывают напоминания.
+
+Родитель создаёт базу, где --users напоминаний равномерно распределены по
+--span секундам, поднимает FakeTelegram и запускает дочерние процессы
+bench.leader_failover --child. Сценарии:
+
+    crash   — --replicas реплик, через --event-at секунд лидер получает SIGKILL;
+    rolling — работает одна реплика, вторая стартует, и через --event-at
+              секунд первая получает SIGTERM (как при rolling deploy).
+
+По таблице leases родитель замеряет, через сколько секунд после события
+лидерство и все части напоминаний снова принадлежат живым репликам, а по
+отправленным сообщениям — повторы, пропуски и опоздания относительно
+next_fire_utc.
+
+    python -m bench.leader_failover --scenario crash rolling
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from bench import common
+from bench.fake_telegram import FakeTelegram
+
+LEAD_SECONDS = 8
+STARTUP_TIMEOUT = 60
+
+
+def seed(path, users, span, start):
+    due = {u: start + LEAD_SECONDS + (u - 1) * span // users for u in range(1, users + 1)}
+    common.seed(
+        path,
+        [(u, 1, "09:00", "UTC", ts) for u, ts in due.items()],
+        [(u, "item", "x", start - 40 * 86400, None, 1) for u in due],
+    )
+    return due
+
+
+def live_leases(path):
+    """{имя: владелец} действующих аренд."""
+    conn = sqlite3.connect(path, timeout=5)
+    try:
+        now = int(time.time())
+        return dict(conn.execute("SELECT name, owner FROM leases WHERE expires_at > ?", (now,)).fetchall())
+    finally:
+        conn.close()
+
+
+def holders(path, partitions):
+    """(владелец leader, владельцы частей) по действующим арендам."""
+    leases = live_leases(path)
+    parts = [leases.get(f"reminders:{k}") for k in range(partitions)]
+    return leases.get("leader"), parts
+
+
+def owner_pid(owner):
+    return int(owner.split(":")[1]) if owner else None
+
+
+def is_alive(path, pid):
+    """Процесс pid уже держит свою аренду worker:<owner> — стартовал и работает."""
+    return any(name.startswith("worker:") and owner_pid(owner) == pid for name, owner in live_leases(path).items())
+
+
+async def wait_until(check, timeout):
+    """Результат check(), как только он не пуст, или None по таймауту."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = check()
+        if result:
+            return result
+        await asyncio.sleep(0.1)
+    return None
+
+
+async def run_child():
+    import main as bot
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    await bot.db.connect()
+    await bot.repo.init_schema()
+    await bot.state_store.connect()
+    await bot.state_store.init_schema()
+    await bot.leader.start()
+    await bot.delivery.start()
+    task = asyncio.create_task(bot.reminders_loop())
+    await stop.wait()
+    task.cancel()
+    await bot.delivery.stop()
+    await bot.partition_leases.close()
+    await bot.leader.close()
+    await bot.state_store.close()
+    await bot.db.close()
+    await bot.bot.session.close()
+
+
+async def spawn(args, db_path, url):
+    env = dict(
+        os.environ,
+        BOT_TOKEN="42:bench",
+        DB_PATH=db_path,
+        TELEGRAM_API_URL=url,
+        # несколько реплик допускаются только в webhook-режиме; сам вебхук
+        # дочерние процессы не ставят — они запускают только reminders_loop
+        WEBHOOK_BASE_URL="http://127.0.0.1:9",
+        REPLICAS="2",
+        REMINDER_PARTITIONS=str(args.partitions),
+        LEASE_TTL_SECONDS=str(args.lease_ttl),
+        TELEGRAM_GLOBAL_RATE=str(10_000),
+    )
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "bench.leader_failover", "--child",
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_handover(db_path, partitions, gone_pid, timeout):
+    """Секунды до момента, когда лидер и все части — у живых реплик."""
+    t0 = time.monotonic()
+    leader_s = parts_s = None
+    while time.monotonic() - t0 < timeout and (leader_s is None or parts_s is None):
+        leader, parts = holders(db_path, partitions)
+        if leader_s is None and leader and owner_pid(leader) != gone_pid:
+            leader_s = round(time.monotonic() - t0, 2)
+        if parts_s is None and all(p and owner_pid(p) != gone_pid for p in parts):
+            parts_s = round(time.monotonic() - t0, 2)
+        await asyncio.sleep(0.05)
+    return leader_s, parts_s
+
+
+async def run_scenario(args, scenario):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "closet.db")
+        start = int(time.time())
+        due = seed(db_path, args.users, args.span, start)
+        server = FakeTelegram(global_rate=None, per_chat_interval=None, latency=args.latency)
+        url = await server.start()
+        wall_offset = time.time() - time.monotonic()
+
+        initial = args.replicas if scenario == "crash" else 1
+        procs = [await spawn(args, db_path, url) for _ in range(initial)]
+        await asyncio.sleep(args.event_at)
+
+        if scenario == "crash":
+            # одновременный старт нескольких реплик может занять дольше --event-at
+            leader = await wait_until(lambda: holders(db_path, args.partitions)[0], STARTUP_TIMEOUT)
+            if leader is None:
+                raise RuntimeError(f"no leader elected in {STARTUP_TIMEOUT}s")
+            victim = next(p for p in procs if p.pid == owner_pid(leader))
+            victim.send_signal(signal.SIGKILL)
+        else:
+            fresh = await spawn(args, db_path, url)
+            procs.append(fresh)
+            # новая реплика стартует и прогревается до остановки старой, как при rolling deploy
+            if not await wait_until(lambda: is_alive(db_path, fresh.pid), STARTUP_TIMEOUT):
+                raise RuntimeError(f"new replica not started in {STARTUP_TIMEOUT}s")
+            await asyncio.sleep(args.warmup)
+            victim = procs[0]
+            victim.send_signal(signal.SIGTERM)
+        event_wall = time.time()
+        leader_s, parts_s = await wait_handover(db_path, args.partitions, victim.pid, 3 * args.lease_ttl)
+        await victim.wait()
+
+        # дождаться напоминаний до конца окна и ещё немного
+        await asyncio.sleep(max(0.0, start + LEAD_SECONDS + args.span + 3 - time.time()))
+        for p in procs:
+            if p.returncode is None:
+                p.send_signal(signal.SIGTERM)
+        await asyncio.gather(*(p.wait() for p in procs))
+        await server.stop()
+
+    sends = [m for m in server.sent if m["method"] == "sendMessage"]
+    per_chat = Counter(int(m["chat_id"]) for m in sends)
+    first = {}
+    for m in sends:
+        first.setdefault(int(m["chat_id"]), m["at"] + wall_offset)
+    lateness = [max(0.0, first[u] - due[u]) for u in first]
+    after_event = [first[u] - due[u] for u in first if due[u] >= event_wall]
+    return {
+        "replicas_before": initial,
+        "event": "SIGKILL leader" if scenario == "crash" else "SIGTERM old replica",
+        "leader_handover_s": leader_s,
+        "partitions_handover_s": parts_s,
+        "delivered": len(per_chat),
+        "missing": len(due) - len(per_chat),
+        "duplicates": sum(n - 1 for n in per_chat.values()),
+        "lateness": common.summary(lateness, scale=1, unit="s", digits=2),
+        "late_max_after_event_s": round(max(after_event), 2) if after_event else None,
+    }
+
+
+async def run_parent(args):
+    return {scenario: await run_scenario(args, scenario) for scenario in args.scenario}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--child", action="store_true")
+    ap.add_argument("--scenario", choices=["crash", "rolling"], nargs="+", default=["crash", "rolling"])
+    ap.add_argument("--users", type=int, default=600)
+    ap.add_argument("--span", type=int, default=40)
+    ap.add_argument("--replicas", type=int, default=2)
+    ap.add_argument("--event-at", type=float, default=15)
+    ap.add_argument("--warmup", type=float, default=8)
+    ap.add_argument("--partitions", type=int, default=16)
+    ap.add_argument("--lease-ttl", type=int, default=10)
+    ap.add_argument("--latency", type=float, default=0.02)
+    args = ap.parse_args()
+    if args.child:
+        asyncio.run(run_child())
+    else:
+        print(json.dumps(asyncio.run(run_parent(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
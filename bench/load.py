@@ -0,0 +1,323 @@
+"""
+Нагрузочный прогон бота целиком: main.py в отдельном процессе против
+FakeTelegram, синтетические пользователи и гардеробы в closet.db, поток
+апдейтов от виртуальных пользователей и «09:00» — волна напоминаний посреди
+нагрузки.
+
+    python -m bench.load --users 2000 --active 200 --sessions 5 --mode polling
+
+Что происходит:
+  1. closet.db заполняется --users пользователями с --items-min..--items-max
+     вещами; у доли --notify из них включены напоминания и есть вещь, которую
+     пора постирать, а next_fire_utc приходится на --spike-at секунд после
+     начала нагрузки.
+  2. Бот запускается (polling или webhook), готовность — по /readyz.
+  3. --active виртуальных пользователей одновременно проходят по --sessions
+     сценариев: /add (три шага), /wear и нажатие на вещь, /wash и нажатие,
+     /status; между шагами — пауза со средним --think секунд. Каждый шаг ждёт
+     ответа бота в свой чат; время шага — от отправки апдейта до ответа.
+  4. Ждём, пока разойдутся все напоминания.
+
+Все случайные выборы зависят только от --seed, поэтому прогоны с одними
+параметрами сравнимы между собой. Отчёт (JSON): пропускная способность,
+p50/p99 по видам шагов, доставка и задержка напоминаний, время хэндлеров
+по span-ам самого бота (TRACE_JSONL) и память процесса бота.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from bench.common import create_db, free_port, insert_items, insert_settings, summary
+from bench.fake_telegram import FakeTelegram
+
+REMINDER_PREFIX = "Напоминание"
+CATEGORIES = ["футболка", "джинсы", "свитер", "рубашка", "куртка", "кроссовки", "шорты", "платье"]
+SCENARIOS = {"add": 0.15, "wear": 0.35, "wash": 0.2, "status": 0.3}
+
+
+def seed_db(path: str, args, fire_ts: int) -> Tuple[Dict[int, List[int]], int]:
+    """Пользователи и вещи; возвращает id вещей каждого пользователя и число получателей напоминаний."""
+    rnd = random.Random(args.seed)
+    now = int(time.time())
+    conn = create_db(path)
+    conn.execute("BEGIN")
+    settings, clothes = [], []
+    for u in range(1, args.users + 1):
+        notify = rnd.random() < args.notify
+        settings.append((u, int(notify), "09:00", "Europe/Moscow", fire_ts if notify else None))
+        for i in range(rnd.randint(args.items_min, args.items_max)):
+            # у первой вещи — носка без стирки 10 дней назад: напоминанию есть что сказать
+            worn = now - 10 * 86400 if i == 0 else now - rnd.randrange(60 * 86400)
+            washed = None if i == 0 else (worn - rnd.randrange(30 * 86400) if rnd.random() < 0.7 else None)
+            clothes.append((u, f"вещь {i}", rnd.choice(CATEGORIES), worn, washed, rnd.randrange(5)))
+    insert_settings(conn, settings)
+    insert_items(conn, clothes)
+    conn.execute("COMMIT")
+    items: Dict[int, List[int]] = defaultdict(list)
+    for user_id, item_id in conn.execute("SELECT user_id, id FROM clothes ORDER BY id"):
+        items[user_id].append(item_id)
+    conn.execute("ANALYZE")
+    conn.close()
+    return items, sum(notify for _, notify, *_ in settings)
+
+
+def read_memory(pid: int) -> Dict[str, Optional[float]]:
+    """VmRSS и VmHWM (пик) процесса в МБ; вне Linux — None."""
+    out: Dict[str, Optional[float]] = {"rss_mb": None, "peak_mb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    out["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    out["peak_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return out
+
+
+def handler_times(path: str) -> Dict[str, Any]:
+    """Время хэндлеров по span-ам, выгруженным ботом в JSONL."""
+    total, db, api = defaultdict(list), defaultdict(list), defaultdict(list)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            span = json.loads(line)
+            name = span["handler"] or span["update_type"]
+            total[name].append(span["total_ms"])
+            db[name].append(span["db_ms"])
+            api[name].append(span["api_ms"])
+    return {
+        name: {
+            **summary(total[name], scale=1.0),
+            "db_p50_ms": summary(db[name], scale=1.0)["p50_ms"],
+            "api_p50_ms": summary(api[name], scale=1.0)["p50_ms"],
+        }
+        for name in sorted(total)
+    }
+
+
+class Harness:
+    def __init__(self, args, server: FakeTelegram, items: Dict[int, List[int]], fire_ts: int):
+        self.args = args
+        self.server = server
+        self.items = items
+        self.fire_ts = fire_ts
+        self.rnd = random.Random(args.seed + 1)
+        self.secret = secrets.token_urlsafe(16)
+        self.webhook_url: Optional[str] = None
+        self.http: Optional[aiohttp.ClientSession] = None
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._update_id = 0
+        self.steps: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts = 0
+        self.reminders: List[Dict[str, Any]] = []
+        server.on_sent = self._on_sent
+
+    def _on_sent(self, msg: Dict[str, Any]) -> None:
+        if msg.get("text", "").startswith(REMINDER_PREFIX):
+            self.reminders.append(msg)
+            return
+        fut = self._waiting.pop(int(msg["chat_id"]), None)
+        if fut is not None and not fut.done():
+            fut.set_result(msg["at"])
+
+    async def _push(self, update: Dict[str, Any]) -> None:
+        if self.webhook_url is None:
+            self.server.push_update(update)
+            return
+        self._update_id += 1
+        async with self.http.post(self.webhook_url, json={"update_id": self._update_id, **update}) as resp:
+            resp.raise_for_status()
+
+    async def step(self, kind: str, user_id: int, update: Dict[str, Any]) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting[user_id] = fut
+        sent_at = time.monotonic()
+        await self._push(update)
+        try:
+            replied_at = await asyncio.wait_for(fut, self.args.step_timeout)
+        except asyncio.TimeoutError:
+            self._waiting.pop(user_id, None)
+            self.timeouts += 1
+            return
+        self.steps[kind].append(replied_at - sent_at)
+
+    async def session(self, user_id: int, scenario: str, rnd: random.Random) -> None:
+        msg = self.server.make_message
+        if scenario == "add":
+            await self.step("/add", user_id, {"message": msg(user_id, "/add")})
+            await self.think(rnd)
+            await self.step("add: name", user_id, {"message": msg(user_id, f"новая вещь {rnd.randrange(10**6)}")})
+            await self.think(rnd)
+            await self.step("add: category", user_id, {"message": msg(user_id, rnd.choice(CATEGORIES))})
+        elif scenario in ("wear", "wash"):
+            await self.step(f"/{scenario}", user_id, {"message": msg(user_id, f"/{scenario}")})
+            await self.think(rnd)
+            # callback_data кнопки вещи: ItemAction(action, item_id).pack()
+            data = f"it:{scenario}:{rnd.choice(self.items[user_id])}"
+            await self.step(f"tap {scenario}", user_id, {"callback_query": self.server.make_callback(user_id, data)})
+        else:
+            await self.step("/status", user_id, {"message": msg(user_id, "/status")})
+
+    async def think(self, rnd: random.Random) -> None:
+        if self.args.think > 0:
+            await asyncio.sleep(rnd.expovariate(1 / self.args.think))
+
+    async def virtual_user(self, user_id: int) -> None:
+        rnd = random.Random(self.args.seed * 1_000_003 + user_id)
+        names, weights = zip(*SCENARIOS.items())
+        for _ in range(self.args.sessions):
+            await self.session(user_id, rnd.choices(names, weights)[0], rnd)
+            await self.think(rnd)
+
+    async def run_load(self) -> float:
+        users = self.rnd.sample(sorted(self.items), min(self.args.active, len(self.items)))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(self.virtual_user(u) for u in users))
+        return time.perf_counter() - t0
+
+
+async def wait_ready(port: int, proc, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while time.monotonic() < deadline:
+            if proc.returncode is not None:
+                raise RuntimeError(f"bot exited with code {proc.returncode}")
+            try:
+                async with http.get(f"http://127.0.0.1:{port}/readyz") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass  # сервер ещё не поднялся
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"bot not ready in {timeout}s")
+
+
+async def run(args) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "closet.db")
+        spans_path = os.path.join(tmp, "spans.jsonl")
+        # бот стартует и прогревается примерно за --startup секунд
+        fire_ts = int(time.time() + args.startup + args.spike_at)
+        items, notify_users = seed_db(db_path, args, fire_ts)
+
+        server = FakeTelegram(
+            global_rate=args.telegram_rate or None,
+            per_chat_interval=None,
+            latency=args.latency,
+        )
+        api_url = await server.start()
+        port = free_port()
+        harness = Harness(args, server, items, fire_ts)
+        env = dict(
+            os.environ,
+            BOT_TOKEN="42:load",
+            DB_PATH=db_path,
+            TELEGRAM_API_URL=api_url,
+            PORT=str(port),
+            TRACE_JSONL=spans_path,
+            WEBHOOK_SECRET=harness.secret,
+        )
+        env.pop("WEBHOOK_BASE_URL", None)
+        if args.mode == "webhook":
+            env["WEBHOOK_BASE_URL"] = f"http://127.0.0.1:{port}"
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "main.py",
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            t_start = time.monotonic()
+            await wait_ready(port, proc)
+            startup_s = time.monotonic() - t_start
+            mem_ready = read_memory(proc.pid)
+
+            headers = {"X-Telegram-Bot-Api-Secret-Token": harness.secret}
+            async with aiohttp.ClientSession(headers=headers) as http:
+                harness.http = http
+                if args.mode == "webhook":
+                    harness.webhook_url = f"http://127.0.0.1:{port}/webhook"
+                load_start_wall = time.time()
+                elapsed = await harness.run_load()
+
+                # напоминания: ждём всех (или пока не перестанут приходить)
+                deadline = max(time.time(), fire_ts) + args.reminder_timeout
+                while len({int(m["chat_id"]) for m in harness.reminders}) < notify_users and time.time() < deadline:
+                    await asyncio.sleep(0.2)
+            mem_end = read_memory(proc.pid)
+        finally:
+            proc.terminate()
+            await proc.wait()
+            await server.stop()
+        traces = handler_times(spans_path)
+
+    wall_offset = time.time() - time.monotonic()
+    per_chat = Counter(int(m["chat_id"]) for m in harness.reminders)
+    lags = [m["at"] + wall_offset - fire_ts for m in harness.reminders]
+    window = (max(m["at"] for m in harness.reminders) - min(m["at"] for m in harness.reminders)) if harness.reminders else 0
+    all_steps = [x for v in harness.steps.values() for x in v]
+    return {
+        "config": vars(args),
+        "startup_s": round(startup_s, 2),
+        "interactive": {
+            "steps": len(all_steps),
+            "timeouts": harness.timeouts,
+            "elapsed_s": round(elapsed, 2),
+            "steps_per_s": round(len(all_steps) / elapsed, 1) if elapsed else None,
+            "latency": {"all": summary(all_steps), **{k: summary(v) for k, v in sorted(harness.steps.items())}},
+        },
+        "reminders": {
+            "expected": notify_users,
+            "delivered": len(per_chat),
+            "duplicates": sum(n - 1 for n in per_chat.values()),
+            "spike_at_s": round(fire_ts - load_start_wall, 1),
+            "lag": summary(lags, scale=1.0, unit="s", digits=2),
+            "msgs_per_s": round(len(harness.reminders) / window, 1) if window else None,
+        },
+        "bot_api": {"calls": dict(server.calls), "rejected_429": server.rejected_429},
+        "handlers": traces,
+        "memory": {"ready": mem_ready, "end": mem_end},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--items-min", type=int, default=5)
+    ap.add_argument("--items-max", type=int, default=40)
+    ap.add_argument("--notify", type=float, default=0.3, help="доля пользователей с напоминаниями")
+    ap.add_argument("--active", type=int, default=200, help="одновременных виртуальных пользователей")
+    ap.add_argument("--sessions", type=int, default=5)
+    ap.add_argument("--think", type=float, default=0.2)
+    ap.add_argument("--spike-at", type=float, default=5.0)
+    ap.add_argument("--startup", type=float, default=8.0)
+    ap.add_argument("--step-timeout", type=float, default=10.0)
+    ap.add_argument("--reminder-timeout", type=float, default=60.0)
+    ap.add_argument("--telegram-rate", type=float, default=0, help="лимит фейкового Bot API, сообщений/с (0 — без лимита)")
+    ap.add_argument("--latency", type=float, default=0.0, help="задержка ответа фейкового Bot API, с")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="дополнительно записать отчёт в файл")
+    args = ap.parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
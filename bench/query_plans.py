@@ -0,0 +1,85 @@
+"""
+Планы запросов и латентность на большой таблице clothes до и после индексов
+миграции 003.
+
+    python -m bench.query_plans --rows 1000000
+
+Результат печатается в JSON.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import migrations
+from bench.common import create_db, insert_items, summary
+
+ITEMS_PER_USER = 50
+
+QUERIES = {
+    "list_item_names": "SELECT name FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE",
+    "list_status": (
+        "SELECT name, last_worn, last_washed, worn_count FROM clothes "
+        "WHERE user_id = ? ORDER BY name COLLATE NOCASE"
+    ),
+    "item_exists": "SELECT id FROM clothes WHERE user_id = ? AND name = ?",
+}
+
+
+def seed(conn, rows):
+    users = max(1, rows // ITEMS_PER_USER)
+    conn.execute("BEGIN")
+    insert_items(conn, (
+        (i // ITEMS_PER_USER, f"item{i % ITEMS_PER_USER}", "x", "2024-01-01T09:00", None, 1)
+        for i in range(users * ITEMS_PER_USER)
+    ))
+    conn.execute("COMMIT")
+    return users
+
+
+def params_for(query, user_id):
+    return (user_id, "item7") if query == "item_exists" else (user_id,)
+
+
+def measure(conn, users, samples):
+    rnd = random.Random(42)
+    out = {}
+    for query, sql in QUERIES.items():
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params_for(query, 0))]
+        lat = []
+        for _ in range(samples):
+            uid = rnd.randrange(users)
+            t0 = time.perf_counter()
+            conn.execute(sql, params_for(query, uid)).fetchall()
+            lat.append(time.perf_counter() - t0)
+        out[query] = {"plan": plan, **summary(lat)}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--samples", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_db(os.path.join(tmp, "closet.db"), target=2)
+        users = seed(conn, args.rows)
+        before = measure(conn, users, args.samples)
+        t0 = time.perf_counter()
+        migrations.migrate(conn)
+        migrate_s = time.perf_counter() - t0
+        after = measure(conn, users, args.samples)
+        conn.close()
+
+    print(json.dumps(
+        {"rows": users * ITEMS_PER_USER, "users": users, "migration_seconds": round(migrate_s, 2),
+         "before": before, "after": after},
+        indent=2, ensure_ascii=False,
+    ))
+
+
+if __name__ == "__main__":
+    main()
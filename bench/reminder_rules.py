@@ -0,0 +1,128 @@
+"""
+Правила напоминаний для пачки «должников»: прежний путь (запрос на
+пользователя + проверка правил в Python) против одного запроса на пачку
+с вычислением правил в SQL.
+
+    python -m bench.reminder_rules --users 100000 --items 50 --days 60 --batch 1000 --batches 5
+
+Результат печатается в JSON; тексты напоминаний обоих путей сверяются.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from bench.common import import_bot, insert_items, summary
+
+bot = import_bot()
+
+
+async def old_build_reminder(user_id):
+    rows = await bot.db.fetchall(
+        "SELECT name, last_worn, last_washed FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE",
+        (user_id,),
+    )
+    need_lines = []
+    now = time.time()
+    for row in rows:
+        name, last_worn, last_washed = row["name"], row["last_worn"], row["last_washed"]
+        if last_worn is not None and (last_washed is None or last_washed < last_worn):
+            if now >= last_worn + bot.REMIND_WORN_NOT_WASHED_DAYS * 86400:
+                need_lines.append(f"• «{name}»: давно носил — самое время постирать!")
+        base = max((t for t in (last_washed, last_worn) if t is not None), default=None)
+        if base is not None and now >= base + bot.REMIND_CLEAN_NOT_WORN_DAYS * 86400:
+            need_lines.append(f"• «{name}»: давно не надевал — загляни в шкаф 😉")
+    if not need_lines:
+        return None
+    return "Напоминание 👇\n\n" + "\n".join(need_lines)
+
+
+async def old_batch(user_ids):
+    out = {}
+    for uid in user_ids:
+        text = await old_build_reminder(uid)
+        if text:
+            out[uid] = text
+    return out
+
+
+def rows(users, items, days, seed):
+    rnd = random.Random(seed)
+    now = int(time.time())
+
+    def ago():
+        return now - rnd.randrange(days * 86400)
+
+    for u in range(1, users + 1):
+        for i in range(items):
+            worn = ago() if rnd.random() < 0.8 else None
+            washed = ago() if rnd.random() < 0.6 else None
+            yield u, f"item{i:03d}", "x", worn, washed, 1
+
+
+async def populate(users, items, days, seed):
+    t0 = time.perf_counter()
+    it = rows(users, items, days, seed)
+    chunk = 200_000
+    while True:
+        part = [r for _, r in zip(range(chunk), it)]
+        if not part:
+            break
+        await bot.db.transaction(lambda conn, part=part: insert_items(conn, part))
+    await bot.db.run(lambda conn: conn.execute("ANALYZE"))
+    return round(time.perf_counter() - t0, 1)
+
+
+async def timed(fn, batches):
+    lat, out = [], {}
+    for ids in batches:
+        t0 = time.perf_counter()
+        out.update(await fn(ids))
+        lat.append(time.perf_counter() - t0)
+    return out, {
+        "batch": summary(lat),
+        "users_per_s": round(sum(len(b) for b in batches) / sum(lat)),
+    }
+
+
+async def run(users, items, days, batch, n_batches, seed):
+    await bot.db.connect()
+    await bot.repo.init_schema()
+    populate_s = await populate(users, items, days, seed)
+
+    rnd = random.Random(seed + 1)
+    batches = [rnd.sample(range(1, users + 1), min(batch, users)) for _ in range(n_batches)]
+    old, old_stats = await timed(old_batch, batches)
+    new, new_stats = await timed(bot.build_reminders, batches)
+    await bot.db.close()
+    return {
+        "users": users,
+        "items_per_user": items,
+        "activity_days": days,
+        "batch": batch,
+        "batches": n_batches,
+        "populate_s": populate_s,
+        "per_user_python": old_stats,
+        "batched_sql": new_stats,
+        "users_with_reminders": len(new),
+        "same_texts": old == new,
+        "speedup": round(new_stats["users_per_s"] / old_stats["users_per_s"], 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--items", type=int, default=50)
+    # последние «носил/стирал» равномерно за столько дней: чем больше, тем больше строк в напоминаниях
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--batch", type=int, default=bot.REMIND_BATCH)
+    ap.add_argument("--batches", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(run(args.users, args.items, args.days, args.batch, args.batches, args.seed)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
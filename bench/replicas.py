@@ -0,0 +1,150 @@
+"""
+Напоминания в нескольких процессах на одной closet.db: части user_id % N
+делятся арендами, каждое напоминание уходит ровно один раз.
+
+Родитель создаёт базу с --users напоминаниями на ближайшие секунды, поднимает
+FakeTelegram с задержкой ответа --latency (как у настоящего Bot API) и
+запускает --replicas K дочерних процессов bench.replicas --child. По
+отправленным сообщениям считает скорость, повторы и пропуски.
+
+    python -m bench.replicas --users 3000 --replicas 1 2 4
+
+С --state-backend postgres общее состояние реплик (журнал отправок,
+аренды) живёт в PostgresStateStore поверх bench/fake_postgres.py.
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from bench import common
+from bench.fake_telegram import FakeTelegram
+
+
+def seed(path, users):
+    # срабатывание через 20 с: реплики успевают стартовать и поделить части до него
+    now = int(time.time())
+    common.seed(
+        path,
+        [(u, 1, "09:00", "UTC", now + 20) for u in range(1, users + 1)],
+        [(u, f"item{i}", "x", now - 40 * 86400, None, 1) for u in range(1, users + 1) for i in range(3)],
+    )
+
+
+def child_env(args, db_path, api_url, replicas):
+    env = dict(
+        os.environ,
+        BOT_TOKEN="42:bench",
+        DB_PATH=db_path,
+        TELEGRAM_API_URL=api_url,
+        # несколько реплик допускаются только в webhook-режиме; сам вебхук
+        # дочерние процессы не ставят — они запускают только reminders_loop
+        WEBHOOK_BASE_URL="http://127.0.0.1:9",
+        REPLICAS=str(replicas),
+        REMINDER_PARTITIONS=str(args.partitions),
+        LEASE_TTL_SECONDS=str(args.lease_ttl),
+        TELEGRAM_GLOBAL_RATE=str(10_000),
+    )
+    if args.state_backend == "postgres":
+        env["BENCH_FAKE_PG"] = db_path + ".state"
+    return env
+
+
+async def run_child(seconds):
+    import main as bot
+
+    fake_pg = os.environ.get("BENCH_FAKE_PG")
+    if fake_pg:
+        from bench.fake_postgres import FakePostgresPool
+        from state_store import PostgresStateStore
+
+        bot.state_store = PostgresStateStore(pool=FakePostgresPool(fake_pg))
+        bot.fsm_storage.store = bot.state_store
+        bot.partition_leases.store = bot.state_store
+        bot.leader.store = bot.state_store
+
+    await bot.db.connect()
+    await bot.repo.init_schema()
+    await bot.state_store.connect()
+    await bot.state_store.init_schema()
+    await bot.leader.start()
+    await bot.delivery.start()
+    task = asyncio.create_task(bot.reminders_loop())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    owned = sorted(bot.partition_leases.owned)
+    await bot.delivery.stop()
+    await bot.partition_leases.close()
+    await bot.leader.close()
+    await bot.state_store.close()
+    await bot.db.close()
+    await bot.bot.session.close()
+    print(json.dumps({"owner": bot.OWNER_ID, "owned": owned, "stats": vars(bot.delivery.stats)}))
+
+
+async def run_parent(args):
+    result = {}
+    for replicas in args.replicas:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "closet.db")
+            seed(db_path, args.users)
+            if args.state_backend == "postgres":
+                from bench.fake_postgres import FakePostgresPool
+                from state_store import PostgresStateStore
+
+                pool = FakePostgresPool(db_path + ".state")
+                await PostgresStateStore(pool=pool).init_schema()
+                await pool.close()
+
+            server = FakeTelegram(global_rate=None, per_chat_interval=None, latency=args.latency)
+            url = await server.start()
+            procs = [
+                await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "bench.replicas", "--child", "--seconds", str(args.seconds),
+                    env=child_env(args, db_path, url, replicas),
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                )
+                for _ in range(replicas)
+            ]
+            outs = [json.loads((await p.communicate())[0].decode().strip().splitlines()[-1]) for p in procs]
+            await server.stop()
+
+            sends = [m for m in server.sent if m["method"] == "sendMessage"]
+            per_chat = Counter(int(m["chat_id"]) for m in sends)
+            elapsed = (max(m["at"] for m in sends) - min(m["at"] for m in sends)) if sends else 0.0
+            result[str(replicas)] = {
+                "delivered": len(per_chat),
+                "missing": args.users - len(per_chat),
+                "duplicates": sum(n - 1 for n in per_chat.values()),
+                "send_window_s": round(elapsed, 2),
+                "msgs_per_s": round(len(sends) / elapsed) if elapsed else None,
+                "partitions_per_replica": [len(o["owned"]) for o in outs],
+            }
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--child", action="store_true")
+    ap.add_argument("--seconds", type=float, default=40)
+    ap.add_argument("--users", type=int, default=3000)
+    ap.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--partitions", type=int, default=16)
+    ap.add_argument("--lease-ttl", type=int, default=6)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--state-backend", choices=["sqlite", "postgres"], default="sqlite")
+    args = ap.parse_args()
+    if args.child:
+        asyncio.run(run_child(args.seconds))
+    else:
+        print(json.dumps(asyncio.run(run_parent(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
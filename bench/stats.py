@@ -0,0 +1,129 @@
+"""
+/stats из дневных сводок при растущей истории: время ответа, скорость
+догоняющего пересчёта сводок и стоимость инкрементального прохода.
+
+    python -m bench.stats --users 2000 --items 50 --per-day 3 --days 90 900
+
+История наращивается в прошлое до каждого значения --days; пользователи,
+вещи и темп носки одни и те же, поэтому растёт только длина журнала.
+Для сравнения — тот же ответ прямым подсчётом по events за окно.
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from bench.common import import_bot, insert_items, summary
+
+bot = import_bot()
+
+FROM_EVENTS = """
+    SELECT c.id, c.name, c.category, c.price, c.wear_total, c.last_worn, COALESCE(e.wears, 0) AS wears
+    FROM clothes c
+    LEFT JOIN (
+        SELECT item_id, COUNT(*) AS wears FROM events
+        WHERE user_id = ? AND ts >= ? AND kind = 'wear'
+        GROUP BY item_id
+    ) e ON e.item_id = c.id
+    WHERE c.user_id = ?
+"""
+
+
+async def add_history(users, items, per_day, day_from, day_to, now, seed):
+    """События за дни [day_from, day_to) назад от now."""
+    rnd = random.Random(seed)
+    buf = []
+
+    async def flush():
+        await bot.db.transaction(lambda conn: conn.executemany(
+            "INSERT INTO events (item_id, user_id, kind, ts) VALUES (?, ?, ?, ?)", buf
+        ))
+        buf.clear()
+
+    for day in range(day_from, day_to):
+        base = now - (day + 1) * 86400
+        for u in range(1, users + 1):
+            for _ in range(per_day):
+                item_id = (u - 1) * items + rnd.randrange(items) + 1
+                buf.append((item_id, u, "wear" if rnd.random() < 0.8 else "wash", base + rnd.randrange(86400)))
+        if len(buf) >= 200_000:
+            await flush()
+    await flush()
+
+
+async def stats_latency(users, samples, now, seed):
+    rnd = random.Random(seed)
+    since_day = now // 86400 - bot.STATS_WINDOW_DAYS + 1
+    since_ts = since_day * 86400
+    rollup_lat, events_lat = [], []
+    for _ in range(samples):
+        uid = rnd.randrange(1, users + 1)
+        t0 = time.perf_counter()
+        a = bot.render_stats(await bot.repo.stats_items(uid, since_day), now)
+        rollup_lat.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        b = bot.render_stats(await bot.db.fetchall(FROM_EVENTS, (uid, since_ts, uid)), now)
+        events_lat.append(time.perf_counter() - t0)
+        assert a == b, (a, b)
+    return summary(rollup_lat), summary(events_lat)
+
+
+async def run(args):
+    await bot.db.connect()
+    await bot.repo.init_schema()
+    await bot.db.transaction(lambda conn: insert_items(
+        conn, [(u, f"item{i:03d}", f"cat{i % 5}", None, None, 0) for u in range(1, args.users + 1) for i in range(args.items)]
+    ))
+    now = int(time.time())
+    result = []
+    done_days = 0
+    for days in sorted(args.days):
+        await add_history(args.users, args.items, args.per_day, done_days, days, now, args.seed + days)
+        await bot.db.run(lambda conn: conn.execute("ANALYZE"))
+        done_days = days
+        events = (await bot.db.fetchone("SELECT COUNT(*) AS n FROM events"))["n"]
+
+        t0 = time.perf_counter()
+        applied = await bot.rollups.run_once()
+        catch_up = time.perf_counter() - t0
+
+        # обычный интервал работы задачи: несколько тысяч новых событий
+        rnd = random.Random(args.seed)
+        for _ in range(args.increment):
+            u = rnd.randrange(1, args.users + 1)
+            await bot.repo.mark_worn(u, (u - 1) * args.items + rnd.randrange(args.items) + 1, now)
+        t0 = time.perf_counter()
+        inc = await bot.rollups.run_once()
+        incremental = time.perf_counter() - t0
+
+        from_rollups, from_events = await stats_latency(args.users, args.samples, now, args.seed)
+        result.append({
+            "history_days": days,
+            "events": events,
+            "rollup_rows": (await bot.db.fetchone("SELECT COUNT(*) AS n FROM item_daily"))["n"],
+            "catch_up": {"events": applied, "s": round(catch_up, 2), "events_per_s": round(applied / catch_up)},
+            "incremental": {"events": inc, "ms": round(incremental * 1000, 1)},
+            "stats_from_rollups": from_rollups,
+            "stats_from_events": from_events,
+        })
+    await bot.db.close()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--items", type=int, default=50)
+    ap.add_argument("--per-day", type=int, default=3)
+    ap.add_argument("--days", type=int, nargs="+", default=[90, 900])
+    ap.add_argument("--increment", type=int, default=5000)
+    ap.add_argument("--samples", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
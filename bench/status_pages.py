@@ -0,0 +1,69 @@
+"""
+Стоимость /status для гардеробов из 10, 1k и 10k вещей: прежний вывод всего
+списка одним сообщением против постраничного (первая и «глубокая» страница).
+
+    python -m bench.status_pages --sizes 10 1000 10000
+
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from bench.common import import_bot, insert_items, summary
+
+bot = import_bot()
+
+
+async def full_render(user_id):
+    rows = await bot.db.fetchall(
+        "SELECT name, last_worn, last_washed, worn_count, wear_total, wash_total, first_washed "
+        "FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE",
+        (user_id,),
+    )
+    tz = bot.resolve_tz(bot.DEFAULT_TZ)
+    return "\n\n".join(bot.render_status_item(row, tz) for row in rows)
+
+
+async def timed(fn, repeat):
+    lat = []
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = await fn()
+        lat.append(time.perf_counter() - t0)
+    return out, summary(lat)
+
+
+async def run(sizes, repeat):
+    await bot.db.connect()
+    await bot.repo.init_schema()
+    result = {}
+    for user_id, size in enumerate(sizes, start=1):
+        await bot.db.transaction(lambda conn: insert_items(
+            conn, [(user_id, f"item{i:05d}", "x", 1704099600, None, 1) for i in range(size)]
+        ))
+        text, full = await timed(lambda: full_render(user_id), repeat)
+        _, first = await timed(lambda: bot.render_status_page(user_id), repeat)
+        deep_id = (await bot.repo.status_page(user_id, 1, after_id=None))[0]["id"] + size // 2
+        _, deep = await timed(lambda: bot.render_status_page(user_id, 2, after=deep_id), repeat)
+        result[str(size)] = {
+            "full_render": {**full, "chars": len(text), "fits_one_message": len(text) <= bot.TELEGRAM_TEXT_LIMIT},
+            "first_page": first,
+            "middle_page": deep,
+        }
+    await bot.db.close()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+    print(json.dumps(asyncio.run(run(args.sizes, args.repeat)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Расчёт следующих сроков напоминаний и проверка /notify_tz при большом
+числе пользователей в небольшом наборе часовых поясов.
+
+    python -m bench.tz_schedule --users 100000 --zones 30
+
+Сравниваются:
+    per_user_uncached — прежний расчёт: ZoneInfo(), обработка ошибки и
+                        datetime.now() на каждого пользователя;
+    per_user_cached   — next_fire_utc() на каждого с кэшем ZoneInfo;
+    grouped           — next_fire_times() на всю пачку (дата — раз на пояс,
+                        срок — раз на пару notify_time/tz).
+Для /notify_tz — ZoneInfo() в try/except против lookup_tz() на смеси
+верных и ошибочных имён. Результат печатается в JSON.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from scheduler import DEFAULT_TZ, lookup_tz, next_fire_times, next_fire_utc
+
+NOTIFY_TIMES = ["09:00", "08:30", "07:45", "10:00", "21:00", "20:30", "12:00", "18:15"]
+
+
+def legacy_next_fire_utc(notify_time, tz_name):
+    try:
+        tz = ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo(DEFAULT_TZ)
+    after = datetime.now(timezone.utc)
+    hh, mm = (int(x) for x in notify_time.split(":"))
+    local_day = after.astimezone(tz).date()
+    after_ts = after.timestamp()
+    for shift in range(3):
+        day = local_day + timedelta(days=shift)
+        ts = int(datetime(day.year, day.month, day.day, hh, mm, tzinfo=tz, fold=0).timestamp())
+        if ts > after_ts:
+            return ts
+
+
+def legacy_valid(name):
+    try:
+        ZoneInfo(name)
+    except Exception:
+        return False
+    return True
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--zones", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    zones = sorted(rnd.sample(sorted(available_timezones()), args.zones - 1)) + [DEFAULT_TZ]
+    # большинство — в поясе по умолчанию и со временем по умолчанию
+    users = [
+        (
+            "09:00" if rnd.random() < 0.6 else rnd.choice(NOTIFY_TIMES),
+            DEFAULT_TZ if rnd.random() < 0.5 else rnd.choice(zones),
+        )
+        for _ in range(args.users)
+    ]
+
+    after = datetime.now(timezone.utc)
+    # один общий момент, чтобы результаты совпадали; прежний код брал now() на каждого
+    uncached, expected = timed(lambda: [legacy_next_fire_utc(t, z) for t, z in users], args.repeat)
+    cached, a = timed(lambda: [next_fire_utc(t, z, after) for t, z in users], args.repeat)
+    grouped, b = timed(lambda: next_fire_times(users, after), args.repeat)
+    assert a == b
+    assert sum(x != y for x, y in zip(expected, b)) <= args.users // 1000  # смена минуты во время замера
+
+    names = [rnd.choice(zones) if rnd.random() < 0.8 else f"Mars/Base{rnd.randrange(50)}" for _ in range(10_000)]
+    v_uncached, ok_a = timed(lambda: [legacy_valid(n) for n in names], args.repeat)
+    v_cached, ok_b = timed(lambda: [lookup_tz(n) is not None for n in names], args.repeat)
+    assert ok_a == ok_b
+
+    print(json.dumps({
+        "users": args.users,
+        "zones": args.zones,
+        "distinct_pairs": len(set(users)),
+        "next_fire": {
+            "per_user_uncached_ms": round(uncached * 1000, 1),
+            "per_user_cached_ms": round(cached * 1000, 1),
+            "grouped_ms": round(grouped * 1000, 1),
+            "speedup": round(uncached / grouped, 1),
+        },
+        "tz_validation_10k": {
+            "zoneinfo_try_ms": round(v_uncached * 1000, 1),
+            "lookup_tz_ms": round(v_cached * 1000, 1),
+            "speedup": round(v_uncached / v_cached, 1),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Латентность «апдейт → ответ» и пропускная способность: long polling против
+webhook, оба против локального фейкового Bot API.
+
+    python -m bench.webhook_vs_polling --updates 500 --concurrency 20
+
+Результат печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from bench.common import summary
+from bench.fake_telegram import FakeTelegram
+
+TOKEN = "42:bench"
+SECRET = "bench-secret"
+
+
+def build_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message):
+        await message.answer("ok")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def wait_replies(server, n, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while len(server.sent) < n and time.perf_counter() < deadline:
+        await asyncio.sleep(0.005)
+
+
+def summarize(pushed, server, elapsed):
+    lat = [m["at"] - pushed[int(m["chat_id"])] for m in server.sent if int(m["chat_id"]) in pushed]
+    if not lat:
+        return {"replies": 0}
+    return {"replies": len(lat), "updates_per_sec": round(len(lat) / elapsed, 1), **summary(lat)}
+
+
+async def run_polling(args):
+    server = FakeTelegram(global_rate=None, per_chat_interval=None)
+    url = await server.start()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    dp = build_dispatcher()
+    polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=10, handle_signals=False))
+    await asyncio.sleep(0.5)
+
+    pushed = {}
+    t0 = time.perf_counter()
+    for i in range(args.updates):
+        pushed[i + 1] = time.monotonic()
+        server.push_update({"message": server.make_message(i + 1, "/status")})
+        if (i + 1) % args.concurrency == 0:
+            await asyncio.sleep(0)
+    await wait_replies(server, args.updates)
+    elapsed = time.perf_counter() - t0
+
+    await dp.stop_polling()
+    await polling
+    await server.stop()
+    return summarize(pushed, server, elapsed)
+
+
+async def run_webhook(args):
+    server = FakeTelegram(global_rate=None, per_chat_interval=None)
+    url = await server.start()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    dp = build_dispatcher()
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=SECRET).register(app, path="/webhook")
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    hook = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/webhook"
+
+    pushed = {}
+    sem = asyncio.Semaphore(args.concurrency)
+    async with aiohttp.ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as http:
+        async def deliver(i):
+            async with sem:
+                update = {"update_id": i + 1, "message": server.make_message(i + 1, "/status")}
+                pushed[i + 1] = time.monotonic()
+                async with http.post(hook, json=update) as resp:
+                    assert resp.status == 200, resp.status
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(deliver(i) for i in range(args.updates)))
+        await wait_replies(server, args.updates)
+        elapsed = time.perf_counter() - t0
+
+        # чужой запрос без секрета должен отклоняться
+        async with aiohttp.ClientSession() as anon:
+            async with anon.post(hook, json={"update_id": 0}) as resp:
+                rejected = resp.status == 401
+
+    await runner.cleanup()
+    await bot.session.close()
+    await server.stop()
+    return {**summarize(pushed, server, elapsed), "rejects_bad_secret": rejected}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=20)
+    args = ap.parse_args()
+    result = {
+        "updates": args.updates,
+        "polling": asyncio.run(run_polling(args)),
+        "webhook": asyncio.run(run_webhook(args)),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
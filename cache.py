@@ -0,0 +1,70 @@
+"""
+Кэш данных гардероба пользователя (клавиатуры /wear, /wash и т.п.).
+
+LRU с ограничением по числу пользователей. У каждого пользователя есть
+версия гардероба: любое изменение списка вещей вызывает invalidate(), и
+записи, посчитанные по старой версии, больше не возвращаются и не сохраняются.
+Версии берутся из общего счётчика, который никогда не сбрасывается, поэтому
+забытая при очистке версия не может совпасть с версией чтения «в полёте».
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Generic, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+class WardrobeCache(Generic[V]):
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[int, Tuple[int, V]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._clock = 0   # источник версий
+        self._floor = 0   # версия пользователей без своей записи в _versions
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, self._floor)
+
+    def get(self, user_id: int) -> Optional[V]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != self.version(user_id):
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.stats.hits += 1
+        return entry[1]
+
+    def put(self, user_id: int, version: int, value: V) -> None:
+        """version — то, что вернул version() до чтения из БД."""
+        if version != self.version(user_id):
+            return  # гардероб изменился, пока мы читали
+        self._entries[user_id] = (version, value)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        self._clock += 1
+        self._versions[user_id] = self._clock
+        self._entries.pop(user_id, None)
+        self.stats.invalidations += 1
+        if len(self._versions) > 4 * self.max_entries:
+            # версии нужны только пока чтение «в полёте»: оставляем версии
+            # сохранённых записей, остальным — новая общая, которой не было
+            # ни у одного начатого чтения
+            self._clock += 1
+            self._floor = self._clock
+            self._versions = {uid: entry[0] for uid, entry in self._entries.items()}
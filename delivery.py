@@ -0,0 +1,175 @@
+"""
+Доставка исходящих сообщений (напоминаний) с учётом лимитов Telegram.
+
+Ограниченная очередь + пул воркеров. Общий темп ограничен token bucket'ом
+(~30 сообщений/с на бота), в один чат — не чаще раза в секунду. 429 (RetryAfter)
+ставит на паузу всех воркеров на указанное время, сетевые/5xx ошибки
+повторяются с экспоненциальной задержкой, остальные ошибки API — отбрасываются.
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+log = logging.getLogger("closet-bot.delivery")
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class Outgoing:
+    chat_id: int
+    text: str
+    attempt: int = 0
+
+
+@dataclass
+class DeliveryStats:
+    enqueued: int = 0
+    sent: int = 0
+    retried: int = 0
+    dropped: int = 0
+
+
+class DeliveryQueue:
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = 8,
+        maxsize: int = 10_000,
+        global_rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = DeliveryStats()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # без всплесков: Telegram считает лимит по скользящему окну
+        self._bucket = TokenBucket(global_rate, capacity=1)
+        self._chat_next: Dict[int, float] = {}  # chat_id -> monotonic, раньше которого не слать
+        self._paused_until = 0.0
+        self._tasks: list = []
+        self._delayed: set = set()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Даёт очереди дослаться (не дольше drain_timeout) и останавливает воркеров."""
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            log.warning("Delivery stopped with %s undelivered messages", self._queue.qsize())
+        for handle in self._delayed:
+            handle.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def send(self, chat_id: int, text: str) -> None:
+        """Ставит сообщение в очередь; при переполнении ждёт места (backpressure)."""
+        await self._queue.put(Outgoing(chat_id, text))
+        self.stats.enqueued += 1
+
+    # ----- внутреннее -----
+    async def _wait_turn(self, chat_id: int) -> None:
+        # слот в чате занимаем до ожидания: иначе два воркера с сообщениями
+        # в один чат оба увидят свободный чат и отправят подряд
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + self.per_chat_interval
+        wait = max(self._paused_until, slot) - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await self._bucket.acquire()
+        if len(self._chat_next) > 4 * self._queue.maxsize:
+            now = time.monotonic()
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+
+    def _retry_later(self, msg: Outgoing, delay: float) -> None:
+        msg.attempt += 1
+        self.stats.retried += 1
+
+        def _requeue() -> None:
+            self._delayed.discard(handle)
+            try:
+                self._queue.put_nowait(msg)
+            except asyncio.QueueFull:
+                self.stats.dropped += 1
+                log.warning("Delivery queue full, dropping retry for chat %s", msg.chat_id)
+
+        handle = asyncio.get_running_loop().call_later(delay, _requeue)
+        self._delayed.add(handle)
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            msg: Outgoing = await self._queue.get()
+            try:
+                await self._wait_turn(msg.chat_id)
+                await self.bot.send_message(msg.chat_id, msg.text)
+                self.stats.sent += 1
+            except TelegramRetryAfter as e:
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                if msg.attempt + 1 < self.max_attempts:
+                    self._retry_later(msg, e.retry_after)
+                else:
+                    self.stats.dropped += 1
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if msg.attempt + 1 < self.max_attempts:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** msg.attempt)
+                    self._retry_later(msg, delay * random.uniform(0.5, 1.5))
+                else:
+                    self.stats.dropped += 1
+                    log.warning("Giving up on chat %s after %s attempts: %s", msg.chat_id, msg.attempt + 1, e)
+            except TelegramAPIError as e:
+                # бот заблокирован, чат не найден и т.п. — повторять бессмысленно
+                self.stats.dropped += 1
+                log.info("Dropping message to chat %s: %s", msg.chat_id, e)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats.dropped += 1
+                log.exception("Unexpected delivery error for chat %s: %s", msg.chat_id, e)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,129 @@
+"""
+FSM-хранилище aiogram поверх StateStore (вместо MemoryStorage).
+
+Состояние и данные диалога переживают перезапуск и видны всем репликам.
+Записи с истёкшим TTL (брошенные на полпути /add, /notify_time и т.п.) не
+возвращаются и периодически удаляются. Перед хранилищем стоит ограниченный
+LRU-кэш, так что обычный апдейт пользователя без активного диалога не ходит
+в БД вовсе. Кэш локален для процесса: при нескольких репликах, между
+которыми апдейты одного пользователя могут попадать в разные процессы,
+его нужно выключать (cache_size=0).
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from state_store import StateStore
+
+log = logging.getLogger("closet-bot.fsm")
+
+# (state, data, expires_at)
+_Entry = Tuple[Optional[str], Dict[str, Any], int]
+_EMPTY: _Entry = (None, {}, 0)
+
+
+def encode_key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+def encode_data(data: Dict[str, Any]) -> Optional[str]:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) if data else None
+
+
+class PersistentStorage(BaseStorage):
+    def __init__(
+        self,
+        store: StateStore,
+        ttl: int = 24 * 3600,
+        cache_size: int = 10_000,
+        purge_interval: int = 600,
+    ):
+        self.store = store
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.purge_interval = purge_interval
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._purger: Optional[asyncio.Task] = None
+
+    # ----- жизненный цикл -----
+    async def start(self) -> None:
+        if self.purge_interval > 0:
+            self._purger = asyncio.create_task(self._purge_loop())
+
+    async def close(self) -> None:
+        if self._purger is not None:
+            self._purger.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._purger
+            self._purger = None
+
+    async def purge_expired(self) -> int:
+        now = int(time.time())
+        for k in [k for k, (_, _, exp) in self._cache.items() if exp and exp <= now]:
+            del self._cache[k]
+        return await self.store.fsm_purge(now)
+
+    async def _purge_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                removed = await self.purge_expired()
+                if removed:
+                    log.info("Purged %s expired FSM records", removed)
+            except Exception as e:
+                log.exception("Ошибка очистки FSM: %s", e)
+
+    # ----- кэш -----
+    def cached(self) -> int:
+        return len(self._cache)
+
+    def _remember(self, k: str, entry: _Entry) -> None:
+        self._cache[k] = entry
+        self._cache.move_to_end(k)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, k: str) -> _Entry:
+        entry = self._cache.get(k)
+        if entry is None:
+            record = await self.store.fsm_load(k)
+            entry = (record[0], json.loads(record[1]) if record[1] else {}, record[2]) if record else _EMPTY
+            self._remember(k, entry)
+        else:
+            self._cache.move_to_end(k)
+        if entry[2] and entry[2] <= time.time():
+            return _EMPTY
+        return entry
+
+    async def _save(self, k: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        if state is None and not data:
+            self._remember(k, _EMPTY)
+            await self.store.fsm_delete(k)
+            return
+        expires_at = int(time.time()) + self.ttl
+        self._remember(k, (state, data, expires_at))
+        await self.store.fsm_save(k, state, encode_data(data), expires_at)
+
+    # ----- BaseStorage -----
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = encode_key(key)
+        _, data, _ = await self._load(k)
+        await self._save(k, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(encode_key(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = encode_key(key)
+        state, _, _ = await self._load(k)
+        await self._save(k, state, dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._load(encode_key(key)))[1])
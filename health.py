@@ -0,0 +1,93 @@
+"""
+Проверки готовности и живости процесса для /readyz и /healthz/deep.
+
+Каждая проверка — корутина с таймаутом; в ответ попадают её результат,
+время выполнения и подробности. Отметки «последнего события» (проход
+цикла напоминаний, полученный апдейт, ответ getUpdates) ставятся
+Heartbeat-ами по месту и стоят одного вызова time.monotonic().
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import GetUpdates, Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+# результат проверки: ok и подробности для JSON
+Check = Callable[[], Awaitable[Tuple[bool, Dict[str, Any]]]]
+
+
+class Heartbeat:
+    """Момент последнего события по часам time.monotonic()."""
+
+    def __init__(self):
+        self.at: Optional[float] = None
+
+    def beat(self) -> None:
+        self.at = time.monotonic()
+
+    def age(self) -> Optional[float]:
+        return None if self.at is None else time.monotonic() - self.at
+
+
+def freshness(hb: Heartbeat, max_age: float, grace_until: float) -> Tuple[bool, Dict[str, Any]]:
+    """Отметка моложе max_age; пока её не было, проверка проходит до grace_until (monotonic)."""
+    age = hb.age()
+    if age is None:
+        return time.monotonic() < grace_until, {"age_s": None, "max_age_s": max_age}
+    return age <= max_age, {"age_s": round(age, 3), "max_age_s": max_age}
+
+
+async def probe(check: Check, timeout: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        ok, details = await asyncio.wait_for(check(), timeout)
+    except asyncio.TimeoutError:
+        ok, details = False, {"error": f"timeout after {timeout}s"}
+    except Exception as e:
+        ok, details = False, {"error": f"{type(e).__name__}: {e}"}
+    return {"ok": ok, "latency_ms": round((time.perf_counter() - start) * 1000, 3), **details}
+
+
+async def run_checks(checks: Dict[str, Check], timeout: float) -> Tuple[bool, Dict[str, Any]]:
+    """Все проверки параллельно. Возвращает (всё ли в порядке, тело ответа)."""
+    results = await asyncio.gather(*(probe(check, timeout) for check in checks.values()))
+    ok = all(r["ok"] for r in results)
+    return ok, {"status": "ok" if ok else "fail", "checks": dict(zip(checks, results))}
+
+
+class UpdateHeartbeatMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: отметка о каждом полученном апдейте."""
+
+    def __init__(self, hb: Heartbeat):
+        self.hb = hb
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self.hb.beat()
+        return await handler(event, data)
+
+
+class PollHeartbeatMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: отметка об успешном ответе getUpdates (поллинг жив, даже если апдейтов нет)."""
+
+    def __init__(self, hb: Heartbeat):
+        self.hb = hb
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        response = await make_request(bot, method)
+        if isinstance(method, GetUpdates):
+            self.hb.beat()
+        return response
@@ -0,0 +1,205 @@
+"""
+Распределение работы между репликами через аренды в StateStore.
+
+Пользователи напоминаний разбиты на N частей по user_id % N. Каждая
+реплика держит аренду worker:<owner> (признак жизни) и забирает себе
+примерно N / <число живых реплик> частей reminders:<k>, продлевая их
+раз в ttl/3. Упавшая реплика перестаёт продлевать аренды, и через ttl
+её части разбирают остальные; новая реплика получает свою долю, когда
+остальные отпускают лишнее на следующем продлении.
+
+Работу, которую достаточно делать в одном процессе (пересчёт сводок,
+чистка журнала отправок), выполняет лидер — владелец аренды leader
+(LeaderLease). Остановленная штатно реплика отдаёт аренды сразу, упавшая —
+через ttl. Реплика без лидерства пробует взять аренду в момент её
+истечения, поэтому новый лидер появляется не позже ttl после падения.
+
+Аренда считается своей, только пока последнее продление моложе
+2/3 ttl: процесс, который завис или потерял связь с хранилищем,
+перестаёт работать раньше, чем его аренду сможет забрать другой.
+"""
+import asyncio
+import logging
+import math
+import os
+import secrets
+import socket
+import time
+import zlib
+from contextlib import suppress
+from typing import Callable, Optional, Set
+
+from state_store import StateStore
+
+log = logging.getLogger("closet-bot.leases")
+
+
+def make_owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+
+class _Renewed:
+    """Продление аренд раз в ttl/3 в фоне; наследники реализуют refresh()."""
+
+    def __init__(self, store: StateStore, owner: str, ttl: int, on_change: Optional[Callable[[], None]]):
+        self.store = store
+        self.owner = owner
+        self.ttl = ttl
+        self.on_change = on_change
+        self._renewed_at = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() - self._renewed_at < self.ttl * 2 / 3
+
+    async def start(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            # хранилище недоступно при старте — работаем без аренд, продление повторит попытку
+            log.exception("Ошибка получения аренд: %s", e)
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def refresh(self) -> None:
+        raise NotImplementedError
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
+
+    def _next_refresh(self) -> float:
+        """Секунд до следующего продления."""
+        return self.ttl / 3
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._next_refresh())
+            try:
+                await self.refresh()
+            except Exception as e:
+                log.exception("Ошибка продления аренд: %s", e)
+
+
+class LeaderLease(_Renewed):
+    """Один лидер среди реплик: аренда `name`, продлеваемая раз в ttl/3."""
+
+    def __init__(
+        self,
+        store: StateStore,
+        owner: str,
+        ttl: int = 10,
+        name: str = "leader",
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        super().__init__(store, owner, ttl, on_change)
+        self.name = name
+        self._held = False
+        self._taken_until: Optional[int] = None  # когда истекает чужая аренда
+
+    @property
+    def is_leader(self) -> bool:
+        return self._held and self.fresh
+
+    async def close(self) -> None:
+        await super().close()
+        if self._held:
+            self._held = False
+            await self.store.release_lease(self.name, self.owner)
+
+    def _next_refresh(self) -> float:
+        if self._held or self._taken_until is None:
+            return self.ttl / 3
+        # не ждать следующего тика: лидер мог упасть, его аренда освободится в _taken_until
+        return min(self.ttl / 3, max(0.05, self._taken_until - time.time()))
+
+    async def refresh(self) -> None:
+        started = time.monotonic()
+        held = await self.store.acquire_lease(self.name, self.owner, self.ttl, int(time.time()))
+        if held:
+            self._renewed_at = started
+            self._taken_until = None
+        else:
+            self._taken_until = await self.store.lease_expires_at(self.name)
+        if held != self._held:
+            self._held = held
+            log.info("Leadership %s by %s", "acquired" if held else "lost", self.owner)
+            self._changed()
+
+
+class PartitionLeases(_Renewed):
+    def __init__(
+        self,
+        store: StateStore,
+        owner: str,
+        partitions: int,
+        ttl: int = 10,
+        prefix: str = "reminders",
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        super().__init__(store, owner, ttl, on_change)
+        self.partitions = partitions
+        self.prefix = prefix
+        self._owned: Set[int] = set()
+
+    def _name(self, part: int) -> str:
+        return f"{self.prefix}:{part}"
+
+    @property
+    def owned(self) -> Set[int]:
+        """Свои части; пусто, если аренды давно не удавалось продлить."""
+        return self._owned if self.fresh else set()
+
+    async def close(self) -> None:
+        await super().close()
+        # отдать части сразу, не дожидаясь истечения аренд
+        for part in self._owned:
+            await self.store.release_lease(self._name(part), self.owner)
+        await self.store.release_lease(f"worker:{self.owner}", self.owner)
+        self._owned = set()
+
+    async def refresh(self) -> None:
+        started = time.monotonic()
+        now = int(time.time())
+        await self.store.acquire_lease(f"worker:{self.owner}", self.owner, self.ttl, now)
+        workers = max(1, len(await self.store.live_leases("worker:", now)))
+        share = math.ceil(self.partitions / workers)
+
+        held = set()
+        for part in sorted(self._owned):
+            if await self.store.acquire_lease(self._name(part), self.owner, self.ttl, now):
+                held.add(part)
+        for part in sorted(held, reverse=True)[:max(0, len(held) - share)]:
+            await self.store.release_lease(self._name(part), self.owner)
+            held.discard(part)
+
+        if len(held) < share:
+            taken = {
+                int(name.rsplit(":", 1)[1])
+                for name, owner in await self.store.live_leases(self.prefix + ":", now)
+                if owner != self.owner
+            }
+            # разные реплики начинают перебор с разных частей — меньше гонок за одну и ту же
+            start = zlib.crc32(self.owner.encode()) % self.partitions
+            for i in range(self.partitions):
+                part = (start + i) % self.partitions
+                if part in held or part in taken:
+                    continue
+                if await self.store.acquire_lease(self._name(part), self.owner, self.ttl, now):
+                    held.add(part)
+                    if len(held) >= share:
+                        break
+
+        changed = held != self._owned
+        self._owned = held
+        self._renewed_at = started
+        if changed:
+            log.info("Reminder partitions owned: %s of %s", sorted(held), self.partitions)
+            self._changed()
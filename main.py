@@ -1,27 +1,46 @@
 import asyncio
+import hashlib
 import logging
 import os
-import sqlite3
+import signal
+import time
 from contextlib import suppress
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from aiohttp import web
-from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from zoneinfo import ZoneInfo
 
 from aiogram import Bot, Dispatcher, F, Router, types
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import (
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
     Message,
-    ReplyKeyboardMarkup,
-    KeyboardButton,
     ReplyKeyboardRemove,
     BotCommand,
 )
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import metrics
+from cache import WardrobeCache
+from delivery import DeliveryQueue
+from fsm_storage import PersistentStorage
+from health import Heartbeat, PollHeartbeatMiddleware, UpdateHeartbeatMiddleware, freshness, run_checks
+from tracing import ApiTracingMiddleware, JsonlExporter, OtlpExporter, UpdateTracingMiddleware
+from leases import LeaderLease, PartitionLeases, make_owner_id
+from rollup import RollupJob
+from scheduler import DEFAULT_TZ, Wakeup, claim_due, lookup_tz, next_fire_times, next_fire_utc, resolve_tz
+from state_store import PostgresStateStore, SQLiteStateStore
+from storage import ClosetRepository, Database, DBConfig
 
 # =========================
 # Настройки / инициализация
@@ -36,43 +55,84 @@ logging.basicConfig(
 )
 log = logging.getLogger("closet-bot")
 
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
+# Webhook-режим включается, если задан публичный адрес сервиса; иначе — long polling
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет одинаков во всех процессах бота: каждый вызывает set_webhook при
+# старте, и Telegram присылает последний — при rolling deploy и нескольких
+# репликах запросы к остальным иначе получали бы 401
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(b"closet-bot webhook:" + BOT_TOKEN.encode()).hexdigest()
+# Свой сервер Bot API (локальный telegram-bot-api или заглушка для нагрузочных тестов)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+# Сколько процессов бота работает одновременно (только в webhook-режиме:
+# getUpdates из двух процессов Telegram не допускает). При REPLICAS > 1
+# локальные кэши выключены, а лимит отправки делится между репликами
+REPLICAS = max(1, int(os.getenv("REPLICAS", "1")))
+if REPLICAS > 1 and not WEBHOOK_BASE_URL:
+    raise RuntimeError("REPLICAS > 1 работает только в webhook-режиме: задай WEBHOOK_BASE_URL")
+
+bot = Bot(
+    token=BOT_TOKEN,
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None,
+)
 router = Router()
+# время и ошибки каждого хэндлера — в /metrics
+router.message.middleware(metrics.HandlerMetricsMiddleware())
+router.callback_query.middleware(metrics.HandlerMetricsMiddleware())
+# общий лимит Telegram на бота (по умолчанию ~30 сообщений/с), делится между репликами
+delivery = DeliveryQueue(bot, global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", "30")) / REPLICAS)
 
 # =========================
 # БД (SQLite)
 # =========================
-DB_PATH = "closet.db"
-db = sqlite3.connect(DB_PATH)
-db.row_factory = sqlite3.Row
-cursor = db.cursor()
+DB_PATH = os.getenv("DB_PATH", "closet.db")
+db = Database(DB_PATH, DBConfig.from_env())
+repo = ClosetRepository(db)
 
-cursor.execute(
-    """
-CREATE TABLE IF NOT EXISTS clothes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    name TEXT,
-    category TEXT,
-    last_worn TEXT,
-    last_washed TEXT,
-    worn_count INTEGER
-)
-"""
-)
+# Общее состояние реплик: FSM, журнал отправленных напоминаний, аренды.
+# По умолчанию — в той же closet.db, с STATE_DSN — в Postgres. Данные
+# пользователей остаются в closet.db, поэтому и с STATE_DSN все реплики
+# открывают один файл DB_PATH (проверяется при старте, см. state_store.py)
+STATE_DSN = os.getenv("STATE_DSN")
+state_store = PostgresStateStore(STATE_DSN) if STATE_DSN else SQLiteStateStore(db)
 
-cursor.execute(
-    """
-CREATE TABLE IF NOT EXISTS user_settings (
-    user_id INTEGER PRIMARY KEY,
-    notify_on INTEGER DEFAULT 0,           -- 0/1
-    notify_time TEXT DEFAULT '09:00',      -- HH:MM
-    tz TEXT DEFAULT 'Europe/Moscow'        -- IANA TZ
+# Аренды в state_store: упавшую реплику остальные подменяют через LEASE_TTL_SECONDS
+OWNER_ID = make_owner_id()
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "10"))
+# лидер выполняет фоновую работу, которой достаточно одного процесса
+leader = LeaderLease(state_store, OWNER_ID, ttl=LEASE_TTL_SECONDS)
+
+fsm_storage = PersistentStorage(
+    state_store,
+    ttl=int(os.getenv("FSM_TTL_SECONDS", str(24 * 3600))),
+    cache_size=10_000 if REPLICAS == 1 else 0,
 )
-"""
+dp = Dispatcher(storage=fsm_storage)
+
+# отметки для /readyz и /healthz/deep
+started = Heartbeat()            # инициализация main() завершена
+updates_heartbeat = Heartbeat()  # последний полученный апдейт
+poll_heartbeat = Heartbeat()     # последний успешный getUpdates
+reminders_heartbeat = Heartbeat()
+dp.update.outer_middleware(UpdateHeartbeatMiddleware(updates_heartbeat))
+
+# Трассировка апдейтов: дольше TRACE_SLOW_MS — в лог вместе с SQL; все span-ы
+# можно выгружать в JSONL (TRACE_JSONL) и/или в OTLP-коллектор (TRACE_OTLP_ENDPOINT)
+trace_exporters = []
+if os.getenv("TRACE_JSONL"):
+    trace_exporters.append(JsonlExporter(os.environ["TRACE_JSONL"]))
+if os.getenv("TRACE_OTLP_ENDPOINT"):
+    trace_exporters.append(OtlpExporter(os.environ["TRACE_OTLP_ENDPOINT"]))
+dp.update.outer_middleware(UpdateTracingMiddleware(float(os.getenv("TRACE_SLOW_MS", "500")), trace_exporters))
+bot.session.middleware(ApiTracingMiddleware())
+
+# дневные сводки для /stats, дочитываются из журнала событий в фоне
+rollups = RollupJob(
+    db,
+    interval=int(os.getenv("STATS_ROLLUP_INTERVAL", "300")),
+    should_run=lambda: leader.is_leader,
 )
-db.commit()
 
 # ==========
 # FSM (для добавления)
@@ -87,35 +147,44 @@ class ChangeNotifyTime(StatesGroup):
 class ChangeTimezone(StatesGroup):
     waiting_for_tz = State()
 
+class SetPrice(StatesGroup):
+    waiting_for_price = State()
+
 # =========================
-# Память (режим выбора)
+# Callback-данные
 # =========================
-# user_id -> "wear" | "wash"
-_pending_action: dict[int, str] = {}
+class ItemAction(CallbackData, prefix="it"):
+    action: str   # "wear" | "wash" | "price"
+    item_id: int
+
+class ItemPage(CallbackData, prefix="ip"):
+    action: str        # как в ItemAction
+    after: int = 0     # id последней вещи предыдущей страницы
+    before: int = 0    # id первой вещи следующей страницы
+
+class MultiPick(CallbackData, prefix="mp"):
+    action: str       # "wear" | "wash"
+    op: str           # "t" — переключить вещь, "ok" — применить, "all" — постирать всё ношеное,
+                      # "next" / "prev" — страница после / до вещи item_id
+    item_id: int = 0
+    on: int = 0       # выбрана ли вещь (выбор на странице хранится прямо в клавиатуре сообщения)
 
 # =========================
-# Утилиты
+# Память (гардероб)
 # =========================
-def now_tz(tz_name: str) -> datetime:
-    try:
-        tz = ZoneInfo(tz_name)
-    except ZoneInfoNotFoundError:
-        tz = ZoneInfo("Europe/Moscow")
-    return datetime.now(tz)
-
-def get_or_create_user_settings(user_id: int) -> sqlite3.Row:
-    cursor.execute("SELECT * FROM user_settings WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    if row is None:
-        cursor.execute(
-            "INSERT INTO user_settings (user_id, notify_on, notify_time, tz) VALUES (?, 0, '09:00', 'Europe/Moscow')",
-            (user_id,),
-        )
-        db.commit()
-        cursor.execute("SELECT * FROM user_settings WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-    return row
+class Wardrobe(NamedTuple):
+    items: Tuple[Tuple[int, str], ...]   # (id, name) в порядке (name COLLATE NOCASE, id)
+    positions: Dict[int, int]            # id -> индекс в items
+    keyboards: Dict[Tuple[str, int, int], InlineKeyboardMarkup]  # (action, start, end) -> готовая страница
+
+# Список вещей и готовые клавиатуры страниц; сбрасывается при любом изменении гардероба
+wardrobe_cache: WardrobeCache[Wardrobe] = WardrobeCache(
+    int(os.getenv("WARDROBE_CACHE_SIZE", "10000")) if REPLICAS == 1 else 0
+)
 
+# =========================
+# Утилиты
+# =========================
 def parse_hhmm(text: str) -> Optional[str]:
     parts = text.strip().split(":")
     if len(parts) != 2:
@@ -128,15 +197,11 @@ def parse_hhmm(text: str) -> Optional[str]:
         return f"{hh:02d}:{mm:02d}"
     return None
 
-def list_user_items(user_id: int) -> List[str]:
-    cursor.execute("SELECT name FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE", (user_id,))
-    return [row["name"] for row in cursor.fetchall()]
-
-def chunk_buttons(names: List[str], per_row: int = 3) -> List[List[KeyboardButton]]:
+def chunk_buttons(buttons: List[Any], per_row: int = 3) -> List[List[Any]]:
     rows = []
     row = []
-    for nm in names:
-        row.append(KeyboardButton(text=nm))
+    for btn in buttons:
+        row.append(btn)
         if len(row) == per_row:
             rows.append(row)
             row = []
@@ -144,14 +209,71 @@ def chunk_buttons(names: List[str], per_row: int = 3) -> List[List[KeyboardButto
         rows.append(row)
     return rows
 
-def human_date(iso: Optional[str]) -> str:
-    if not iso:
+async def get_wardrobe(user_id: int) -> Wardrobe:
+    cached = wardrobe_cache.get(user_id)
+    if cached is not None:
+        return cached
+    version = wardrobe_cache.version(user_id)
+    items = tuple((row["id"], row["name"]) for row in await repo.list_items(user_id))
+    wardrobe = Wardrobe(items, {item_id: i for i, (item_id, _) in enumerate(items)}, {})
+    wardrobe_cache.put(user_id, version, wardrobe)
+    return wardrobe
+
+# Вещей на одной клавиатуре: Telegram отклоняет inline-клавиатуры примерно
+# от 100 кнопок, большие гардеробы листаются страницами
+ITEM_PAGE_SIZE = 24
+
+def page_slice(wardrobe: Wardrobe, after: int = 0, before: int = 0) -> Tuple[int, int]:
+    """Границы [start, end) страницы в wardrobe.items по keyset-якорю, как у StatusPage.
+
+    after/before — id крайней вещи соседней страницы; если её уже нет — первая страница.
+    """
+    if before in wardrobe.positions:
+        end = wardrobe.positions[before]
+        start = max(0, end - ITEM_PAGE_SIZE)
+    else:
+        start = wardrobe.positions[after] + 1 if after in wardrobe.positions else 0
+        end = min(len(wardrobe.items), start + ITEM_PAGE_SIZE)
+    if start >= end:
+        return 0, min(len(wardrobe.items), ITEM_PAGE_SIZE)
+    return start, end
+
+def page_nav(wardrobe: Wardrobe, start: int, end: int, prev_data, next_data) -> List[InlineKeyboardButton]:
+    """Кнопки «Назад»/«Вперёд»; prev_data/next_data — callback_data по id крайней вещи."""
+    nav = []
+    if start > 0:
+        nav.append(InlineKeyboardButton(text="◀️ Назад", callback_data=prev_data(wardrobe.items[start][0])))
+    if end < len(wardrobe.items):
+        nav.append(InlineKeyboardButton(text="Вперёд ▶️", callback_data=next_data(wardrobe.items[end - 1][0])))
+    return nav
+
+def item_keyboard(wardrobe: Wardrobe, action: str, start: int, end: int) -> InlineKeyboardMarkup:
+    key = (action, start, end)
+    kb = wardrobe.keyboards.get(key)
+    if kb is None:
+        buttons = [
+            InlineKeyboardButton(text=name, callback_data=ItemAction(action=action, item_id=item_id).pack())
+            for item_id, name in wardrobe.items[start:end]
+        ]
+        rows = chunk_buttons(buttons, 3)
+        nav = page_nav(
+            wardrobe, start, end,
+            lambda item_id: ItemPage(action=action, before=item_id).pack(),
+            lambda item_id: ItemPage(action=action, after=item_id).pack(),
+        )
+        if nav:
+            rows.append(nav)
+        kb = wardrobe.keyboards[key] = InlineKeyboardMarkup(inline_keyboard=rows)
+    return kb
+
+def format_money(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+def human_date(ts: Optional[int], tz: ZoneInfo) -> str:
+    """epoch UTC -> локальное время пользователя."""
+    if ts is None:
         return "никогда"
-    try:
-        dt = datetime.fromisoformat(iso)
-        return dt.strftime("%Y-%m-%d %H:%M")
-    except Exception:
-        return iso
+    return datetime.fromtimestamp(ts, tz).strftime("%Y-%m-%d %H:%M")
 
 # =========================
 # Команды (меню)
@@ -162,7 +284,11 @@ async def set_commands():
         BotCommand(command="add", description="Добавить вещь"),
         BotCommand(command="wear", description="Отметить: носил"),
         BotCommand(command="wash", description="Отметить: постирал"),
+        BotCommand(command="outfit", description="Отметить комплект (несколько вещей)"),
+        BotCommand(command="laundry", description="Стирка: несколько вещей сразу"),
         BotCommand(command="status", description="Статус вещей"),
+        BotCommand(command="stats", description="Что я на самом деле ношу"),
+        BotCommand(command="price", description="Указать цену вещи"),
         BotCommand(command="notify_on", description="Включить напоминания"),
         BotCommand(command="notify_off", description="Выключить напоминания"),
         BotCommand(command="notify_time", description="Время напоминания (HH:MM)"),
@@ -176,14 +302,16 @@ async def set_commands():
 # =========================
 @router.message(F.text.in_({"/start", "/help"}))
 async def cmd_start(message: Message):
-    s = get_or_create_user_settings(message.from_user.id)
+    s = await repo.get_or_create_user_settings(message.from_user.id)
     text = (
         "Привет! Я помогу отслеживать гардероб и напомню, когда пора стирать 👕\n\n"
         "Команды:\n"
         "• /add — добавить вещь\n"
         "• /wear — отметить, что носил\n"
         "• /wash — отметить, что постирал\n"
-        "• /status — текущий статус\n\n"
+        "• /outfit — отметить сразу несколько вещей, /laundry — постирать несколько\n"
+        "• /status — текущий статус\n"
+        "• /stats — статистика за месяц, /price — цена вещи (для стоимости одной носки)\n\n"
         "Напоминания:\n"
         "• /notify_on — включить, /notify_off — выключить\n"
         "• /notify_time — время (HH:MM)\n"
@@ -209,111 +337,380 @@ async def add_category(message: Message, state: FSMContext):
     data = await state.get_data()
     name = data.get("name").strip()
     category = message.text.strip()
-    cursor.execute(
-        """
-        INSERT INTO clothes (user_id, name, category, last_worn, last_washed, worn_count)
-        VALUES (?, ?, ?, NULL, NULL, 0)
-        """,
-        (message.from_user.id, name, category),
-    )
-    db.commit()
+    await repo.add_item(message.from_user.id, name, category)
+    wardrobe_cache.invalidate(message.from_user.id)
     await state.clear()
     await message.answer(f"Добавлено: <b>{name}</b> ({category})")
 
+STATUS_PAGE_SIZE = 10
+TELEGRAM_TEXT_LIMIT = 4096
+
+class StatusPage(CallbackData, prefix="st"):
+    page: int          # номер страницы (с 1), только для подписи
+    after: int = 0     # id последней вещи предыдущей страницы
+    before: int = 0    # id первой вещи следующей страницы
+
+def render_status_item(row, tz: ZoneInfo) -> str:
+    name = row["name"]
+    worn = human_date(row["last_worn"], tz)
+    washed = human_date(row["last_washed"], tz)
+    count = row["worn_count"]
+    line = (
+        f"👕 <b>{name}</b>\n"
+        f"  — Надевалось: {count} раз\n"
+        f"  — Последний раз носил: {worn}\n"
+        f"  — Последняя стирка: {washed}"
+    )
+    if row["wear_total"] > count:
+        line += f"\n  — Всего надевалось: {row['wear_total']}"
+    if row["wash_total"] >= 2:
+        days = (row["last_washed"] - row["first_washed"]) / 86400 / (row["wash_total"] - 1)
+        line += f"\n  — Стирка в среднем раз в {days:.1f} дн."
+    if count >= 3:
+        line += "\n  ❗ Похоже, стоит постирать 🙂"
+    return line
+
+async def render_status_page(user_id: int, page: int = 1, after: int = 0, before: int = 0):
+    """Текст и клавиатура одной страницы /status. None — если вещей нет."""
+    if before:
+        rows = await repo.status_page(user_id, STATUS_PAGE_SIZE, before_id=before)
+        has_next = True
+    else:
+        # на одну строку больше — чтобы узнать, есть ли следующая страница
+        rows = await repo.status_page(user_id, STATUS_PAGE_SIZE + 1, after_id=after or None)
+        has_next = len(rows) > STATUS_PAGE_SIZE
+        rows = rows[:STATUS_PAGE_SIZE]
+    if not rows:
+        return None
+
+    tz = resolve_tz(await repo.user_tz(user_id) or DEFAULT_TZ)
+    lines = [render_status_item(row, tz) for row in rows]
+    footer = f"\n\nСтраница {page}"
+    # очень длинные названия: урезаем страницу, остаток уйдёт на следующую
+    while len(lines) > 1 and len("\n\n".join(lines)) + len(footer) > TELEGRAM_TEXT_LIMIT:
+        lines.pop()
+        rows = rows[:-1]
+        has_next = True
+
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton(
+            text="◀️ Назад", callback_data=StatusPage(page=page - 1, before=rows[0]["id"]).pack()
+        ))
+    if has_next:
+        nav.append(InlineKeyboardButton(
+            text="Вперёд ▶️", callback_data=StatusPage(page=page + 1, after=rows[-1]["id"]).pack()
+        ))
+    if page == 1 and not has_next:
+        footer = ""
+    kb = InlineKeyboardMarkup(inline_keyboard=[nav]) if nav else None
+    return "\n\n".join(lines) + footer, kb
+
 @router.message(F.text == "/status")
 async def cmd_status(message: Message):
-    cursor.execute(
-        "SELECT name, last_worn, last_washed, worn_count FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE",
-        (message.from_user.id,),
+    rendered = await render_status_page(message.from_user.id)
+    if rendered is None:
+        await message.answer("Нет вещей. Используй /add")
+        return
+    text, kb = rendered
+    await message.answer(text, reply_markup=kb)
+
+@router.callback_query(StatusPage.filter())
+async def status_page_click(callback: CallbackQuery, callback_data: StatusPage):
+    rendered = await render_status_page(
+        callback.from_user.id, callback_data.page, callback_data.after, callback_data.before
     )
-    rows = cursor.fetchall()
+    if rendered is None:
+        await callback.answer("Список изменился, открой /status заново")
+        return
+    text, kb = rendered
+    with suppress(TelegramBadRequest):  # «message is not modified» при двойном нажатии
+        await callback.message.edit_text(text, reply_markup=kb)
+    await callback.answer()
+
+# ----- статистика -----
+STATS_WINDOW_DAYS = 30
+STATS_TOP = 3
+STATS_LIST_LIMIT = 5
+
+def render_stats(rows, now_ts: int) -> str:
+    """Текст /stats по строкам repo.stats_items: носки за окно, цена, последняя носка."""
+    lines = [f"📊 <b>Статистика за {STATS_WINDOW_DAYS} дней</b>"]
+    total = sum(row["wears"] for row in rows)
+    if total:
+        by_wears = sorted(rows, key=lambda row: -row["wears"])
+        most = [row for row in by_wears[:STATS_TOP] if row["wears"]]
+        shown = {row["id"] for row in most}
+        least = [row for row in reversed(by_wears) if row["id"] not in shown][:STATS_TOP]
+        lines.append("\nЧаще всего:")
+        lines += [f"• {row['name']} — {row['wears']}" for row in most]
+        if least:
+            lines.append("\nРеже всего:")
+            lines += [f"• {row['name']} — {row['wears']}" for row in least]
+
+        shares: Dict[str, int] = {}
+        for row in rows:
+            category = row["category"] or "без категории"
+            shares[category] = shares.get(category, 0) + row["wears"]
+        lines.append("\nПо категориям:")
+        lines += [
+            f"• {category} — {round(wears * 100 / total)}%"
+            for category, wears in sorted(shares.items(), key=lambda kv: -kv[1]) if wears
+        ]
+    else:
+        lines.append("\nЗа это время ничего не отмечено как ношеное.")
+
+    idle_since = now_ts - STATS_WINDOW_DAYS * 86400
+    idle = [row["name"] for row in rows if row["last_worn"] is None or row["last_worn"] < idle_since]
+    if idle:
+        more = f" и ещё {len(idle) - STATS_LIST_LIMIT}" if len(idle) > STATS_LIST_LIMIT else ""
+        lines.append(f"\nНе надевались больше {STATS_WINDOW_DAYS} дней: " + ", ".join(idle[:STATS_LIST_LIMIT]) + more)
+
+    priced = [row for row in rows if row["price"] is not None]
+    if priced:
+        # никогда не надетая вещь «стоит» свою полную цену за носку
+        priced.sort(key=lambda row: -row["price"] / max(row["wear_total"], 1))
+        lines.append("\nСтоимость одной носки:")
+        lines += [
+            f"• {row['name']} — {format_money(row['price'] / max(row['wear_total'], 1))}"
+            + ("" if row["wear_total"] else " (ещё не надевалась)")
+            for row in priced[:STATS_LIST_LIMIT]
+        ]
+    return "\n".join(lines)
+
+@router.message(F.text == "/stats")
+async def cmd_stats(message: Message):
+    now_ts = int(time.time())
+    rows = await repo.stats_items(message.from_user.id, now_ts // 86400 - STATS_WINDOW_DAYS + 1)
     if not rows:
         await message.answer("Нет вещей. Используй /add")
         return
-    lines = []
-    for row in rows:
-        name = row["name"]
-        worn = human_date(row["last_worn"])
-        washed = human_date(row["last_washed"])
-        count = row["worn_count"]
-        line = (
-            f"👕 <b>{name}</b>\n"
-            f"  — Надевалось: {count} раз\n"
-            f"  — Последний раз носил: {worn}\n"
-            f"  — Последняя стирка: {washed}"
-        )
-        if count >= 3:
-            line += "\n  ❗ Похоже, стоит постирать 🙂"
-        lines.append(line)
-    await message.answer("\n\n".join(lines))
+    # сводки дочитываются фоновой задачей, свежие отметки появятся с задержкой
+    await message.answer(render_stats(rows, now_ts) + "\n\n<i>Обновляется раз в несколько минут.</i>")
 
 # ----- wear / wash упрощённая логика -----
-@router.message(F.text == "/wear")
-async def cmd_wear(message: Message):
-    items = list_user_items(message.from_user.id)
-    if not items:
+ITEM_PROMPT = {
+    "wear": "Выбери вещь, которую ты <b>носил</b>:",
+    "wash": "Выбери вещь, которую ты <b>постирал</b>:",
+    "price": "Выбери вещь, для которой указать <b>цену</b>:",
+}
+
+async def send_items(message: Message, action: str):
+    wardrobe = await get_wardrobe(message.from_user.id)
+    if not wardrobe.items:
         await message.answer("Нет добавленных вещей. Используй /add")
         return
-    _pending_action[message.from_user.id] = "wear"
-    kb = ReplyKeyboardMarkup(keyboard=chunk_buttons(items, 3), resize_keyboard=True)
-    await message.answer("Выбери вещь, которую ты <b>носил</b>:", reply_markup=kb)
+    kb = item_keyboard(wardrobe, action, *page_slice(wardrobe))
+    await message.answer(ITEM_PROMPT[action], reply_markup=kb)
+
+@router.message(F.text == "/wear")
+async def cmd_wear(message: Message):
+    await send_items(message, "wear")
 
 @router.message(F.text == "/wash")
 async def cmd_wash(message: Message):
-    items = list_user_items(message.from_user.id)
-    if not items:
-        await message.answer("Нет добавленных вещей. Используй /add")
+    await send_items(message, "wash")
+
+@router.message(F.text == "/price")
+async def cmd_price(message: Message):
+    await send_items(message, "price")
+
+@router.callback_query(ItemPage.filter())
+async def item_page_click(callback: CallbackQuery, callback_data: ItemPage):
+    wardrobe = await get_wardrobe(callback.from_user.id)
+    if not wardrobe.items:
+        await callback.answer("Нет добавленных вещей. Используй /add")
         return
-    _pending_action[message.from_user.id] = "wash"
-    kb = ReplyKeyboardMarkup(keyboard=chunk_buttons(items, 3), resize_keyboard=True)
-    await message.answer("Выбери вещь, которую ты <b>постирал</b>:", reply_markup=kb)
-
-@router.message(F.text)
-async def handle_item_click(message: Message):
-    """Если пользователь в режиме wear/wash и нажал название вещи — применяем действие."""
-    user_id = message.from_user.id
-    action = _pending_action.get(user_id)
-    if not action:
-        return  # не ждём выбора — игнорируем
-
-    name = message.text.strip()
-    cursor.execute("SELECT id FROM clothes WHERE user_id = ? AND name = ?", (user_id, name))
-    row = cursor.fetchone()
-    if not row:
-        return  # не наша кнопка
-
-    now_iso = datetime.now().isoformat(timespec="minutes")
-    if action == "wear":
-        cursor.execute(
-            "UPDATE clothes SET last_worn = ?, worn_count = worn_count + 1 WHERE user_id = ? AND name = ?",
-            (now_iso, user_id, name),
-        )
-        db.commit()
-        await message.answer(
-            f"Отмечено: ты носил «{name}» сегодня.",
-            reply_markup=ReplyKeyboardRemove()
-        )
-    elif action == "wash":
-        cursor.execute(
-            "UPDATE clothes SET last_washed = ?, worn_count = 0 WHERE user_id = ? AND name = ?",
-            (now_iso, user_id, name),
-        )
-        db.commit()
-        await message.answer(
-            f"Отмечено: «{name}» постирана!",
-            reply_markup=ReplyKeyboardRemove()
+    start, end = page_slice(wardrobe, callback_data.after, callback_data.before)
+    await callback.answer()
+    with suppress(TelegramBadRequest):  # «message is not modified» при двойном нажатии
+        await callback.message.edit_reply_markup(reply_markup=item_keyboard(wardrobe, callback_data.action, start, end))
+
+@router.callback_query(ItemAction.filter())
+async def handle_item_click(callback: CallbackQuery, callback_data: ItemAction, state: FSMContext):
+    """Нажатие на вещь под /wear или /wash — одно UPDATE по первичному ключу."""
+    user_id = callback.from_user.id
+    now_ts = int(time.time())
+    if callback_data.action == "price":
+        await state.set_state(SetPrice.waiting_for_price)
+        await state.update_data(item_id=callback_data.item_id)
+        await callback.answer()
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_text("Введи цену числом (например 1990) или «-», чтобы убрать цену.")
+        return
+    if callback_data.action == "wear":
+        name = await repo.mark_worn(user_id, callback_data.item_id, now_ts)
+        text = f"Отмечено: ты носил «{name}» сегодня."
+    elif callback_data.action == "wash":
+        name = await repo.mark_washed(user_id, callback_data.item_id, now_ts)
+        text = f"Отмечено: «{name}» постирана!"
+    else:
+        name = None
+
+    if name is None:
+        await callback.answer("Вещь не найдена")
+        return
+    await callback.answer()
+    with suppress(TelegramBadRequest):
+        await callback.message.edit_text(text)
+
+@router.message(SetPrice.waiting_for_price)
+async def set_price(message: Message, state: FSMContext):
+    raw = message.text.strip().replace(" ", "").replace(",", ".")
+    if raw == "-":
+        price = None
+    else:
+        try:
+            price = float(raw)
+        except ValueError:
+            price = -1.0
+        if not 0 <= price < 1e9:
+            await message.answer("Не понял цену. Введи число, например 1990, или «-».")
+            return
+    data = await state.get_data()
+    await state.clear()
+    name = await repo.set_price(message.from_user.id, data.get("item_id", 0), price)
+    if name is None:
+        await message.answer("Вещь не найдена")
+    elif price is None:
+        await message.answer(f"Цена «{name}» убрана.")
+    else:
+        await message.answer(f"Цена «{name}»: <b>{format_money(price)}</b>")
+
+# ----- несколько вещей за раз -----
+MULTI_PROMPT = {
+    "wear": "Отметь всё, что <b>надето</b>, и нажми «Готово»:",
+    "wash": "Отметь всё, что <b>постирано</b>, и нажми «Готово»:",
+}
+
+def multi_keyboard(action: str, wardrobe: Wardrobe, start: int, end: int, selected: set) -> InlineKeyboardMarkup:
+    """Страница [start, end) вещей; selected — выбор на всех страницах (для счётчика)."""
+    buttons = [
+        InlineKeyboardButton(
+            text=("✅ " if item_id in selected else "") + name,
+            callback_data=MultiPick(action=action, op="t", item_id=item_id, on=int(item_id in selected)).pack(),
         )
+        for item_id, name in wardrobe.items[start:end]
+    ]
+    rows = chunk_buttons(buttons, 2)
+    nav = page_nav(
+        wardrobe, start, end,
+        lambda item_id: MultiPick(action=action, op="prev", item_id=item_id).pack(),
+        lambda item_id: MultiPick(action=action, op="next", item_id=item_id).pack(),
+    )
+    if nav:
+        rows.append(nav)
+    controls = [InlineKeyboardButton(
+        text=f"Готово ({len(selected)})", callback_data=MultiPick(action=action, op="ok").pack()
+    )]
+    if action == "wash":
+        controls.append(InlineKeyboardButton(
+            text="🧺 Всё ношеное", callback_data=MultiPick(action=action, op="all").pack()
+        ))
+    rows.append(controls)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def picks_in(markup: Optional[InlineKeyboardMarkup]) -> Tuple[List[int], set, bool]:
+    """Из callback_data кнопок сообщения: вещи на странице, выбранные среди них и есть ли другие страницы."""
+    shown, selected, paged = [], set(), False
+    for row in (markup.inline_keyboard if markup else []):
+        for btn in row:
+            if not (btn.callback_data or "").startswith(MultiPick.__prefix__ + MultiPick.__separator__):
+                continue
+            data = MultiPick.unpack(btn.callback_data)
+            if data.op == "t":
+                shown.append(data.item_id)
+                if data.on:
+                    selected.add(data.item_id)
+            elif data.op in ("prev", "next"):
+                paged = True
+    return shown, selected, paged
+
+# Выбор на других страницах: в данных FSM пользователя, только для последнего
+# сообщения /outfit или /laundry; пока гардероб помещается на одну страницу,
+# хранилище не трогается
+MULTI_KEY = "multi_pick"
+
+async def saved_picks(state: FSMContext, message_id: int) -> set:
+    saved = (await state.get_data()).get(MULTI_KEY)
+    return set(saved["ids"]) if saved and saved["message_id"] == message_id else set()
+
+async def send_multi(message: Message, action: str):
+    wardrobe = await get_wardrobe(message.from_user.id)
+    if not wardrobe.items:
+        await message.answer("Нет добавленных вещей. Используй /add")
+        return
+    kb = multi_keyboard(action, wardrobe, *page_slice(wardrobe), set())
+    await message.answer(MULTI_PROMPT[action], reply_markup=kb)
+
+@router.message(F.text == "/outfit")
+async def cmd_outfit(message: Message):
+    await send_multi(message, "wear")
 
-    # очистим режим
-    _pending_action.pop(user_id, None)
+@router.message(F.text == "/laundry")
+async def cmd_laundry(message: Message):
+    await send_multi(message, "wash")
+
+@router.callback_query(MultiPick.filter())
+async def handle_multi_click(callback: CallbackQuery, callback_data: MultiPick, state: FSMContext):
+    user_id = callback.from_user.id
+    action = callback_data.action
+    message_id = callback.message.message_id
+    shown, selected, paged = picks_in(callback.message.reply_markup)
+    if paged:
+        selected |= await saved_picks(state, message_id) - set(shown)
+    now_ts = int(time.time())
+
+    if callback_data.op in ("t", "prev", "next"):
+        wardrobe = await get_wardrobe(user_id)
+        if callback_data.op == "t":
+            selected ^= {callback_data.item_id}
+            # та же страница: от первой до последней показанной вещи
+            if shown and shown[0] in wardrobe.positions and shown[-1] in wardrobe.positions:
+                start, end = wardrobe.positions[shown[0]], wardrobe.positions[shown[-1]] + 1
+            else:
+                start, end = page_slice(wardrobe)
+        else:
+            anchor = {"after": callback_data.item_id} if callback_data.op == "next" else {"before": callback_data.item_id}
+            start, end = page_slice(wardrobe, **anchor)
+            await state.update_data({MULTI_KEY: {"message_id": message_id, "ids": sorted(selected)}})
+        await callback.answer()
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_reply_markup(
+                reply_markup=multi_keyboard(action, wardrobe, start, end, selected)
+            )
+        return
+
+    if callback_data.op == "all" and action == "wash":
+        count = await repo.wash_all_worn(user_id, now_ts)
+        text = f"Постирано всё ношеное: {count} шт." if count else "Нет вещей, которые носили после стирки."
+    elif callback_data.op == "ok":
+        if not selected:
+            await callback.answer("Ничего не выбрано")
+            return
+        if action == "wear":
+            count = await repo.mark_worn_many(user_id, sorted(selected), now_ts)
+            text = f"Отмечено: ты носил {count} шт. сегодня."
+        else:
+            count = await repo.mark_washed_many(user_id, sorted(selected), now_ts)
+            text = f"Отмечено: постирано {count} шт."
+    else:
+        await callback.answer()
+        return
+
+    if paged:
+        await state.update_data({MULTI_KEY: None})
+    await callback.answer()
+    with suppress(TelegramBadRequest):
+        await callback.message.edit_text(text)
 
 # ----- уведомления -----
 @router.message(F.text.in_({"/notify_on", "/notify_off"}))
 async def toggle_notify(message: Message):
     on = 1 if message.text == "/notify_on" else 0
-    cursor.execute("UPDATE user_settings SET notify_on = ? WHERE user_id = ?", (on, message.from_user.id))
-    db.commit()
-    s = get_or_create_user_settings(message.from_user.id)
+    await repo.set_notify_on(message.from_user.id, on)
+    await reschedule(message.from_user.id)
+    s = await repo.get_or_create_user_settings(message.from_user.id)
     await message.answer(
         f"Уведомления <b>{'включены' if s['notify_on'] else 'выключены'}</b>. "
         f"Время: <b>{s['notify_time']}</b>, TZ: <b>{s['tz']}</b>"
@@ -330,10 +727,10 @@ async def set_notify_time(message: Message, state: FSMContext):
     if not val:
         await message.answer("Неверный формат. Введи HH:MM, например 08:45.")
         return
-    cursor.execute("UPDATE user_settings SET notify_time = ? WHERE user_id = ?", (val, message.from_user.id))
-    db.commit()
+    await repo.set_notify_time(message.from_user.id, val)
+    await reschedule(message.from_user.id)
     await state.clear()
-    s = get_or_create_user_settings(message.from_user.id)
+    s = await repo.get_or_create_user_settings(message.from_user.id)
     await message.answer(f"Готово! Время напоминания: <b>{s['notify_time']}</b>. Текущий TZ: <b>{s['tz']}</b>.")
 
 @router.message(F.text == "/notify_tz")
@@ -348,15 +745,13 @@ async def ask_tz(message: Message, state: FSMContext):
 @router.message(ChangeTimezone.waiting_for_tz)
 async def set_tz(message: Message, state: FSMContext):
     tz_candidate = message.text.strip()
-    try:
-        _ = ZoneInfo(tz_candidate)
-    except Exception:
+    if lookup_tz(tz_candidate) is None:
         await message.answer("Не удалось распознать TZ. Пример: Europe/Moscow. Попробуй ещё раз.")
         return
-    cursor.execute("UPDATE user_settings SET tz = ? WHERE user_id = ?", (tz_candidate, message.from_user.id))
-    db.commit()
+    await repo.set_tz(message.from_user.id, tz_candidate)
+    await reschedule(message.from_user.id)
     await state.clear()
-    s = get_or_create_user_settings(message.from_user.id)
+    s = await repo.get_or_create_user_settings(message.from_user.id)
     await message.answer(f"Готово! TZ: <b>{s['tz']}</b>. Время напоминания: <b>{s['notify_time']}</b>.")
 
 # =========================
@@ -365,85 +760,209 @@ async def set_tz(message: Message, state: FSMContext):
 REMIND_WORN_NOT_WASHED_DAYS = 7
 REMIND_CLEAN_NOT_WORN_DAYS = 30
 
+# Если процесс проспал момент отправки дольше этого — не шлём устаревшее напоминание.
+# Опоздание считается от начала разбора очереди сработавших: ожидание места
+# в очереди отправки во время пика в него не входит
+REMIND_GRACE_SECONDS = 60
+REMIND_BATCH = 1000
+REMIND_MAX_SLEEP = 60
+# записи журнала отправок старше этого уже не нужны для защиты от повторов
+REMIND_LOG_KEEP_SECONDS = 2 * 24 * 3600
+
+_reminders_wakeup = Wakeup()
+
+REMINDER_TICK_SECONDS = metrics.histogram("closet_reminders_tick_seconds", "Длительность прохода reminders_loop")
+REMINDERS_DUE = metrics.counter("closet_reminders_due_users", "Пользователи со сработавшим напоминанием")
+REMINDERS_DUE_LAST = metrics.gauge("closet_reminders_due_last_tick", "Пользователей в последней пачке напоминаний")
+REMINDERS_SENT = metrics.counter("closet_reminders_sent", "Напоминания, поставленные в очередь отправки")
+REMINDERS_SKIPPED = metrics.counter("closet_reminders_skipped", "Проспанные напоминания: срок перенесён без отправки")
+
+# Напоминания делятся между репликами по user_id % REMINDER_PARTITIONS;
+# каждую часть в любой момент обслуживает ровно одна реплика (при
+# REMINDER_PARTITIONS=1 — единственный отправитель на весь бот)
+REMINDER_PARTITIONS = int(os.getenv("REMINDER_PARTITIONS", "16"))
+partition_leases = PartitionLeases(
+    state_store,
+    OWNER_ID,
+    REMINDER_PARTITIONS,
+    ttl=LEASE_TTL_SECONDS,
+    on_change=_reminders_wakeup.notify,
+)
+
+async def reschedule(user_id: int):
+    """Пересчитать next_fire_utc после изменения настроек уведомлений."""
+    s = await repo.get_or_create_user_settings(user_id)
+    ts = next_fire_utc(s["notify_time"], s["tz"]) if s["notify_on"] else None
+    await repo.set_next_fire(user_id, ts)
+    _reminders_wakeup.notify()
+
+async def build_reminders(user_ids: List[int]) -> Dict[int, str]:
+    """Тексты напоминаний для пачки пользователей; без подходящих вещей — не попадают в ответ."""
+    now = int(time.time())
+    rows = await repo.reminder_items(
+        user_ids,
+        worn_before=now - REMIND_WORN_NOT_WASHED_DAYS * 86400,
+        idle_before=now - REMIND_CLEAN_NOT_WORN_DAYS * 86400,
+    )
+    lines: Dict[int, List[str]] = {}
+    for row in rows:
+        need_lines = lines.setdefault(row["user_id"], [])
+        name = row["name"]
+        # 1) носил, но не стирал 7 дней
+        if row["worn_due"]:
+            need_lines.append(f"• «{name}»: давно носил — самое время постирать!")
+        # 2) чистая вещь и давно не надевал (30 дней)
+        if row["idle_due"]:
+            need_lines.append(f"• «{name}»: давно не надевал — загляни в шкаф 😉")
+    return {uid: "Напоминание 👇\n\n" + "\n".join(need) for uid, need in lines.items()}
+
 async def reminders_loop():
+    reminders_heartbeat.beat()
     await asyncio.sleep(5)
-    sent_guard = {}  # (user_id, 'YYYY-MM-DD HH:MM')
+    # части берём, только когда готовы их обслуживать: при rolling deploy
+    # старая реплика отдаёт их новой, и та не должна держать их впустую
+    await partition_leases.start()
+
+    # пользователи, включившие уведомления до появления next_fire_utc
+    pending = await repo.unscheduled_users()
+    if pending:
+        fires = next_fire_times((s["notify_time"], s["tz"]) for s in pending)
+        await repo.set_next_fires([(s["user_id"], ts) for s, ts in zip(pending, fires)])
 
+    pruned_at = 0.0
+    drain_start: Optional[int] = None  # первый проход текущего разбора просроченных
     while True:
+        reminders_heartbeat.beat()
+        owned = sorted(partition_leases.owned)
+        tick_start = time.perf_counter()
         try:
-            cursor.execute("SELECT user_id, notify_on, notify_time, tz FROM user_settings WHERE notify_on = 1")
-            users = cursor.fetchall()
-            for s in users:
-                user_id = s["user_id"]
-                tz = s["tz"]
-                t = s["notify_time"]
-
-                try:
-                    now_local = now_tz(tz)
-                except Exception:
-                    now_local = now_tz("Europe/Moscow")
-
-                hhmm_now = now_local.strftime("%H:%M")
-                if hhmm_now != t:
-                    continue
-
-                guard_key = (user_id, now_local.strftime("%Y-%m-%d %H:%M"))
-                if sent_guard.get(guard_key):
-                    continue
-
-                cursor.execute(
-                    "SELECT name, last_worn, last_washed FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE",
-                    (user_id,),
-                )
-                rows = cursor.fetchall()
-                need_lines = []
-                for row in rows:
-                    name = row["name"]
-                    last_worn = row["last_worn"]
-                    last_washed = row["last_washed"]
-
-                    # 1) носил, но не стирал 7 дней
-                    if last_worn and (not last_washed or last_washed < last_worn):
-                        try:
-                            dt_worn = datetime.fromisoformat(last_worn)
-                        except Exception:
-                            dt_worn = None
-                        if dt_worn and datetime.utcnow() >= (dt_worn + timedelta(days=REMIND_WORN_NOT_WASHED_DAYS)):
-                            need_lines.append(f"• «{name}»: давно носил — самое время постирать!")
-
-                    # 2) чистая вещь и давно не надевал (30 дней)
-                    base = last_washed or last_worn
-                    if base:
-                        try:
-                            dt_base = datetime.fromisoformat(base)
-                        except Exception:
-                            dt_base = None
-                        if dt_base and datetime.utcnow() >= (dt_base + timedelta(days=REMIND_CLEAN_NOT_WORN_DAYS)):
-                            need_lines.append(f"• «{name}»: давно не надевал — загляни в шкаф 😉")
-
-                if need_lines:
-                    text = "Напоминание 👇\n\n" + "\n".join(need_lines)
-                    with suppress(Exception):
-                        await bot.send_message(user_id, text)
-
-                sent_guard[guard_key] = True
+            now_ts = int(time.time())
+            if leader.is_leader and now_ts - pruned_at > 3600:
+                await state_store.prune_sends(now_ts - REMIND_LOG_KEEP_SECONDS)
+                pruned_at = now_ts
+            if drain_start is None:
+                drain_start = now_ts
+            due = await repo.due_users(now_ts, REMIND_BATCH, owned, REMINDER_PARTITIONS) if owned else []
+            # следующий срок — раз на каждую пару (notify_time, tz) в пачке
+            next_ts = next_fire_times((s["notify_time"], s["tz"]) for s in due)
+            # пачки одного разбора сравниваются с его началом: строки, дождавшиеся
+            # своей пачки за доставкой предыдущих, проспанными не считаются
+            claimed, skipped = await claim_due(
+                repo, state_store, due, next_ts, drain_start - REMIND_GRACE_SECONDS
+            )
+            if skipped:
+                REMINDERS_SKIPPED.inc(skipped)
+                log.info("Пропущено %s напоминаний, проспанных дольше %s с", skipped, REMIND_GRACE_SECONDS)
+            if claimed:
+                for user_id, text in (await build_reminders(claimed)).items():
+                    await delivery.send(user_id, text)
+                    REMINDERS_SENT.inc()
+            REMINDERS_DUE.inc(len(due))
+            REMINDERS_DUE_LAST.set(len(due))
+
+            if len(due) == REMIND_BATCH:
+                REMINDER_TICK_SECONDS.observe(time.perf_counter() - tick_start)
+                continue  # ещё есть просроченные — сразу следующая пачка
+            drain_start = None
 
         except Exception as e:
             log.exception("Ошибка в reminders_loop: %s", e)
+        REMINDER_TICK_SECONDS.observe(time.perf_counter() - tick_start)
 
-        await asyncio.sleep(60)
+        try:
+            next_at = await repo.next_due_at(owned, REMINDER_PARTITIONS) if owned else None
+        except Exception as e:
+            log.exception("Ошибка в reminders_loop: %s", e)
+            next_at = None
+        delay = REMIND_MAX_SLEEP if next_at is None else min(REMIND_MAX_SLEEP, next_at - time.time())
+        await _reminders_wakeup.sleep(delay)
 
 # =========================
 # Keep-alive веб-сервер для Render
 # =========================
+# состояние очередей и кэшей читается в момент запроса /metrics
+metrics.gauge("closet_delivery_queue_depth", "Сообщений в очереди отправки", fn=delivery.qsize)
+metrics.counter("closet_delivery_sent", "Отправлено сообщений", fn=lambda: delivery.stats.sent)
+metrics.counter("closet_delivery_retried", "Повторных попыток отправки", fn=lambda: delivery.stats.retried)
+metrics.counter("closet_delivery_dropped", "Сообщений, отброшенных после всех попыток", fn=lambda: delivery.stats.dropped)
+metrics.gauge("closet_db_pending_writes", "Записей в очереди group commit", fn=db.pending_writes)
+metrics.gauge("closet_fsm_cached_entries", "FSM-записей в кэше процесса", fn=fsm_storage.cached)
+metrics.gauge("closet_wardrobe_cached_entries", "Гардеробов в кэше процесса", fn=lambda: len(wardrobe_cache))
+metrics.counter("closet_wardrobe_cache_hits", "Гардеробов, взятых из кэша", fn=lambda: wardrobe_cache.stats.hits)
+metrics.counter("closet_wardrobe_cache_misses", "Гардеробов, прочитанных из БД мимо кэша", fn=lambda: wardrobe_cache.stats.misses)
+metrics.counter("closet_wardrobe_cache_evictions", "Гардеробов, вытесненных из кэша по LRU", fn=lambda: wardrobe_cache.stats.evictions)
+metrics.counter("closet_wardrobe_cache_invalidations", "Сбросов кэша гардероба после изменений", fn=lambda: wardrobe_cache.stats.invalidations)
+metrics.gauge("closet_leader", "1, если процесс — лидер", fn=lambda: int(leader.is_leader))
+metrics.gauge("closet_reminder_partitions_owned", "Частей напоминаний у процесса", fn=lambda: len(partition_leases.owned))
+
+# Проверки здоровья: каждая укладывается в HEALTH_TIMEOUT_SECONDS, так что
+# эндпоинты можно опрашивать раз в несколько секунд
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT_SECONDS", "1"))
+# цикл напоминаний просыпается не реже раза в REMIND_MAX_SLEEP
+SCHEDULER_MAX_AGE = 3 * REMIND_MAX_SLEEP
+# getUpdates отвечает не позже чем через polling_timeout (10 с по умолчанию)
+POLL_MAX_AGE = 60
+_boot = time.monotonic()
+
+async def check_started():
+    return started.at is not None, {"uptime_s": round(time.monotonic() - _boot, 1)}
+
+async def check_db_read():
+    await db.fetchone("SELECT 1")
+    return True, {}
+
+async def check_db_writer():
+    # через поток-писатель: зависшая запись или долгий коммит видны здесь
+    await db.run(lambda conn: conn.execute("SELECT 1").fetchone())
+    return True, {"pending_writes": db.pending_writes()}
+
+async def check_scheduler():
+    ok, details = freshness(reminders_heartbeat, SCHEDULER_MAX_AGE, _boot + SCHEDULER_MAX_AGE)
+    return ok, {**details, "partitions_owned": len(partition_leases.owned), "leader": leader.is_leader}
+
+async def check_updates():
+    age = updates_heartbeat.age()
+    details = {"last_update_age_s": None if age is None else round(age, 3)}
+    if WEBHOOK_BASE_URL:
+        # в webhook-режиме апдейтов может не быть долго — это не ошибка
+        return True, {**details, "mode": "webhook"}
+    ok, poll = freshness(poll_heartbeat, POLL_MAX_AGE, _boot + POLL_MAX_AGE)
+    return ok, {**details, "mode": "polling", "last_poll_age_s": poll["age_s"], "max_age_s": POLL_MAX_AGE}
+
+# /readyz — healthCheckPath Render: провал перезапускает инстанс, поэтому здесь
+# нет проверки писателя — один медленный коммит (checkpoint, всплеск записей)
+# не повод перезапускать здоровый процесс; его видно в /healthz/deep
+READY_CHECKS = {"started": check_started, "db_read": check_db_read}
+DEEP_CHECKS = {**READY_CHECKS, "db_writer": check_db_writer, "scheduler": check_scheduler, "updates": check_updates}
+
 async def handle_root(request: web.Request) -> web.Response:
     return web.Response(text="OK")
 
-async def run_keepalive():
+async def handle_readyz(request: web.Request) -> web.Response:
+    ok, body = await run_checks(READY_CHECKS, HEALTH_TIMEOUT)
+    return web.json_response(body, status=200 if ok else 503)
+
+async def handle_deep_health(request: web.Request) -> web.Response:
+    ok, body = await run_checks(DEEP_CHECKS, HEALTH_TIMEOUT)
+    return web.json_response(body, status=200 if ok else 503)
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=metrics.REGISTRY.render().encode(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+def build_web_app() -> web.Application:
     app = web.Application()
     app.router.add_get("/", handle_root)
     app.router.add_get("/healthz", handle_root)
+    app.router.add_get("/readyz", handle_readyz)
+    app.router.add_get("/healthz/deep", handle_deep_health)
+    app.router.add_get("/metrics", handle_metrics)
+    if WEBHOOK_BASE_URL:
+        # апдейты обрабатываются в фоне, Telegram сразу получает 200
+        SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+        setup_application(app, dp, bot=bot)
+    return app
 
+async def run_keepalive(app: web.Application):
     runner = web.AppRunner(app)
     await runner.setup()
 
@@ -459,23 +978,80 @@ async def run_keepalive():
         with suppress(Exception):
             await runner.cleanup()
 
+async def on_webhook_startup(bot: Bot):
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    log.info("Webhook set to %s%s", WEBHOOK_BASE_URL, WEBHOOK_PATH)
+
+async def run_webhook(app: web.Application):
+    # Вебхук при остановке не снимаем: при rolling deploy его уже заберёт новый экземпляр
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    server_task = asyncio.create_task(run_keepalive(app))
+    try:
+        await stop.wait()
+    finally:
+        server_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await server_task
+
 # =========================
 # Главный запуск
 # =========================
 async def main():
+    await db.connect()
+    await repo.init_schema()
+    await state_store.connect()
+    await state_store.init_schema()
+    if STATE_DSN:
+        await state_store.bind_data(await repo.data_id())
+    await leader.start()
     dp.include_router(router)
     await set_commands()
+    await delivery.start()
+    await fsm_storage.start()
+    await rollups.start()
+    for exporter in trace_exporters:
+        await exporter.start()
 
-    keepalive_task = asyncio.create_task(run_keepalive())
+    app = build_web_app()
     reminders_task = asyncio.create_task(reminders_loop())
+    keepalive_task = None
+    started.beat()
 
     try:
-        await dp.start_polling(bot)
+        if WEBHOOK_BASE_URL:
+            dp.startup.register(on_webhook_startup)
+            await run_webhook(app)
+        else:
+            keepalive_task = asyncio.create_task(run_keepalive(app))
+            bot.session.middleware(PollHeartbeatMiddleware(poll_heartbeat))
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
         for t in (keepalive_task, reminders_task):
+            if t is None:
+                continue
             t.cancel()
             with suppress(asyncio.CancelledError):
                 await t
+        await delivery.stop()
+        for exporter in trace_exporters:
+            await exporter.close()
+        await fsm_storage.close()
+        await rollups.close()
+        await partition_leases.close()
+        await leader.close()
+        await state_store.close()
+        await db.close()
+        await bot.session.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
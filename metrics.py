@@ -0,0 +1,212 @@
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Небольшая собственная реализация без prometheus_client: счётчики, gauge
+и гистограммы; значение счётчика или gauge можно не хранить, а читать из
+функции в момент запроса. Метрики обновляются только из потока event
+loop, поэтому блокировки не нужны, а наблюдение стоит пару сложений.
+
+    DB_SECONDS = metrics.histogram("closet_db_seconds", "...", ["op"])
+    DB_SECONDS.labels("read").observe(0.002)
+"""
+import bisect
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+import tracing
+
+# от 1 мс до 10 с: хэндлеры и запросы к БД укладываются в этот диапазон
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _Scalar(_Metric):
+    """Значение меняется inc()/set() либо читается из fn() при каждом запросе /metrics."""
+
+    suffix = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, doc, labelnames)
+        self.fn = fn
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+    def _samples(self) -> List[str]:
+        name = self.name + self.suffix
+        if self.fn is not None:
+            return [f"{name} {_number(self.fn())}"]
+        return [f"{name}{_labels(self.labelnames, key)} {_number(child.value)}" for key, child in self._children.items()]
+
+
+class Counter(_Scalar):
+    kind = "counter"
+    suffix = "_total"
+
+
+class Gauge(_Scalar):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def _samples(self) -> List[str]:
+        out = []
+        for key, child in self._children.items():
+            total = 0
+            for bound, n in zip(self.buckets + (math.inf,), child.counts):
+                total += n
+                le = 'le="' + _number(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {total}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(child.sum)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {total}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, doc: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], float]] = None) -> Counter:
+    return REGISTRY.register(Counter(name, doc, labelnames, fn))
+
+
+def gauge(name: str, doc: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], float]] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, doc, labelnames, fn))
+
+
+def histogram(name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, doc, labelnames, buckets))
+
+
+HANDLER_SECONDS = histogram("closet_handler_seconds", "Время обработки апдейта хэндлером", ["handler"])
+HANDLER_ERRORS = counter("closet_handler_errors", "Исключения в хэндлерах", ["handler"])
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware роутера: время и ошибки по имени сработавшего хэндлера (оно же — в span апдейта)."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        tracing.set_handler(name)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - start)
@@ -0,0 +1,300 @@
+"""
+Версионированные миграции схемы SQLite.
+
+Текущая версия хранится в PRAGMA user_version. Каждая миграция применяется
+в своей транзакции вместе с повышением версии, так что упавший запуск
+не оставляет схему «наполовину». Новые изменения схемы — только новым
+элементом в MIGRATIONS, существующие не редактируем.
+"""
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+log = logging.getLogger("closet-bot.migrations")
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _m001_initial(conn: sqlite3.Connection) -> None:
+    # IF NOT EXISTS: базы, созданные до появления миграций, уже содержат эти таблицы
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS clothes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT,
+            category TEXT,
+            last_worn TEXT,
+            last_washed TEXT,
+            worn_count INTEGER
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id INTEGER PRIMARY KEY,
+            notify_on INTEGER DEFAULT 0,           -- 0/1
+            notify_time TEXT DEFAULT '09:00',      -- HH:MM
+            tz TEXT DEFAULT 'Europe/Moscow'        -- IANA TZ
+        )
+        """
+    )
+
+
+def _m002_next_fire(conn: sqlite3.Connection) -> None:
+    if "next_fire_utc" not in _columns(conn, "user_settings"):
+        conn.execute("ALTER TABLE user_settings ADD COLUMN next_fire_utc INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_settings_next_fire "
+        "ON user_settings (next_fire_utc) WHERE notify_on = 1"
+    )
+
+
+def _m003_clothes_indexes(conn: sqlite3.Connection) -> None:
+    # списки /wear, /wash, /status и напоминаний: поиск по user_id, сортировка
+    # по name COLLATE NOCASE, остальные колонки берутся из самого индекса
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_clothes_user_name_nocase
+        ON clothes (user_id, name COLLATE NOCASE, last_worn, last_washed, worn_count)
+        """
+    )
+    # точный поиск по кнопке: WHERE user_id = ? AND name = ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clothes_user_name ON clothes (user_id, name)")
+    conn.execute("ANALYZE")
+
+
+def _m004_last_reminded(conn: sqlite3.Connection) -> None:
+    # момент (epoch, UTC) последнего отправленного напоминания — защита от повторов
+    conn.execute("ALTER TABLE user_settings ADD COLUMN last_reminded_utc INTEGER")
+
+
+def _m005_status_keyset_index(conn: sqlite3.Connection) -> None:
+    # id сразу после name: keyset-пагинация /status по (name COLLATE NOCASE, id)
+    # идёт поиском по индексу без сортировки
+    conn.execute("DROP INDEX IF EXISTS idx_clothes_user_name_nocase")
+    conn.execute(
+        """
+        CREATE INDEX idx_clothes_user_name_nocase
+        ON clothes (user_id, name COLLATE NOCASE, id, last_worn, last_washed, worn_count)
+        """
+    )
+
+
+def _m006_fsm_state(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE fsm_state (
+            key TEXT PRIMARY KEY,          -- bot:chat:user:thread:destiny
+            state TEXT,
+            data TEXT,                     -- компактный JSON или NULL
+            expires_at INTEGER NOT NULL    -- epoch, UTC
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX idx_fsm_state_expires ON fsm_state (expires_at)")
+
+
+def _iso_to_epoch(value: Optional[str]) -> Optional[int]:
+    # старые значения писались через datetime.now() — наивное локальное время
+    # сервера; timestamp() трактует наивную дату именно так
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def _m007_epoch_timestamps(conn: sqlite3.Connection) -> None:
+    # last_worn/last_washed: ISO-строки -> INTEGER epoch UTC. Тип колонки
+    # в SQLite не поменять, поэтому таблица пересоздаётся с теми же id
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'clothes'").fetchone()
+    conn.execute(
+        """
+        CREATE TABLE clothes_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT,
+            category TEXT,
+            last_worn INTEGER,         -- epoch, UTC
+            last_washed INTEGER,       -- epoch, UTC
+            worn_count INTEGER
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO clothes_new (id, user_id, name, category, last_worn, last_washed, worn_count) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (row[0], row[1], row[2], row[3], _iso_to_epoch(row[4]), _iso_to_epoch(row[5]), row[6])
+            for row in conn.execute(
+                "SELECT id, user_id, name, category, last_worn, last_washed, worn_count FROM clothes"
+            )
+        ),
+    )
+    conn.execute("DROP TABLE clothes")
+    conn.execute("ALTER TABLE clothes_new RENAME TO clothes")
+    if seq is not None:
+        # не выдавать заново id удалённых вещей: у них могут остаться кнопки в чатах
+        cur = conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'clothes'", (seq[0],))
+        if cur.rowcount == 0:  # все вещи были удалены — новая таблица счётчика ещё не завела
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('clothes', ?)", (seq[0],))
+    conn.execute(
+        """
+        CREATE INDEX idx_clothes_user_name_nocase
+        ON clothes (user_id, name COLLATE NOCASE, id, last_worn, last_washed, worn_count)
+        """
+    )
+    conn.execute("CREATE INDEX idx_clothes_user_name ON clothes (user_id, name)")
+    # диапазоны вида user_id = ? AND last_worn < ? — поиском по индексу
+    conn.execute("CREATE INDEX idx_clothes_user_last_worn ON clothes (user_id, last_worn)")
+    conn.execute("CREATE INDEX idx_clothes_user_last_washed ON clothes (user_id, last_washed)")
+    conn.execute("ANALYZE clothes")
+
+
+def _m008_events(conn: sqlite3.Connection) -> None:
+    # журнал носки/стирки только дописывается; история не теряется при сбросе worn_count
+    conn.execute(
+        """
+        CREATE TABLE events (
+            id INTEGER PRIMARY KEY,
+            item_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('wear', 'wash')),
+            ts INTEGER NOT NULL            -- epoch, UTC
+        )
+        """
+    )
+    conn.execute("CREATE INDEX idx_events_item_ts ON events (item_id, ts)")
+    conn.execute("CREATE INDEX idx_events_user_ts ON events (user_id, ts)")
+    # агрегаты ведутся в той же транзакции, что и событие; worn_count — носки
+    # с последней стирки. Истории до этой миграции нет, поэтому всего носок —
+    # не меньше текущего worn_count, а известная стирка — последняя
+    conn.execute("ALTER TABLE clothes ADD COLUMN wear_total INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE clothes ADD COLUMN wash_total INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE clothes ADD COLUMN first_washed INTEGER")
+    conn.execute(
+        """
+        UPDATE clothes SET wear_total = COALESCE(worn_count, 0),
+                           wash_total = last_washed IS NOT NULL,
+                           first_washed = last_washed
+        """
+    )
+
+
+def _m009_stats_rollups(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE clothes ADD COLUMN price REAL")  # для стоимости одной носки, необязательно
+    # дневные суммы по вещам, пересчитываемые из events фоновой задачей;
+    # /stats читает окно в N дней — объём не зависит от длины истории
+    conn.execute(
+        """
+        CREATE TABLE item_daily (
+            user_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,          -- номер дня UTC: ts / 86400
+            item_id INTEGER NOT NULL,
+            wears INTEGER NOT NULL DEFAULT 0,
+            washes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, item_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # до какого events.id данные уже учтены в сводках
+    conn.execute(
+        """
+        CREATE TABLE rollup_state (
+            name TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _m010_shared_state(conn: sqlite3.Connection) -> None:
+    # общее состояние реплик (state_store.py): журнал отправленных напоминаний
+    # вместо last_reminded_utc и аренды частей работы между процессами
+    conn.execute(
+        """
+        CREATE TABLE reminder_log (
+            user_id INTEGER NOT NULL,
+            fire_ts INTEGER NOT NULL,      -- epoch, UTC: срабатывание, за которое отправлено
+            PRIMARY KEY (user_id, fire_ts)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX idx_reminder_log_fire ON reminder_log (fire_ts)")
+    conn.execute(
+        """
+        CREATE TABLE leases (
+            name TEXT PRIMARY KEY,         -- reminders:<partition>, worker:<owner>, ...
+            owner TEXT NOT NULL,
+            expires_at INTEGER NOT NULL    -- epoch, UTC
+        ) WITHOUT ROWID
+        """
+    )
+    # уже отправленные напоминания — чтобы обновление не отправило их повторно
+    conn.execute(
+        "INSERT INTO reminder_log (user_id, fire_ts) "
+        "SELECT user_id, last_reminded_utc FROM user_settings WHERE last_reminded_utc IS NOT NULL"
+    )
+
+
+def _m011_data_id(conn: sqlite3.Connection) -> None:
+    # случайный идентификатор базы: по нему PostgresStateStore проверяет,
+    # что все реплики с общим STATE_DSN работают с одной и той же closet.db
+    conn.execute(
+        """
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("INSERT INTO meta (key, value) VALUES ('data_id', lower(hex(randomblob(16))))")
+
+
+MIGRATIONS: List[Tuple[str, Callable[[sqlite3.Connection], None]]] = [
+    ("initial", _m001_initial),
+    ("next_fire_utc", _m002_next_fire),
+    ("clothes_indexes", _m003_clothes_indexes),
+    ("last_reminded_utc", _m004_last_reminded),
+    ("status_keyset_index", _m005_status_keyset_index),
+    ("fsm_state", _m006_fsm_state),
+    ("epoch_timestamps", _m007_epoch_timestamps),
+    ("events", _m008_events),
+    ("stats_rollups", _m009_stats_rollups),
+    ("shared_state", _m010_shared_state),
+    ("data_id", _m011_data_id),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, target: int = len(MIGRATIONS)) -> int:
+    """Применяет недостающие миграции до версии target. Возвращает итоговую версию."""
+    version = schema_version(conn)
+    for number in range(version + 1, target + 1):
+        name, step = MIGRATIONS[number - 1]
+        # IMMEDIATE и повторная проверка версии: реплики, стартующие вместе,
+        # применяют каждую миграцию ровно один раз
+        conn.execute("BEGIN IMMEDIATE")
+        if schema_version(conn) >= number:
+            conn.commit()
+            version = number
+            continue
+        log.info("Applying migration %03d_%s", number, name)
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        version = number
+    return version
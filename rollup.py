@@ -0,0 +1,100 @@
+"""
+Дневные сводки для /stats поверх журнала events.
+
+Фоновая задача раз в несколько минут дочитывает новые события и добавляет
+их в item_daily (носки и стирки вещи за день UTC). Позиция в журнале
+(rollup_state.last_event_id) меняется в той же транзакции, что и сами
+суммы, поэтому после падения задача продолжает с того же места и ничего
+не учитывает дважды. За один проход обрабатывается не больше batch событий,
+чтобы не держать писателя базы надолго.
+
+При нескольких репликах проход выполняет только одна (should_run —
+признак лидерства); одновременные проходы всё равно не задвоили бы
+суммы, а лишь лишний раз заняли бы запись.
+"""
+import asyncio
+import logging
+import sqlite3
+from contextlib import suppress
+from typing import Callable, Optional
+
+from storage import Database
+
+log = logging.getLogger("closet-bot.rollup")
+
+ROLLUP_NAME = "item_daily"
+
+
+def _apply_batch(conn: sqlite3.Connection, batch: int) -> int:
+    row = conn.execute("SELECT last_event_id FROM rollup_state WHERE name = ?", (ROLLUP_NAME,)).fetchone()
+    last_id = row["last_event_id"] if row else 0
+    count, upto = conn.execute(
+        "SELECT COUNT(*), MAX(id) FROM (SELECT id FROM events WHERE id > ? ORDER BY id LIMIT ?)",
+        (last_id, batch),
+    ).fetchone()
+    if not count:
+        return 0
+    conn.execute(
+        """
+        INSERT INTO item_daily (user_id, day, item_id, wears, washes)
+        SELECT user_id, ts / 86400, item_id, SUM(kind = 'wear'), SUM(kind = 'wash')
+        FROM events WHERE id > ? AND id <= ?
+        GROUP BY user_id, ts / 86400, item_id
+        ON CONFLICT (user_id, day, item_id) DO UPDATE
+        SET wears = wears + excluded.wears, washes = washes + excluded.washes
+        """,
+        (last_id, upto),
+    )
+    conn.execute(
+        """
+        INSERT INTO rollup_state (name, last_event_id) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET last_event_id = excluded.last_event_id
+        """,
+        (ROLLUP_NAME, upto),
+    )
+    return count
+
+
+class RollupJob:
+    def __init__(
+        self,
+        db: Database,
+        interval: int = 300,
+        batch: int = 20_000,
+        should_run: Optional[Callable[[], bool]] = None,
+    ):
+        self.db = db
+        self.interval = interval
+        self.batch = batch
+        self.should_run = should_run
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def run_once(self) -> int:
+        """Догнать журнал. Возвращает число учтённых событий."""
+        total = 0
+        while True:
+            applied = await self.db.transaction(lambda conn: _apply_batch(conn, self.batch))
+            total += applied
+            if applied < self.batch:
+                return total
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                applied = await self.run_once() if self.should_run is None or self.should_run() else 0
+                if applied:
+                    log.info("Rolled up %s events", applied)
+            except Exception as e:
+                log.exception("Ошибка пересчёта сводок: %s", e)
+            await asyncio.sleep(self.interval)
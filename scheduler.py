@@ -0,0 +1,114 @@
+"""
+Расчёт моментов срабатывания напоминаний.
+
+Для каждого пользователя хранится next_fire_utc — ближайший момент (epoch, UTC),
+когда наступит его notify_time в его часовом поясе. Цикл напоминаний выбирает
+только тех, у кого этот момент уже наступил, и спит до следующего.
+
+Часовых поясов у пользователей немного, поэтому ZoneInfo по имени
+кэшируется (вместе с результатом проверки имени), а пачка напоминаний
+считается по группам: местная дата — раз на пояс, момент срабатывания —
+раз на пару (notify_time, tz).
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TZ = "Europe/Moscow"
+
+
+@lru_cache(maxsize=1024)
+def lookup_tz(tz_name: str) -> Optional[ZoneInfo]:
+    """ZoneInfo по имени IANA или None, если такого пояса нет."""
+    try:
+        return ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError, OSError):
+        return None
+
+
+def resolve_tz(tz_name: str) -> ZoneInfo:
+    return lookup_tz(tz_name) or lookup_tz(DEFAULT_TZ)
+
+
+def _fire_after(notify_time: str, tz: ZoneInfo, local_day: date, after_ts: float) -> int:
+    hh, mm = (int(x) for x in notify_time.split(":"))
+    for shift in range(3):
+        day = local_day + timedelta(days=shift)
+        candidate = datetime(day.year, day.month, day.day, hh, mm, tzinfo=tz, fold=0)
+        ts = int(candidate.timestamp())
+        if ts > after_ts:
+            return ts
+    raise AssertionError("unreachable: notify_time must occur within 3 days")
+
+
+def next_fire_utc(notify_time: str, tz_name: str, after: Optional[datetime] = None) -> int:
+    """Ближайший момент строго после `after`, когда в tz наступит notify_time (HH:MM).
+
+    Переходы на летнее/зимнее время: несуществующее локальное время (весенний
+    перевод) срабатывает со сдвигом на величину перевода, неоднозначное
+    (осенний) — в первое из двух вхождений.
+    """
+    tz = resolve_tz(tz_name)
+    if after is None:
+        after = datetime.now(timezone.utc)
+    return _fire_after(notify_time, tz, after.astimezone(tz).date(), after.timestamp())
+
+
+def next_fire_times(settings: Iterable[Tuple[str, str]], after: Optional[datetime] = None) -> List[int]:
+    """next_fire_utc для пар (notify_time, tz_name) с общим `after`, в том же порядке."""
+    if after is None:
+        after = datetime.now(timezone.utc)
+    after_ts = after.timestamp()
+    days: Dict[str, Tuple[ZoneInfo, date]] = {}
+    fires: Dict[Tuple[str, str], int] = {}
+    out = []
+    for key in settings:
+        ts = fires.get(key)
+        if ts is None:
+            notify_time, tz_name = key
+            local = days.get(tz_name)
+            if local is None:
+                tz = resolve_tz(tz_name)
+                local = days[tz_name] = (tz, after.astimezone(tz).date())
+            ts = fires[key] = _fire_after(notify_time, local[0], local[1], after_ts)
+        out.append(ts)
+    return out
+
+
+async def claim_due(repo: Any, store: Any, due: Sequence[Any], next_ts: Sequence[int], fresh_since: int) -> Tuple[List[int], int]:
+    """Переносит сработавшие напоминания на next_ts и отмечает их отправку.
+
+    due — строки user_settings (user_id, next_fire_utc); срок раньше
+    fresh_since считается проспанным: он переносится, но не отправляется.
+    Отметка в store сохраняется до отправки: перезапуск внутри минуты
+    напоминания или вторая реплика не приведут к повтору, а падение между
+    отметкой и отправкой напоминание теряет. Возвращает (кому отправить,
+    сколько проспанных пропущено).
+    """
+    claims = [
+        (s["user_id"], s["next_fire_utc"], ts, s["next_fire_utc"] >= fresh_since)
+        for s, ts in zip(due, next_ts)
+    ]
+    fired = {s["user_id"]: s["next_fire_utc"] for s in due}
+    moved = await repo.advance_schedule(claims)
+    claimed = await store.claim_sends([(user_id, fired[user_id]) for user_id in moved])
+    return claimed, sum(1 for claim in claims if not claim[3])
+
+
+class Wakeup:
+    """Будильник цикла напоминаний: спим до срока, но просыпаемся при изменении настроек."""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        self._event.set()
+
+    async def sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
@@ -0,0 +1,280 @@
+"""
+Общее состояние нескольких процессов бота.
+
+То, о чём реплики должны договориться, живёт за интерфейсом StateStore:
+FSM-диалоги, журнал отправленных напоминаний (защита от повторов) и аренды
+(leases) — кто из процессов сейчас обслуживает какую часть работы.
+
+Реализации:
+    SQLiteStateStore   — в той же closet.db (несколько процессов на одной машине, WAL);
+    PostgresStateStore — в общей Postgres через asyncpg-совместимый пул
+                         (для локальной проверки — bench/fake_postgres.py).
+
+Поддерживаемая схема развёртывания одна: все реплики открывают один и тот же
+файл closet.db (одна машина или общий том). Пользователи и вещи живут только
+там, Postgres забирает лишь общее состояние и снимает его записи с писателя
+closet.db. Реплики с разными closet.db и общим STATE_DSN делили бы аренды
+частей, не видя пользователей друг друга, — PostgresStateStore.bind_data
+отклоняет такой запуск.
+
+SQL общий: подмножество, которое понимают и SQLite (>= 3.35), и PostgreSQL
+(ON CONFLICT ... DO UPDATE, RETURNING). Время — epoch-секунды с часов
+процесса, поэтому TTL аренд должен быть заметно больше расхождения часов.
+"""
+import abc
+import itertools
+import logging
+import re
+import sqlite3
+from typing import Any, List, Optional, Sequence, Tuple
+
+from storage import Database
+
+log = logging.getLogger("closet-bot.state")
+
+# пар (user_id, fire_ts) в одном INSERT: старые сборки SQLite ограничивают запрос 999 переменными
+CLAIM_CHUNK = 400
+
+# (state, data — компактный JSON или None, expires_at)
+FSMRecord = Tuple[Optional[str], Optional[str], int]
+
+# Версии схемы общего состояния в Postgres — как migrations.MIGRATIONS для
+# closet.db: текущая версия в state_schema, каждая миграция в своей
+# транзакции вместе с повышением версии. Новые изменения схемы — только новым
+# элементом списка, существующие не редактируем
+POSTGRES_MIGRATIONS: List[Tuple[str, List[str]]] = [
+    # IF NOT EXISTS: базы, созданные до появления версий, уже содержат эти таблицы
+    ("shared_state", [
+        """
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            expires_at BIGINT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_fsm_state_expires ON fsm_state (expires_at)",
+        """
+        CREATE TABLE IF NOT EXISTS reminder_log (
+            user_id BIGINT NOT NULL,
+            fire_ts BIGINT NOT NULL,
+            PRIMARY KEY (user_id, fire_ts)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reminder_log_fire ON reminder_log (fire_ts)",
+        """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at BIGINT NOT NULL
+        )
+        """,
+    ]),
+    # closet.db, с которой работают реплики этой базы (см. bind_data)
+    ("state_meta", [
+        """
+        CREATE TABLE state_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+    ]),
+]
+
+
+class StateStore(abc.ABC):
+    """Общее состояние реплик. Наследники дают три примитива над SQL с `?`."""
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def init_schema(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def _read(self, sql: str, params: Sequence[Any] = ()) -> List[Sequence[Any]]:
+        ...
+
+    @abc.abstractmethod
+    async def _write(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Возвращает число затронутых строк."""
+
+    @abc.abstractmethod
+    async def _write_returning(self, sql: str, params: Sequence[Any] = ()) -> List[Sequence[Any]]:
+        ...
+
+    # ----- FSM -----
+    async def fsm_load(self, key: str) -> Optional[FSMRecord]:
+        rows = await self._read("SELECT state, data, expires_at FROM fsm_state WHERE key = ?", (key,))
+        return tuple(rows[0]) if rows else None
+
+    async def fsm_save(self, key: str, state: Optional[str], data: Optional[str], expires_at: int) -> None:
+        await self._write(
+            """
+            INSERT INTO fsm_state (key, state, data, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data,
+                                            expires_at = excluded.expires_at
+            """,
+            (key, state, data, expires_at),
+        )
+
+    async def fsm_delete(self, key: str) -> None:
+        await self._write("DELETE FROM fsm_state WHERE key = ?", (key,))
+
+    async def fsm_purge(self, now: int) -> int:
+        return await self._write("DELETE FROM fsm_state WHERE expires_at <= ?", (now,))
+
+    # ----- защита от повторных напоминаний -----
+    async def claim_sends(self, sends: Sequence[Tuple[int, int]]) -> List[int]:
+        """sends: [(user_id, fire_ts), ...]. Возвращает тех, кому это напоминание ещё не отправлялось."""
+        claimed: List[int] = []
+        for i in range(0, len(sends), CLAIM_CHUNK):
+            chunk = sends[i:i + CLAIM_CHUNK]
+            values = ", ".join("(?, ?)" for _ in chunk)
+            rows = await self._write_returning(
+                f"INSERT INTO reminder_log (user_id, fire_ts) VALUES {values} ON CONFLICT DO NOTHING RETURNING user_id",
+                [v for pair in chunk for v in pair],
+            )
+            claimed += [row[0] for row in rows]
+        return claimed
+
+    async def prune_sends(self, before_ts: int) -> int:
+        return await self._write("DELETE FROM reminder_log WHERE fire_ts < ?", (before_ts,))
+
+    # ----- аренды -----
+    async def acquire_lease(self, name: str, owner: str, ttl: int, now: int) -> bool:
+        """Взять свободную или просроченную аренду либо продлить свою.
+
+        Аренда действует до expires_at, не включая его: в эту секунду её уже
+        можно забрать.
+        """
+        rows = await self._write_returning(
+            """
+            INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.owner = excluded.owner OR leases.expires_at <= ?
+            RETURNING owner
+            """,
+            (name, owner, now + ttl, now),
+        )
+        return bool(rows)
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        await self._write("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    async def live_leases(self, prefix: str, now: int) -> List[Tuple[str, str]]:
+        """(name, owner) действующих аренд с именем на prefix."""
+        rows = await self._read(
+            "SELECT name, owner FROM leases WHERE name LIKE ? AND expires_at > ? ORDER BY name",
+            (prefix + "%", now),
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    async def lease_expires_at(self, name: str) -> Optional[int]:
+        """Когда истекает аренда name (epoch) или None, если её никто не держит."""
+        rows = await self._read("SELECT expires_at FROM leases WHERE name = ?", (name,))
+        return rows[0][0] if rows else None
+
+
+class SQLiteStateStore(StateStore):
+    """Таблицы создаются миграциями closet.db; записи идут через group commit."""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def _read(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return await self.db.fetchall(sql, params)
+
+    async def _write(self, sql: str, params: Sequence[Any] = ()) -> int:
+        return await self.db.execute(sql, params)
+
+    async def _write_returning(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return await self.db.transaction(lambda conn: conn.execute(sql, params).fetchall())
+
+
+_PLACEHOLDER = re.compile(r"\?")
+
+
+def to_dollar_params(sql: str) -> str:
+    """`?` -> `$1, $2, ...` (стиль параметров asyncpg/PostgreSQL)."""
+    counter = itertools.count(1)
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", sql)
+
+
+class PostgresStateStore(StateStore):
+    """pool — asyncpg.Pool или совместимый объект (acquire(), fetch(), execute())."""
+
+    def __init__(self, dsn: Optional[str] = None, pool: Any = None, min_size: int = 1, max_size: int = 10):
+        self.dsn = dsn
+        self.pool = pool
+        self.min_size = min_size
+        self.max_size = max_size
+
+    async def connect(self) -> None:
+        if self.pool is not None:
+            return
+        try:
+            import asyncpg
+        except ImportError as e:
+            raise RuntimeError("Для STATE_DSN нужен пакет asyncpg (pip install asyncpg)") from e
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+
+    async def close(self) -> None:
+        if self.pool is not None and self.dsn is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def init_schema(self) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute("CREATE TABLE IF NOT EXISTS state_schema (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)")
+            await conn.execute("INSERT INTO state_schema (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING")
+            for number, (name, statements) in enumerate(POSTGRES_MIGRATIONS, 1):
+                async with conn.transaction():
+                    # блокировка строки версии и повторная проверка: реплики,
+                    # стартующие вместе, применяют каждую миграцию ровно один раз
+                    await conn.execute("UPDATE state_schema SET version = version WHERE id = 1")
+                    row = await conn.fetchrow("SELECT version FROM state_schema WHERE id = 1")
+                    if row[0] >= number:
+                        continue
+                    log.info("Applying state migration %03d_%s", number, name)
+                    for ddl in statements:
+                        await conn.execute(ddl)
+                    await conn.execute("UPDATE state_schema SET version = $1 WHERE id = 1", number)
+
+    async def bind_data(self, data_id: str) -> None:
+        """Привязывает общее состояние к closet.db с идентификатором data_id.
+
+        Аренды частей напоминаний общие для всех реплик, а пользователи — в
+        closet.db: реплика с другой базой взяла бы части и не нашла в своей
+        базе их пользователей. Такой запуск отклоняется.
+        """
+        rows = await self._write_returning(
+            """
+            INSERT INTO state_meta (key, value) VALUES ('data_id', ?)
+            ON CONFLICT (key) DO UPDATE SET value = state_meta.value
+            RETURNING value
+            """,
+            (data_id,),
+        )
+        if rows[0][0] != data_id:
+            raise RuntimeError(
+                f"STATE_DSN уже используется репликами с другой closet.db ({rows[0][0]}, у этой — {data_id}); "
+                "все реплики с общим STATE_DSN должны работать с одним файлом DB_PATH"
+            )
+
+    async def _read(self, sql: str, params: Sequence[Any] = ()) -> List[Sequence[Any]]:
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(to_dollar_params(sql), *params)
+
+    async def _write(self, sql: str, params: Sequence[Any] = ()) -> int:
+        async with self.pool.acquire() as conn:
+            status = await conn.execute(to_dollar_params(sql), *params)
+        # asyncpg возвращает статус команды: "DELETE 3", "INSERT 0 1", ...
+        return int(status.rsplit(" ", 1)[-1]) if status and status[-1].isdigit() else 0
+
+    async def _write_returning(self, sql: str, params: Sequence[Any] = ()) -> List[Sequence[Any]]:
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(to_dollar_params(sql), *params)
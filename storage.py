@@ -0,0 +1,626 @@
+"""
+Асинхронный слой доступа к SQLite.
+
+Все обращения к БД выполняются в отдельном потоке-исполнителе, поэтому
+event loop (поллинг, хэндлеры, напоминания) не блокируется на диске.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import suppress
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+import metrics
+import migrations
+import tracing
+
+T = TypeVar("T")
+
+# параметров в одном IN (...): старые сборки SQLite ограничивают запрос 999 переменными
+REMINDER_CHUNK = 500
+
+log = logging.getLogger("closet-bot.storage")
+
+# read/write — от вызова до результата (для записи — с ожиданием пачки), commit — сама пачка
+DB_SECONDS = metrics.histogram("closet_db_seconds", "Время обращений к SQLite", ["op"])
+DB_BATCH_OPS = metrics.histogram(
+    "closet_db_batch_ops", "Записей в одной пачке group commit", buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+_DB_READ = DB_SECONDS.labels("read")
+_DB_WRITE = DB_SECONDS.labels("write")
+_DB_COMMIT = DB_SECONDS.labels("commit")
+
+# изменения вещи на каждое событие журнала; агрегаты обновляются вместе с ним
+_MARK_SET = {
+    "wear": "last_worn = :ts, worn_count = worn_count + 1, wear_total = wear_total + 1",
+    "wash": "last_washed = :ts, worn_count = 0, wash_total = wash_total + 1, first_washed = COALESCE(first_washed, :ts)",
+}
+
+
+def _partition_filter(partitions: Optional[Sequence[int]], of: int) -> Tuple[str, Tuple[int, ...]]:
+    if partitions is None or of <= 1:
+        return "", ()
+    return " AND user_id % {} IN ({})".format(int(of), ", ".join("?" * len(partitions)) or "NULL"), tuple(partitions)
+
+
+def _id_list(ids: Sequence[int]) -> Tuple[str, Dict[str, Any]]:
+    params = {f"id{i}": item_id for i, item_id in enumerate(ids)}
+    return "id IN ({})".format(", ".join(f":{k}" for k in params) or "NULL"), params
+
+
+# =========================
+# Настройки
+# =========================
+@dataclass
+class DBConfig:
+    # Group commit: запись ждёт коммита своей пачки. Пачка собирается из всего,
+    # что накопилось, пока шёл предыдущий коммит, плюс (если > 0) окно ожидания.
+    commit_interval_ms: int = 0
+    commit_max_ops: int = 256
+    # PRAGMA synchronous: FULL — коммит переживает отключение питания,
+    # NORMAL/OFF — быстрее, но последние коммиты можно потерять
+    synchronous: str = "FULL"
+    # WAL: читатели не ждут писателя и наоборот
+    journal_mode: str = "WAL"
+    cache_size_kib: int = 20_000
+    mmap_size: int = 256 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    busy_timeout_ms: int = 5000
+    # Отдельные соединения только для чтения (0 — читать через соединение писателя)
+    read_workers: int = 4
+    # Обслуживание: wal_checkpoint(TRUNCATE) и PRAGMA optimize (0 — отключено)
+    checkpoint_interval_s: int = 300
+    optimize_interval_s: int = 3600
+
+    @classmethod
+    def from_env(cls) -> "DBConfig":
+        return cls(
+            commit_interval_ms=int(os.getenv("DB_COMMIT_INTERVAL_MS", cls.commit_interval_ms)),
+            commit_max_ops=int(os.getenv("DB_COMMIT_MAX_OPS", cls.commit_max_ops)),
+            synchronous=os.getenv("DB_SYNCHRONOUS", cls.synchronous).upper(),
+            journal_mode=os.getenv("DB_JOURNAL_MODE", cls.journal_mode).upper(),
+            cache_size_kib=int(os.getenv("DB_CACHE_SIZE_KIB", cls.cache_size_kib)),
+            mmap_size=int(os.getenv("DB_MMAP_SIZE", cls.mmap_size)),
+            temp_store=os.getenv("DB_TEMP_STORE", cls.temp_store).upper(),
+            busy_timeout_ms=int(os.getenv("DB_BUSY_TIMEOUT_MS", cls.busy_timeout_ms)),
+            read_workers=int(os.getenv("DB_READ_WORKERS", cls.read_workers)),
+            checkpoint_interval_s=int(os.getenv("DB_CHECKPOINT_INTERVAL_S", cls.checkpoint_interval_s)),
+            optimize_interval_s=int(os.getenv("DB_OPTIMIZE_INTERVAL_S", cls.optimize_interval_s)),
+        )
+
+    def validate(self) -> None:
+        if self.synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Unsupported DB_SYNCHRONOUS: {self.synchronous}")
+        if self.journal_mode not in ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"):
+            raise ValueError(f"Unsupported DB_JOURNAL_MODE: {self.journal_mode}")
+        if self.temp_store not in ("DEFAULT", "FILE", "MEMORY"):
+            raise ValueError(f"Unsupported DB_TEMP_STORE: {self.temp_store}")
+
+
+# =========================
+# Низкоуровневая обёртка
+# =========================
+class Database:
+    """Соединение-писатель за единственным потоком и пул соединений-читателей.
+
+    Чтения выполняются сразу на пуле читателей. Записи ставятся в очередь; фоновый flusher
+    применяет их пачками в одной транзакции (каждая — в своём SAVEPOINT,
+    чтобы ошибка одной не откатывала остальные) и будит ожидающих после коммита.
+    """
+
+    def __init__(self, path: str, config: Optional[DBConfig] = None):
+        self.path = path
+        self.config = config or DBConfig()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._maintenance: Optional[asyncio.Task] = None
+        # читатели: по соединению на поток пула
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._reader_local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        start = time.perf_counter()
+        try:
+            if self._read_executor is None:
+                return await self._run(tracing.bind(fn), self._conn)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._read_executor, tracing.bind(lambda: fn(self._reader())))
+        finally:
+            elapsed = time.perf_counter() - start
+            _DB_READ.observe(elapsed)
+            tracing.record_db(elapsed)
+
+    # ----- жизненный цикл соединений -----
+    def _connect(self) -> sqlite3.Connection:
+        cfg = self.config
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=cfg.busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {cfg.busy_timeout_ms}")
+        conn.execute(f"PRAGMA cache_size = {-cfg.cache_size_kib}")
+        conn.execute(f"PRAGMA mmap_size = {cfg.mmap_size}")
+        conn.execute(f"PRAGMA temp_store = {cfg.temp_store}")
+        # запросы апдейта собираются в его span (tracing.py); вне апдейта — ничего не делает
+        conn.set_trace_callback(tracing.trace_sql)
+        return conn
+
+    def _open(self) -> None:
+        conn = self._connect()
+        mode = conn.execute(f"PRAGMA journal_mode = {self.config.journal_mode}").fetchone()[0]
+        if mode.upper() != self.config.journal_mode:
+            log.warning("journal_mode %s requested, SQLite uses %s", self.config.journal_mode, mode)
+        conn.execute(f"PRAGMA synchronous = {self.config.synchronous}")
+        self._conn = conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._reader_local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = 1")
+            self._reader_local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    async def connect(self) -> None:
+        self.config.validate()
+        await self._run(self._open)
+        # у каждой :memory:-базы своё содержимое — читаем через писателя
+        if self.config.read_workers > 0 and self.path != ":memory:":
+            self._read_executor = ThreadPoolExecutor(
+                max_workers=self.config.read_workers, thread_name_prefix="sqlite-read"
+            )
+        self._writes = asyncio.Queue()
+        self._flusher = asyncio.create_task(self._flush_loop())
+        if self.config.checkpoint_interval_s > 0 or self.config.optimize_interval_s > 0:
+            self._maintenance = asyncio.create_task(self._maintenance_loop())
+
+    async def close(self) -> None:
+        """Дожидается всех записей, делает checkpoint/optimize и закрывает соединения."""
+        for attr in ("_maintenance", "_flusher"):
+            task = getattr(self, attr)
+            if task is None:
+                continue
+            if attr == "_flusher":
+                await self._writes.join()
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+            setattr(self, attr, None)
+
+        if self._read_executor is not None:
+            self._read_executor.shutdown(wait=True)
+            self._read_executor = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+
+        def _close() -> None:
+            if self._conn is not None:
+                with suppress(sqlite3.Error):
+                    self._conn.execute("PRAGMA optimize")
+                    self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.close()
+                self._conn = None
+
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+    # ----- обслуживание -----
+    async def checkpoint(self) -> Tuple[int, int, int]:
+        """PRAGMA wal_checkpoint(TRUNCATE): (busy, страниц в WAL, перенесено)."""
+        row = await self._run(lambda: self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+        return tuple(row)
+
+    async def optimize(self) -> None:
+        await self._run(lambda: self._conn.execute("PRAGMA optimize"))
+
+    async def _maintenance_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        cfg = self.config
+        next_checkpoint = loop.time() + cfg.checkpoint_interval_s if cfg.checkpoint_interval_s > 0 else None
+        next_optimize = loop.time() + cfg.optimize_interval_s if cfg.optimize_interval_s > 0 else None
+        while True:
+            due = min(t for t in (next_checkpoint, next_optimize) if t is not None)
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            now = loop.time()
+            try:
+                if next_checkpoint is not None and now >= next_checkpoint:
+                    if cfg.journal_mode == "WAL":
+                        busy, wal_pages, moved = await self.checkpoint()
+                        log.debug("wal_checkpoint: busy=%s wal=%s moved=%s", busy, wal_pages, moved)
+                    next_checkpoint = now + cfg.checkpoint_interval_s
+                if next_optimize is not None and now >= next_optimize:
+                    await self.optimize()
+                    next_optimize = now + cfg.optimize_interval_s
+            except Exception as e:
+                log.exception("Ошибка обслуживания БД: %s", e)
+
+    # ----- group commit -----
+    async def _flush_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = self.config.commit_interval_ms / 1000
+        max_ops = max(1, self.config.commit_max_ops)
+        while True:
+            batch = [await self._writes.get()]
+            deadline = loop.time() + interval
+            while len(batch) < max_ops:
+                if not self._writes.empty():
+                    batch.append(self._writes.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._writes.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            start = time.perf_counter()
+            try:
+                outcomes = await self._run(self._apply_batch, [fn for fn, _ in batch])
+            except Exception as e:  # коммит не прошёл — падает вся пачка
+                outcomes = [(False, e)] * len(batch)
+            _DB_COMMIT.observe(time.perf_counter() - start)
+            DB_BATCH_OPS.observe(len(batch))
+            for (_, fut), (ok, value) in zip(batch, outcomes):
+                if not fut.done():
+                    if ok:
+                        fut.set_result(value)
+                    else:
+                        fut.set_exception(value)
+                self._writes.task_done()
+
+    def _apply_batch(self, fns: List[Callable[[sqlite3.Connection], Any]]) -> List[Tuple[bool, Any]]:
+        conn = self._conn
+        outcomes: List[Tuple[bool, Any]] = []
+        # IMMEDIATE: блокировка на запись сразу, иначе при нескольких процессах
+        # на одной closet.db повышение блокировки посреди пачки упадёт с SQLITE_BUSY
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for fn in fns:
+                conn.execute("SAVEPOINT op")
+                try:
+                    outcomes.append((True, fn(conn)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    outcomes.append((False, e))
+                conn.execute("RELEASE op")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return outcomes
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        start = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        # fn выполнится в пачке в потоке-писателе — SQL попадёт в span того, кто её поставил
+        self._writes.put_nowait((tracing.bind(fn), fut))
+        try:
+            return await fut
+        finally:
+            elapsed = time.perf_counter() - start
+            _DB_WRITE.observe(elapsed)
+            tracing.record_db(elapsed)
+
+    def pending_writes(self) -> int:
+        """Записей в очереди group commit."""
+        return self._writes.qsize() if self._writes is not None else 0
+
+    # ----- API -----
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Выполняет fn(conn) в потоке БД; транзакциями fn управляет сама."""
+        return await self._run(fn, self._conn)
+
+    async def read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Выполняет fn(conn) на соединении-читателе (несколько запросов за один переход в поток)."""
+        return await self._read(fn)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
+        return await self._read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return await self._read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Запрос на запись; возвращает rowcount после коммита пачки."""
+        return await self._write(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def transaction(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Выполняет fn(conn) атомарно (в составе пачки group commit)."""
+        return await self._write(fn)
+
+
+# =========================
+# Репозиторий (запросы бота)
+# =========================
+class ClosetRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def init_schema(self) -> None:
+        version = await self.db.run(migrations.migrate)
+        log.info("Schema version %s", version)
+
+    async def data_id(self) -> str:
+        """Идентификатор этой closet.db (создаётся миграцией один раз)."""
+        row = await self.db.fetchone("SELECT value FROM meta WHERE key = 'data_id'")
+        return row[0]
+
+    # ----- настройки -----
+    async def get_or_create_user_settings(self, user_id: int) -> sqlite3.Row:
+        def _tx(conn: sqlite3.Connection) -> sqlite3.Row:
+            row = conn.execute("SELECT * FROM user_settings WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO user_settings (user_id, notify_on, notify_time, tz) VALUES (?, 0, '09:00', 'Europe/Moscow')",
+                    (user_id,),
+                )
+                row = conn.execute("SELECT * FROM user_settings WHERE user_id = ?", (user_id,)).fetchone()
+            return row
+
+        return await self.db.transaction(_tx)
+
+    async def user_tz(self, user_id: int) -> Optional[str]:
+        """tz пользователя без создания настроек; None — настроек ещё нет."""
+        row = await self.db.fetchone("SELECT tz FROM user_settings WHERE user_id = ?", (user_id,))
+        return row["tz"] if row else None
+
+    async def set_notify_on(self, user_id: int, on: int) -> None:
+        await self.db.execute("UPDATE user_settings SET notify_on = ? WHERE user_id = ?", (on, user_id))
+
+    async def set_notify_time(self, user_id: int, hhmm: str) -> None:
+        await self.db.execute("UPDATE user_settings SET notify_time = ? WHERE user_id = ?", (hhmm, user_id))
+
+    async def set_tz(self, user_id: int, tz: str) -> None:
+        await self.db.execute("UPDATE user_settings SET tz = ? WHERE user_id = ?", (tz, user_id))
+
+    # ----- расписание напоминаний -----
+    async def set_next_fire(self, user_id: int, ts: Optional[int]) -> None:
+        await self.db.execute("UPDATE user_settings SET next_fire_utc = ? WHERE user_id = ?", (ts, user_id))
+
+    async def set_next_fires(self, pairs: Sequence[Tuple[int, Optional[int]]]) -> None:
+        """pairs: [(user_id, next_fire_utc), ...] — одной транзакцией."""
+        await self.db.transaction(
+            lambda conn: conn.executemany(
+                "UPDATE user_settings SET next_fire_utc = ? WHERE user_id = ?",
+                [(ts, user_id) for user_id, ts in pairs],
+            )
+        )
+
+    async def advance_schedule(self, claims: Sequence[Tuple[int, int, int, bool]]) -> List[int]:
+        """claims: [(user_id, fire_ts, next_ts, send), ...].
+
+        Переносит next_fire_utc с fire_ts на next_ts, только если его ещё
+        никто не перенёс. Возвращает пользователей с send=True, для которых
+        перенос удался. От повторной отправки (перезапуск, вторая реплика)
+        окончательно защищает StateStore.claim_sends.
+        """
+        def _tx(conn: sqlite3.Connection) -> List[int]:
+            moved = []
+            for user_id, fire_ts, next_ts, send in claims:
+                cur = conn.execute(
+                    "UPDATE user_settings SET next_fire_utc = ? WHERE user_id = ? AND next_fire_utc = ?",
+                    (next_ts, user_id, fire_ts),
+                )
+                if send and cur.rowcount == 1:
+                    moved.append(user_id)
+            return moved
+
+        if not claims:
+            return []
+        return await self.db.transaction(_tx)
+
+    async def unscheduled_users(self) -> List[sqlite3.Row]:
+        return await self.db.fetchall(
+            "SELECT user_id, notify_time, tz FROM user_settings WHERE notify_on = 1 AND next_fire_utc IS NULL"
+        )
+
+    async def due_users(
+        self, now_ts: int, limit: int = 1000, partitions: Optional[Sequence[int]] = None, of: int = 1
+    ) -> List[sqlite3.Row]:
+        """partitions — только пользователи с user_id % of из этого набора (части этой реплики)."""
+        where, params = _partition_filter(partitions, of)
+        return await self.db.fetchall(
+            f"""
+            SELECT user_id, notify_time, tz, next_fire_utc FROM user_settings
+            WHERE notify_on = 1 AND next_fire_utc <= ?{where}
+            ORDER BY next_fire_utc
+            LIMIT ?
+            """,
+            (now_ts, *params, limit),
+        )
+
+    async def next_due_at(self, partitions: Optional[Sequence[int]] = None, of: int = 1) -> Optional[int]:
+        where, params = _partition_filter(partitions, of)
+        row = await self.db.fetchone(
+            "SELECT MIN(next_fire_utc) AS ts FROM user_settings "
+            f"WHERE notify_on = 1 AND next_fire_utc IS NOT NULL{where}",
+            params,
+        )
+        return row["ts"] if row else None
+
+    # ----- вещи -----
+    async def add_item(self, user_id: int, name: str, category: str) -> None:
+        await self.db.execute(
+            """
+            INSERT INTO clothes (user_id, name, category, last_worn, last_washed, worn_count)
+            VALUES (?, ?, ?, NULL, NULL, 0)
+            """,
+            (user_id, name, category),
+        )
+
+    async def list_items(self, user_id: int) -> List[sqlite3.Row]:
+        return await self.db.fetchall(
+            "SELECT id, name FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE, id", (user_id,)
+        )
+
+    async def status_page(
+        self,
+        user_id: int,
+        limit: int,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+    ) -> List[sqlite3.Row]:
+        """Страница /status в порядке (name COLLATE NOCASE, id), keyset-пагинация.
+
+        after_id/before_id — id крайней вещи соседней страницы. Для before_id
+        строки всё равно возвращаются в прямом порядке.
+        """
+        cols = "id, name, last_worn, last_washed, worn_count, wear_total, wash_total, first_washed"
+
+        def _query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            cursor_id = after_id if after_id is not None else before_id
+            if cursor_id is None:
+                return conn.execute(
+                    f"SELECT {cols} FROM clothes WHERE user_id = ? ORDER BY name COLLATE NOCASE, id LIMIT ?",
+                    (user_id, limit),
+                ).fetchall()
+            anchor = conn.execute(
+                "SELECT name FROM clothes WHERE id = ? AND user_id = ?", (cursor_id, user_id)
+            ).fetchone()
+            if anchor is None:
+                return []
+            if after_id is not None:
+                return conn.execute(
+                    f"""
+                    SELECT {cols} FROM clothes
+                    WHERE user_id = ? AND (name, id) > (? COLLATE NOCASE, ?)
+                    ORDER BY name COLLATE NOCASE, id
+                    LIMIT ?
+                    """,
+                    (user_id, anchor["name"], cursor_id, limit),
+                ).fetchall()
+            rows = conn.execute(
+                f"""
+                SELECT {cols} FROM clothes
+                WHERE user_id = ? AND (name, id) < (? COLLATE NOCASE, ?)
+                ORDER BY name COLLATE NOCASE DESC, id DESC
+                LIMIT ?
+                """,
+                (user_id, anchor["name"], cursor_id, limit),
+            ).fetchall()
+            rows.reverse()
+            return rows
+
+        return await self.db.read(_query)
+
+    async def _mark_one(self, kind: str, user_id: int, item_id: int, when_ts: int) -> Optional[str]:
+        params = {"ts": when_ts, "id": item_id, "uid": user_id, "kind": kind}
+
+        def _tx(conn: sqlite3.Connection) -> Optional[str]:
+            row = conn.execute(
+                f"UPDATE clothes SET {_MARK_SET[kind]} WHERE id = :id AND user_id = :uid RETURNING name", params
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("INSERT INTO events (item_id, user_id, kind, ts) VALUES (:id, :uid, :kind, :ts)", params)
+            return row["name"]
+
+        return await self.db.transaction(_tx)
+
+    async def _mark_many(self, kind: str, user_id: int, where: str, params: Dict[str, Any]) -> int:
+        params = {**params, "uid": user_id, "kind": kind}
+
+        def _tx(conn: sqlite3.Connection) -> int:
+            conn.execute(
+                f"""
+                INSERT INTO events (item_id, user_id, kind, ts)
+                SELECT id, user_id, :kind, :ts FROM clothes WHERE user_id = :uid AND {where}
+                """,
+                params,
+            )
+            return conn.execute(f"UPDATE clothes SET {_MARK_SET[kind]} WHERE user_id = :uid AND {where}", params).rowcount
+
+        return await self.db.transaction(_tx)
+
+    async def mark_worn(self, user_id: int, item_id: int, when_ts: int) -> Optional[str]:
+        """Возвращает название вещи или None, если вещь не найдена у пользователя."""
+        return await self._mark_one("wear", user_id, item_id, when_ts)
+
+    async def mark_washed(self, user_id: int, item_id: int, when_ts: int) -> Optional[str]:
+        return await self._mark_one("wash", user_id, item_id, when_ts)
+
+    async def mark_worn_many(self, user_id: int, item_ids: Sequence[int], when_ts: int) -> int:
+        """Комплект вещей одной транзакцией. Возвращает число обновлённых вещей."""
+        where, params = _id_list(item_ids)
+        return await self._mark_many("wear", user_id, where, {**params, "ts": when_ts})
+
+    async def mark_washed_many(self, user_id: int, item_ids: Sequence[int], when_ts: int) -> int:
+        where, params = _id_list(item_ids)
+        return await self._mark_many("wash", user_id, where, {**params, "ts": when_ts})
+
+    async def wash_all_worn(self, user_id: int, when_ts: int) -> int:
+        """Всё, что надевали после последней стирки (worn_count > 0), — одной транзакцией."""
+        return await self._mark_many("wash", user_id, "worn_count > 0", {"ts": when_ts})
+
+    async def reminder_items(
+        self, user_ids: Sequence[int], worn_before: int, idle_before: int
+    ) -> List[sqlite3.Row]:
+        """Вещи пачки пользователей, по которым пора напомнить.
+
+        worn_due — носил и не стирал с момента worn_before и раньше,
+        idle_due — вещь, которую и стирали, и надевали последний раз до
+        idle_before (что было позже, то и считается; вещь без отметок не
+        попадает). Правила считаются в самом запросе
+        по индексу (user_id, name, ...), строки без напоминаний не возвращаются.
+        """
+        sql = """
+            SELECT user_id, name, worn_due, idle_due FROM (
+                SELECT user_id, name,
+                       last_worn IS NOT NULL
+                           AND (last_washed IS NULL OR last_washed < last_worn)
+                           AND last_worn <= ? AS worn_due,
+                       MAX(COALESCE(last_washed, last_worn), COALESCE(last_worn, last_washed)) <= ? AS idle_due
+                FROM clothes
+                WHERE user_id IN ({ids})
+            )
+            WHERE worn_due OR idle_due
+            ORDER BY user_id, name COLLATE NOCASE
+        """
+        rows: List[sqlite3.Row] = []
+        for i in range(0, len(user_ids), REMINDER_CHUNK):
+            chunk = user_ids[i:i + REMINDER_CHUNK]
+            rows += await self.db.fetchall(
+                sql.format(ids=", ".join("?" * len(chunk))), (worn_before, idle_before, *chunk)
+            )
+        return rows
+
+    # ----- статистика -----
+    async def set_price(self, user_id: int, item_id: int, price: Optional[float]) -> Optional[str]:
+        row = await self.db.transaction(lambda conn: conn.execute(
+            "UPDATE clothes SET price = ? WHERE id = ? AND user_id = ? RETURNING name", (price, item_id, user_id)
+        ).fetchone())
+        return row["name"] if row else None
+
+    async def stats_items(self, user_id: int, since_day: int) -> List[sqlite3.Row]:
+        """Вещи пользователя с носками за окно из дневных сводок (day >= since_day)."""
+        return await self.db.fetchall(
+            """
+            SELECT c.id, c.name, c.category, c.price, c.wear_total, c.last_worn,
+                   COALESCE(d.wears, 0) AS wears
+            FROM clothes c
+            LEFT JOIN (
+                SELECT item_id, SUM(wears) AS wears FROM item_daily
+                WHERE user_id = ? AND day >= ?
+                GROUP BY item_id
+            ) d ON d.item_id = c.id
+            WHERE c.user_id = ?
+            ORDER BY c.name COLLATE NOCASE, c.id
+            """,
+            (user_id, since_day, user_id),
+        )
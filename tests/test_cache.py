@@ -0,0 +1,38 @@
+from cache import WardrobeCache
+
+
+def test_put_after_invalidate_is_rejected():
+    cache = WardrobeCache(max_entries=10)
+    version = cache.version(1)
+    cache.invalidate(1)
+    cache.put(1, version, "stale")
+    assert cache.get(1) is None
+
+
+def test_pruning_versions_keeps_inflight_reads_stale():
+    cache = WardrobeCache(max_entries=1)
+    cache.put(2, cache.version(2), "two")
+    for uid in range(3, 7):
+        cache.invalidate(uid)
+    version = cache.version(1)      # чтение началось
+    cache.invalidate(1)             # /add, пока чтение «в полёте»; версий больше 4 * max_entries — очистка
+    cache.put(1, version, "stale")
+    assert cache.get(1) is None
+    assert cache.get(2) == "two"    # сохранённые записи очистка не сбрасывает
+
+
+def test_fresh_read_after_invalidate_is_cached():
+    cache = WardrobeCache(max_entries=1)
+    cache.invalidate(1)
+    cache.put(1, cache.version(1), "fresh")
+    assert cache.get(1) == "fresh"
+
+
+def test_stats_count_hits_misses_and_evictions():
+    cache = WardrobeCache(max_entries=1)
+    assert cache.get(1) is None
+    cache.put(1, cache.version(1), "one")
+    assert cache.get(1) == "one"
+    cache.put(2, cache.version(2), "two")   # вытесняет 1
+    assert cache.get(1) is None
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 2, 1)
@@ -0,0 +1,39 @@
+"""
+DeliveryQueue: интервал между сообщениями в один чат держится и тогда,
+когда сообщения этого чата одновременно разобрали несколько воркеров.
+"""
+import asyncio
+import time
+
+from delivery import DeliveryQueue
+
+
+class RecordingBot:
+    """Вместо Bot: запоминает, когда и в какой чат ушло сообщение."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, time.monotonic()))
+
+
+def test_per_chat_interval_holds_across_workers():
+    interval = 0.2
+
+    async def scenario():
+        bot = RecordingBot()
+        queue = DeliveryQueue(bot, workers=8, global_rate=1000.0, per_chat_interval=interval)
+        await queue.start()
+        for n in range(4):
+            await queue.send(1, f"msg {n}")
+            await queue.send(2, f"msg {n}")
+        await queue.stop()
+        return bot.sent
+
+    sent = asyncio.run(scenario())
+    assert len(sent) == 8
+    for chat_id in (1, 2):
+        times = [t for c, t in sent if c == chat_id]
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert min(gaps) >= interval * 0.9, gaps
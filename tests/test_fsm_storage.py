@@ -0,0 +1,62 @@
+"""
+PersistentStorage: брошенные на полпути выборы не копятся в памяти процесса
+и удаляются из closet.db после TTL.
+"""
+import asyncio
+import time
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+import fsm_storage
+from fsm_storage import PersistentStorage
+from state_store import SQLiteStateStore
+from storage import ClosetRepository, Database
+
+ABANDONED = 10_000
+CACHE_SIZE = 100
+TTL = 3600
+
+
+class CountingStateStore(SQLiteStateStore):
+    """SQLiteStateStore, который умеет сказать, сколько FSM-записей лежит в БД."""
+
+    async def fsm_rows(self) -> int:
+        rows = await self._read("SELECT COUNT(*) AS n FROM fsm_state")
+        return rows[0]["n"]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "closet.db")
+
+
+def test_abandoned_selections_stay_bounded(db_path, monkeypatch):
+    async def scenario():
+        db = Database(db_path)
+        await db.connect()
+        await ClosetRepository(db).init_schema()
+        store = CountingStateStore(db)
+        storage = PersistentStorage(store, ttl=TTL, cache_size=CACHE_SIZE, purge_interval=0)
+
+        async def abandon(user_id):
+            # выбор на нескольких страницах /outfit, после которого пользователь ушёл
+            key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+            await storage.set_data(key, {"multi_pick": {"message_id": 1, "ids": [1, 2]}})
+
+        for start in range(1, ABANDONED + 1, 100):
+            await asyncio.gather(*(abandon(u) for u in range(start, start + 100)))
+            assert storage.cached() <= CACHE_SIZE
+        assert await store.fsm_rows() == ABANDONED
+
+        # после TTL записи не возвращаются и удаляются фоновой очисткой
+        later = time.time() + TTL + 1
+        monkeypatch.setattr(fsm_storage.time, "time", lambda: later)
+        key = StorageKey(bot_id=1, chat_id=1, user_id=1)
+        assert await storage.get_data(key) == {}
+        assert await storage.purge_expired() == ABANDONED
+        assert await store.fsm_rows() == 0
+        assert storage.cached() <= CACHE_SIZE
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,50 @@
+"""
+Отказ реплик во время рассылки напоминаний: несколько процессов
+bench.leader_failover --child на общей closet.db и FakeTelegram.
+
+crash   — три реплики, лидер получает SIGKILL;
+rolling — вторая реплика стартует, первая получает SIGTERM.
+
+В обоих случаях новый лидер появляется не позже LEASE_TTL_SECONDS, а каждое
+напоминание уходит ровно один раз.
+"""
+import argparse
+import asyncio
+
+import pytest
+
+from bench.leader_failover import run_scenario
+
+ARGS = argparse.Namespace(
+    users=200,
+    span=4,
+    replicas=3,
+    event_at=5,      # реплики успели стартовать и выбрать лидера
+    warmup=2,
+    partitions=8,
+    lease_ttl=3,     # LEASE_TTL_SECONDS дочерних процессов
+    latency=0.0,
+)
+
+
+@pytest.fixture(scope="module")
+def reports():
+    async def both():
+        crash, rolling = await asyncio.gather(run_scenario(ARGS, "crash"), run_scenario(ARGS, "rolling"))
+        return {"crash": crash, "rolling": rolling}
+
+    return asyncio.run(both())
+
+
+@pytest.mark.parametrize("scenario", ["crash", "rolling"])
+def test_new_leader_within_lease_ttl(reports, scenario):
+    handover = reports[scenario]["leader_handover_s"]
+    assert handover is not None and handover <= ARGS.lease_ttl, reports[scenario]
+
+
+@pytest.mark.parametrize("scenario", ["crash", "rolling"])
+def test_every_reminder_sent_exactly_once(reports, scenario):
+    report = reports[scenario]
+    assert report["duplicates"] == 0, report
+    assert report["missing"] == 0, report
+    assert report["delivered"] == ARGS.users, report
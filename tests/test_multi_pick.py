@@ -0,0 +1,105 @@
+"""
+Брошенные выборы /outfit и /laundry: выбор с других страниц лежит в данных
+FSM пользователя, в памяти процесса их не больше размера кэша, а после TTL
+они не возвращаются и удаляются из closet.db.
+
+Апдейты проходят через Dispatcher бота, Bot API — FakeTelegram из bench/.
+"""
+import asyncio
+import time
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+
+import fsm_storage
+from bench.common import free_port, insert_items
+from bench.fake_telegram import FakeTelegram
+
+USERS = 300
+ITEMS = 30      # больше одной страницы клавиатуры
+CACHE_SIZE = 50
+
+
+@pytest.fixture(scope="module")
+def bot(tmp_path_factory):
+    # main читает окружение при импорте и регистрирует метрики — импортируется один раз
+    port = free_port()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("BOT_TOKEN", "42:test")
+        mp.setenv("DB_PATH", str(tmp_path_factory.mktemp("bot") / "closet.db"))
+        mp.setenv("TELEGRAM_API_URL", f"http://127.0.0.1:{port}")
+        import main
+    main.dp.include_router(main.router)
+    main.fsm_storage.cache_size = CACHE_SIZE
+    return main, port
+
+
+def callback_update(bot, wardrobe, user_id, action, update_id):
+    """Нажатие «дальше» на первой странице, где уже отмечена первая вещь."""
+    start, end = bot.page_slice(wardrobe)
+    first_id = wardrobe.items[start][0]
+    markup = bot.multi_keyboard(action, wardrobe, start, end, {first_id})
+    last_id = wardrobe.items[end - 1][0]
+    user = {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+    update = {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(user_id),
+            "data": bot.MultiPick(action=action, op="next", item_id=last_id).pack(),
+            "message": {
+                "message_id": 7,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 42, "is_bot": True, "first_name": "bot"},
+                "text": bot.MULTI_PROMPT[action],
+                "reply_markup": markup.model_dump(exclude_none=True),
+            },
+        },
+    }
+    return Update.model_validate(update, context={"bot": bot.bot}), first_id
+
+
+def test_abandoned_multi_picks_stay_bounded_and_expire(bot, monkeypatch):
+    main, port = bot
+
+    async def scenario():
+        server = FakeTelegram(global_rate=None, per_chat_interval=None)
+        await server.start(port=port)
+        await main.db.connect()
+        await main.repo.init_schema()
+        await main.db.transaction(lambda conn: insert_items(
+            conn, [(u, f"item{i:02d}", "x", None, None, 0) for u in range(1, USERS + 1) for i in range(ITEMS)]
+        ))
+        try:
+            picked = {}
+            for user_id in range(1, USERS + 1):
+                wardrobe = await main.get_wardrobe(user_id)
+                action = "wear" if user_id % 2 else "wash"
+                update, picked[user_id] = callback_update(main, wardrobe, user_id, action, user_id)
+                await main.dp.feed_update(main.bot, update)
+                assert main.fsm_storage.cached() <= CACHE_SIZE
+            assert server.calls["editMessageReplyMarkup"] == USERS
+
+            # выбор с первой страницы сохранён, пока пользователь листает
+            key = StorageKey(bot_id=main.bot.id, chat_id=USERS, user_id=USERS)
+            saved = (await main.fsm_storage.get_data(key))[main.MULTI_KEY]
+            assert saved == {"message_id": 7, "ids": [picked[USERS]]}
+            rows = await main.db.fetchone("SELECT COUNT(*) AS n FROM fsm_state")
+            assert rows["n"] == USERS
+
+            # пользователи ушли: после TTL выбора нет, фоновая очистка удаляет записи
+            later = time.time() + main.fsm_storage.ttl + 1
+            monkeypatch.setattr(fsm_storage.time, "time", lambda: later)
+            assert await main.fsm_storage.get_data(key) == {}
+            assert await main.fsm_storage.purge_expired() == USERS
+            rows = await main.db.fetchone("SELECT COUNT(*) AS n FROM fsm_state")
+            assert rows["n"] == 0
+        finally:
+            await main.db.close()
+            await main.bot.session.close()
+            await server.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,141 @@
+"""
+Защита от повторных напоминаний: перенос срока (advance_schedule, compare-and-set
+по next_fire_utc) плюс журнал отправок (StateStore.claim_sends), как их
+вызывает reminders_loop через scheduler.claim_due.
+
+Процесс бота здесь — отдельный Database поверх общего файла closet.db:
+«перезапуск» — закрыть его и открыть новый, «вторая реплика» — два
+одновременно открытых.
+"""
+import asyncio
+import time
+
+import pytest
+
+from scheduler import claim_due, next_fire_times
+from state_store import SQLiteStateStore
+from storage import ClosetRepository, Database
+
+USER = 101
+
+
+class Process:
+    def __init__(self, path):
+        self.db = Database(path)
+        self.repo = ClosetRepository(self.db)
+        self.store = SQLiteStateStore(self.db)
+
+    async def __aenter__(self):
+        await self.db.connect()
+        await self.repo.init_schema()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.db.close()
+
+    async def tick(self, now_ts):
+        """Один проход reminders_loop: кому из сработавших отправлять."""
+        due = await self.repo.due_users(now_ts)
+        next_ts = next_fire_times((s["notify_time"], s["tz"]) for s in due)
+        claimed, _ = await claim_due(self.repo, self.store, due, next_ts, now_ts - 60)
+        return claimed
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "closet.db")
+
+
+@pytest.fixture
+def fire_ts():
+    # срок наступил несколько секунд назад — идёт минута напоминания
+    return int(time.time()) - 5
+
+
+async def schedule(path, fire_ts, user_id=USER):
+    async with Process(path) as p:
+        await p.db.execute(
+            "INSERT INTO user_settings (user_id, notify_on, notify_time, tz, next_fire_utc) VALUES (?, 1, '09:00', 'UTC', ?)",
+            (user_id, fire_ts),
+        )
+
+
+def test_restart_after_claim_does_not_resend(db_path, fire_ts):
+    async def scenario():
+        await schedule(db_path, fire_ts)
+        async with Process(db_path) as p:
+            assert await p.tick(fire_ts + 5) == [USER]
+        # перезапуск внутри той же минуты
+        async with Process(db_path) as p:
+            assert await p.tick(fire_ts + 10) == []
+            # даже если срок вернулся к тому же моменту (настройки сохранили заново),
+            # журнал отправок не даст повторить напоминание
+            await p.repo.set_next_fire(USER, fire_ts)
+            assert await p.tick(fire_ts + 15) == []
+            row = await p.db.fetchone("SELECT next_fire_utc FROM user_settings WHERE user_id = ?", (USER,))
+            assert row["next_fire_utc"] > fire_ts
+
+    asyncio.run(scenario())
+
+
+def test_second_instance_in_same_minute_does_not_resend(db_path, fire_ts):
+    async def scenario():
+        await schedule(db_path, fire_ts)
+        async with Process(db_path) as a, Process(db_path) as b:
+            # обе реплики прочитали одну и ту же пачку до того, как кто-то её перенёс
+            due_a = await a.repo.due_users(fire_ts + 5)
+            due_b = await b.repo.due_users(fire_ts + 5)
+            assert [s["user_id"] for s in due_a] == [s["user_id"] for s in due_b] == [USER]
+            next_ts = next_fire_times([("09:00", "UTC")], None)
+            sent_a, sent_b = await asyncio.gather(
+                claim_due(a.repo, a.store, due_a, next_ts, fire_ts - 60),
+                claim_due(b.repo, b.store, due_b, next_ts, fire_ts - 60),
+            )
+            assert sorted(sent_a[0] + sent_b[0]) == [USER]
+            # и следующий проход любой из них ничего не находит
+            assert await a.tick(fire_ts + 30) == []
+            assert await b.tick(fire_ts + 30) == []
+
+    asyncio.run(scenario())
+
+
+def test_crash_between_advance_and_send_loses_reminder(db_path, fire_ts):
+    # документированная цена защиты от повторов: отметка сохраняется до
+    # отправки, и упавший после неё процесс напоминание уже не отправит
+    async def scenario():
+        await schedule(db_path, fire_ts)
+        async with Process(db_path) as p:
+            assert await p.tick(fire_ts + 5) == [USER]
+            # падение: в очередь доставки ничего не попало
+        async with Process(db_path) as p:
+            assert await p.tick(fire_ts + 10) == []
+            assert await p.store.claim_sends([(USER, fire_ts)]) == []
+            row = await p.db.fetchone("SELECT next_fire_utc FROM user_settings WHERE user_id = ?", (USER,))
+            assert row["next_fire_utc"] > fire_ts
+
+    asyncio.run(scenario())
+
+
+def test_overslept_reminder_is_rescheduled_without_sending(db_path, fire_ts):
+    async def scenario():
+        await schedule(db_path, fire_ts)
+        async with Process(db_path) as p:
+            due = await p.repo.due_users(fire_ts + 5)
+            next_ts = next_fire_times((s["notify_time"], s["tz"]) for s in due)
+            claimed, skipped = await claim_due(p.repo, p.store, due, next_ts, fresh_since=fire_ts + 1)
+            assert (claimed, skipped) == ([], 1)
+            assert await p.repo.due_users(fire_ts + 5) == []
+
+    asyncio.run(scenario())
+
+
+def test_advance_schedule_moves_each_fire_once(db_path, fire_ts):
+    # compare-and-set по next_fire_utc сам по себе, без журнала отправок
+    async def scenario():
+        await schedule(db_path, fire_ts)
+        async with Process(db_path) as a, Process(db_path) as b:
+            claims = [(USER, fire_ts, fire_ts + 86400, True)]
+            moved = await asyncio.gather(a.repo.advance_schedule(claims), b.repo.advance_schedule(claims))
+            assert sorted(moved) == [[], [USER]]
+
+    asyncio.run(scenario())
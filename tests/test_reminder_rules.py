@@ -0,0 +1,44 @@
+"""
+Правила напоминаний в ClosetRepository.reminder_items.
+"""
+import asyncio
+import time
+
+from storage import ClosetRepository, Database
+
+USER = 101
+DAY = 86400
+
+
+def due_flags(tmp_path, items):
+    """{name: (worn_due, idle_due)} для вещей (name, last_worn, last_washed)."""
+    async def scenario():
+        db = Database(str(tmp_path / "closet.db"))
+        await db.connect()
+        repo = ClosetRepository(db)
+        await repo.init_schema()
+        await db.transaction(lambda conn: conn.executemany(
+            "INSERT INTO clothes (user_id, name, category, last_worn, last_washed, worn_count) VALUES (?, ?, 'x', ?, ?, 0)",
+            [(USER, name, worn, washed) for name, worn, washed in items],
+        ))
+        now = int(time.time())
+        rows = await repo.reminder_items([USER], worn_before=now - 7 * DAY, idle_before=now - 30 * DAY)
+        await db.close()
+        return {r["name"]: (bool(r["worn_due"]), bool(r["idle_due"])) for r in rows}
+
+    return asyncio.run(scenario())
+
+
+def test_idle_uses_latest_of_wash_and_wear(tmp_path):
+    now = int(time.time())
+    flags = due_flags(tmp_path, [
+        ("worn yesterday", now - DAY, now - 40 * DAY),
+        ("washed yesterday", now - 40 * DAY, now - DAY),
+        ("idle", now - 50 * DAY, now - 40 * DAY),
+        ("never washed", now - 40 * DAY, None),
+        ("never touched", None, None),
+    ])
+    assert flags == {
+        "idle": (False, True),
+        "never washed": (True, True),
+    }
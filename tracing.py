@@ -0,0 +1,315 @@
+"""
+Трассировка апдейтов: один span на апдейт с разбивкой времени.
+
+Outer-middleware на dp.update открывает span и кладёт его в contextvar;
+всё, что выполняется в задаче апдейта, дописывает в него своё:
+    хэндлер          — имя (inner-middleware метрик, metrics.py);
+    Database         — время обращений и SQL-запросы (trace callback
+                       соединений; контекст переносится в потоки БД);
+    сессия бота      — время каждого вызова Bot API.
+Апдейты дольше порога попадают в лог вместе с запросами; литералы в SQL
+заменяются на ?, чтобы в лог не попадали данные пользователей.
+
+Готовые span-ы можно выгружать пачками в JSONL-файл (JsonlExporter) или
+в OTLP/HTTP-коллектор (OtlpExporter, формат JSON; для локальной проверки —
+bench/fake_otlp.py).
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import re
+import secrets
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+import aiohttp
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+log = logging.getLogger("closet-bot.trace")
+
+T = TypeVar("T")
+
+# SQL-запросов в одном span: больше для разбора медленного апдейта не нужно
+MAX_SQL = 200
+
+_current: contextvars.ContextVar[Optional["UpdateSpan"]] = contextvars.ContextVar("closet_span", default=None)
+
+_LITERAL = re.compile(r"\bX'[0-9A-Fa-f]*'|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(sql: str) -> str:
+    """Запрос без значений параметров: строки и числа -> ?."""
+    return " ".join(_LITERAL.sub("?", sql).split())
+
+
+class UpdateSpan:
+    __slots__ = (
+        "trace_id", "span_id", "update_id", "update_type", "user_id", "handler",
+        "start", "end", "db_seconds", "db_ops", "api_calls", "sql", "error",
+    )
+
+    def __init__(self, update_id: int, update_type: str, user_id: Optional[int]):
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.update_id = update_id
+        self.update_type = update_type
+        self.user_id = user_id
+        self.handler: Optional[str] = None
+        self.start = time.time()
+        self.end = self.start
+        self.db_seconds = 0.0
+        self.db_ops = 0
+        self.api_calls: List[Tuple[str, float]] = []
+        self.sql: List[str] = []
+        self.error: Optional[str] = None
+
+    @property
+    def total_ms(self) -> float:
+        return (self.end - self.start) * 1000
+
+    @property
+    def api_ms(self) -> float:
+        return sum(s for _, s in self.api_calls) * 1000
+
+    def to_dict(self, with_sql: bool) -> Dict[str, Any]:
+        out = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "update_id": self.update_id,
+            "update_type": self.update_type,
+            "user_id": self.user_id,
+            "handler": self.handler,
+            "start": round(self.start, 6),
+            "total_ms": round(self.total_ms, 3),
+            "db_ms": round(self.db_seconds * 1000, 3),
+            "db_ops": self.db_ops,
+            "api_ms": round(self.api_ms, 3),
+            "api_calls": [{"method": m, "ms": round(s * 1000, 3)} for m, s in self.api_calls],
+            "sql_count": len(self.sql),
+            "error": self.error,
+        }
+        if with_sql:
+            out["sql"] = [normalize_sql(q) for q in self.sql]
+        return out
+
+
+# ----- точки записи (вызываются из Database, сессии бота и middleware) -----
+def set_handler(name: str) -> None:
+    span = _current.get()
+    if span is not None:
+        span.handler = name
+
+
+def record_db(seconds: float) -> None:
+    span = _current.get()
+    if span is not None:
+        span.db_seconds += seconds
+        span.db_ops += 1
+
+
+def trace_sql(statement: str) -> None:
+    """Trace callback соединений sqlite3; срабатывает в потоке БД."""
+    span = _current.get()
+    if span is not None and len(span.sql) < MAX_SQL:
+        span.sql.append(statement)
+
+
+def bind(fn: Callable[..., T]) -> Callable[..., T]:
+    """fn, выполняемая в контексте текущего span (для передачи в поток-исполнитель)."""
+    if _current.get() is None:
+        return fn
+    ctx = contextvars.copy_context()
+    return lambda *args: ctx.run(fn, *args)
+
+
+# ----- выгрузка -----
+class BatchExporter:
+    """Копит span-ы и раз в interval секунд выгружает пачкой; при переполнении лишние отбрасывает."""
+
+    def __init__(self, interval: float = 2.0, max_buffer: int = 10_000):
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def export(self, span: Dict[str, Any]) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(span)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        batch, self._buffer = self._buffer, []
+        if batch:
+            await self._send(batch)
+
+    async def _send(self, batch: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.exception("Ошибка выгрузки span-ов: %s", e)
+
+
+class JsonlExporter(BatchExporter):
+    """Span-ы по одному JSON на строку — для разбора офлайн."""
+
+    def __init__(self, path: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def _write(self, lines: List[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def _send(self, batch: List[Dict[str, Any]]) -> None:
+        lines = [json.dumps(span, ensure_ascii=False, separators=(",", ":")) + "\n" for span in batch]
+        await asyncio.to_thread(self._write, lines)
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def to_otlp(batch: List[Dict[str, Any]], service: str) -> Dict[str, Any]:
+    """Пачка span-ов в теле запроса OTLP/HTTP JSON (POST /v1/traces)."""
+    spans = []
+    for s in batch:
+        start_ns = int(s["start"] * 1e9)
+        attrs = {k: v for k, v in s.items() if k not in ("trace_id", "span_id", "start", "api_calls") and v is not None}
+        if "sql" in attrs:
+            attrs["sql"] = "\n".join(attrs["sql"])
+        spans.append({
+            "traceId": s["trace_id"],
+            "spanId": s["span_id"],
+            "name": f"update {s['handler'] or s['update_type']}",
+            "kind": 2,  # SPAN_KIND_SERVER
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(s["total_ms"] * 1e6)),
+            "attributes": [{"key": f"closet.{k}", "value": _otlp_value(v)} for k, v in attrs.items()],
+            "status": {"code": 2 if s["error"] else 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+            "scopeSpans": [{"scope": {"name": "closet-bot.trace"}, "spans": spans}],
+        }]
+    }
+
+
+class OtlpExporter(BatchExporter):
+    def __init__(self, endpoint: str, service: str = "closet-bot", timeout: float = 5.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service = service
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        await super().start()
+
+    async def close(self) -> None:
+        await super().close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _send(self, batch: List[Dict[str, Any]]) -> None:
+        async with self._session.post(self.url, json=to_otlp(batch, self.service)) as resp:
+            if resp.status >= 300:
+                log.warning("OTLP collector answered %s for %s spans", resp.status, len(batch))
+
+
+# ----- middleware -----
+def _update_user(update: Update) -> Tuple[str, Optional[int]]:
+    kind = update.event_type
+    user = getattr(update.event, "from_user", None)
+    return kind, user.id if user is not None else None
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: span на апдейт, лог медленных, выгрузка."""
+
+    def __init__(self, slow_ms: float, exporters: Sequence[BatchExporter] = ()):
+        self.slow_ms = slow_ms
+        self.exporters = list(exporters)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        span = UpdateSpan(event.update_id, *_update_user(event))
+        token = _current.set(span)
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            span.end = time.time()
+            self._finish(span)
+
+    def _finish(self, span: UpdateSpan) -> None:
+        slow = span.total_ms >= self.slow_ms
+        if slow:
+            log.warning(
+                "Slow update %s (%s, user %s): %.1f ms — db %.1f ms in %s ops, api %.1f ms in %s calls\n%s",
+                span.update_id, span.handler or span.update_type, span.user_id, span.total_ms,
+                span.db_seconds * 1000, span.db_ops, span.api_ms, len(span.api_calls),
+                "\n".join(f"  {normalize_sql(q)}" for q in span.sql) or "  (no SQL)",
+            )
+        if self.exporters:
+            record = span.to_dict(with_sql=slow)
+            for exporter in self.exporters:
+                exporter.export(record)
+
+
+class ApiTracingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время вызовов Bot API внутри апдейта."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        span = _current.get()
+        if span is None:
+            return await make_request(bot, method)
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            span.api_calls.append((type(method).__name__, time.perf_counter() - start))